@@ -1,114 +1,438 @@
 import os
+import re
 import sys
 import textwrap
 from datetime import datetime
-from typing import Any, Dict, List
+from functools import lru_cache
+import json
+from typing import Any, AsyncIterator, Dict, Iterator, List
 
 import requests
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from noton.Module import Module
+from noton.Balancer import parse_backends
+from noton.Cache import cache_key
+from noton.Compile import Graph, compile_graph
+from noton.Conversation import ConversationStore
 from noton.LLM import Ollama
 from noton.Input import TextInput
+from noton.Similarity import SimilarityCache
 from noton.Text import TextFilter
+from noton.Trace import install_exporters
 
-from api_server import MessageAnalystAPIServer
-
-
-def _build_system_prompt(language: str) -> str:
-    normalized_language = (language or "English").strip() or "English"
-    return textwrap.dedent(
-        f"""
-        # Role: Message Direction Analyst
-
-        ## Profile
-        - language: {normalized_language}
-        - description: A specialized AI role designed to dissect the core themes, underlying intent, and directional focus of original messages, while generating refined content that aligns with user-defined objectives and linguistic expectations.
-        - background: Developed to address the growing need for precise content analysis and optimization in fields such as marketing, research, and creative writing, where understanding and repurposing message direction is critical.
-        - personality: Analytical, precise, adaptable, and user-focused.
-        - expertise: Natural language processing (NLP), thematic analysis, content strategy, and algorithmic pattern recognition.
-        - target_audience: Content creators, academic researchers, marketing professionals, and business analysts requiring nuanced message interpretation and refinement.
-
-        ## Skills
-
-        1. **Core Analytical & Synthesis Skills**
-           - **Thematic Extraction**: Identifies primary and secondary themes within text through linguistic pattern recognition.
-           - **Directional Vocabulary Accumulation**: Builds and updates a repository of context-specific search terms and directional cues.
-           - **Perspective Generation**: Proposes alternative angles or interpretations that enhance clarity or align with strategic goals.
-           - **Content Refinement**: Transforms raw or unstructured text into polished, contextually appropriate {normalized_language} content.
-
-        2. **Supporting Technical & Methodological Skills**
-           - **Algorithmic Pattern Recognition**: Applies machine learning techniques to identify recurring directional motifs in text corpora.
-           - **Language Modeling**: Ensures output adheres to native {normalized_language} conventions, idioms, and syntactic norms.
-           - **User Intent Interpretation**: Aligns generated content with explicit user objectives through iterative feedback loops.
-           - **Iterative Feedback Integration**: Refines outputs based on user selections, prioritizing alignment with core goals.
-
-        ## Rules
-
-        1. **Basic Principles**
-           - **Accuracy First**: Prioritize factual and contextual precision in thematic identification and content synthesis.
-           - **Neutrality**: Avoid introducing subjective biases or assumptions beyond the original message’s intent.
-           - **Adaptability**: Adjust analysis depth and granularity based on user-specified objectives (e.g., marketing vs. academic).
-           - **Consistency**: Maintain uniformity in terminology, tone, and structural formatting across outputs.
-
-        2. **Behavioral Guidelines**
-           - **Clarity Over Complexity**: Simplify nuanced themes into digestible insights without sacrificing critical details.
-           - **Respect User Preferences**: Honor user-defined parameters (e.g., style, length, audience) in final output delivery.
-           - **Iterative Refinement**: Allow for multi-step revisions based on user feedback to ensure alignment with evolving needs.
-           - **Ethical Boundaries**: Avoid generating content that could misrepresent, manipulate, or mislead audiences.
-
-        3. **Constraints**
-           - **No Biased Content Generation**: Ensure outputs remain neutral and avoid reinforcing stereotypes or harmful narratives.
-           - **Language Adherence**: Deliver content exclusively in native {normalized_language} unless otherwise instructed.
-           - **No Assumptions**: Refrain from inferring unspoken context or intent beyond what is explicitly stated.
-           - **Format Compliance**: Avoid markdown, code blocks, or non-textual elements in final outputs.
-
-        ## Workflows
-
-        - Goal: Analyze the original message to identify its directional focus, synthesize multiple interpretive options, and deliver polished content aligned with user-selected priorities.
-        - Step 1: Decompose the original text into linguistic components (e.g., keywords, sentiment, structure) to isolate core themes and directional cues.
-        - Step 2: Cross-reference directional vocabulary and algorithmic patterns to generate 3–5 distinct interpretive frameworks or angles.
-        - Step 3: Prioritize and refine the selected framework into a polished, context-appropriate {normalized_language} output, incorporating user-specified objectives (e.g., tone, audience, length).
-        - Expected result: A tailored, linguistically precise content piece that distills the original message’s direction while aligning with user-defined strategic goals.
-
-        ## Initialization
-        As Message Direction Analyst, you must follow the above Rules and execute tasks according to Workflows.
-        """
-    ).strip()
+from api_server import REASONING_MODES, MessageAnalystAPIServer, stage_histogram
+
+
+def _normalize_language(language: str | None) -> str:
+    return (language or "English").strip() or "English"
+
+
+# dedented once at import; {language} is the only variable part
+_SYSTEM_PROMPT_TEMPLATE = textwrap.dedent(
+    """
+    # Role: Message Direction Analyst
+
+    ## Profile
+    - language: {language}
+    - description: A specialized AI role designed to dissect the core themes, underlying intent, and directional focus of original messages, while generating refined content that aligns with user-defined objectives and linguistic expectations.
+    - background: Developed to address the growing need for precise content analysis and optimization in fields such as marketing, research, and creative writing, where understanding and repurposing message direction is critical.
+    - personality: Analytical, precise, adaptable, and user-focused.
+    - expertise: Natural language processing (NLP), thematic analysis, content strategy, and algorithmic pattern recognition.
+    - target_audience: Content creators, academic researchers, marketing professionals, and business analysts requiring nuanced message interpretation and refinement.
+
+    ## Skills
+
+    1. **Core Analytical & Synthesis Skills**
+       - **Thematic Extraction**: Identifies primary and secondary themes within text through linguistic pattern recognition.
+       - **Directional Vocabulary Accumulation**: Builds and updates a repository of context-specific search terms and directional cues.
+       - **Perspective Generation**: Proposes alternative angles or interpretations that enhance clarity or align with strategic goals.
+       - **Content Refinement**: Transforms raw or unstructured text into polished, contextually appropriate {language} content.
+
+    2. **Supporting Technical & Methodological Skills**
+       - **Algorithmic Pattern Recognition**: Applies machine learning techniques to identify recurring directional motifs in text corpora.
+       - **Language Modeling**: Ensures output adheres to native {language} conventions, idioms, and syntactic norms.
+       - **User Intent Interpretation**: Aligns generated content with explicit user objectives through iterative feedback loops.
+       - **Iterative Feedback Integration**: Refines outputs based on user selections, prioritizing alignment with core goals.
+
+    ## Rules
+
+    1. **Basic Principles**
+       - **Accuracy First**: Prioritize factual and contextual precision in thematic identification and content synthesis.
+       - **Neutrality**: Avoid introducing subjective biases or assumptions beyond the original message’s intent.
+       - **Adaptability**: Adjust analysis depth and granularity based on user-specified objectives (e.g., marketing vs. academic).
+       - **Consistency**: Maintain uniformity in terminology, tone, and structural formatting across outputs.
+
+    2. **Behavioral Guidelines**
+       - **Clarity Over Complexity**: Simplify nuanced themes into digestible insights without sacrificing critical details.
+       - **Respect User Preferences**: Honor user-defined parameters (e.g., style, length, audience) in final output delivery.
+       - **Iterative Refinement**: Allow for multi-step revisions based on user feedback to ensure alignment with evolving needs.
+       - **Ethical Boundaries**: Avoid generating content that could misrepresent, manipulate, or mislead audiences.
+
+    3. **Constraints**
+       - **No Biased Content Generation**: Ensure outputs remain neutral and avoid reinforcing stereotypes or harmful narratives.
+       - **Language Adherence**: Deliver content exclusively in native {language} unless otherwise instructed.
+       - **No Assumptions**: Refrain from inferring unspoken context or intent beyond what is explicitly stated.
+       - **Format Compliance**: Avoid markdown, code blocks, or non-textual elements in final outputs.
+
+    ## Workflows
+
+    - Goal: Analyze the original message to identify its directional focus, synthesize multiple interpretive options, and deliver polished content aligned with user-selected priorities.
+    - Step 1: Decompose the original text into linguistic components (e.g., keywords, sentiment, structure) to isolate core themes and directional cues.
+    - Step 2: Cross-reference directional vocabulary and algorithmic patterns to generate 3–5 distinct interpretive frameworks or angles.
+    - Step 3: Prioritize and refine the selected framework into a polished, context-appropriate {language} output, incorporating user-specified objectives (e.g., tone, audience, length).
+    - Expected result: A tailored, linguistically precise content piece that distills the original message’s direction while aligning with user-defined strategic goals.
+
+    ## Initialization
+    As Message Direction Analyst, you must follow the above Rules and execute tasks according to Workflows.
+    """
+).strip()
+
+# "prefix" layout: the whole role description is identical for every language, and the
+# language is named only in the last lines, so backends can reuse the cached prefix
+_PREFIX_SYSTEM_PROMPT = _SYSTEM_PROMPT_TEMPLATE.replace(
+    "- language: {language}", "- language: the target language named at the end of this prompt"
+).format(language="target-language")
+
+_PREFIX_SYSTEM_SUFFIX = "\n\n## Target Language\nWrite every output in {language}."
+
+PROMPT_LAYOUTS = ("classic", "prefix")
+
+
+def _build_system_prompt(language: str, layout: str = "classic") -> str:
+    return _render_system_prompt(_normalize_language(language), layout)
+
+
+@lru_cache(maxsize=64)
+def _render_system_prompt(normalized_language: str, layout: str = "classic") -> str:
+    # rendered once per language and layout, shared read-only by every request thread
+    if layout == "prefix":
+        return _PREFIX_SYSTEM_PROMPT + _PREFIX_SYSTEM_SUFFIX.format(language=normalized_language)
+    return _SYSTEM_PROMPT_TEMPLATE.format(language=normalized_language)
+
+
+# interpretive frameworks for multi-angle generation; each angle is requested separately
+ANGLES: Dict[str, str] = {
+    "Direct": "Lead with the core ask or conclusion and cut everything that does not support it.",
+    "Narrative": "Frame the message as a short story: the situation, what changes, and where it leads.",
+    "Benefit-led": "Build the message around what the recipient gains and why it matters to them now.",
+    "Empathetic": "Start from the recipient's point of view, acknowledge it, then bring in the message's direction.",
+    "Strategic": "Place the message in its wider context: the goal it serves, the trade-offs, and the expected outcome.",
+}
+
+# appended after everything else, so every angle of a request shares the whole prompt prefix
+_ANGLE_DIRECTIVE = "\n\nInterpretive angle: {angle} — {instruction}\nDevelop the refinement from this angle only."
+
+_SELECTION_SYSTEM_PROMPT = "You are a strict editor. You compare candidate rewrites and answer with a single number."
+
+_SELECTION_TEMPLATE = textwrap.dedent(
+    """
+    The request below was answered from {count} different angles. Pick the candidate that best follows the request and stays faithful to the original message.
+    Answer with the candidate number only.
+
+    Request:
+    ---
+    {prompt}
+    ---
+
+    {candidates}
+    """
+).strip()
+
+
+# answer tokens per length profile, with headroom for languages that need more tokens per word
+_LENGTH_TOKEN_BUDGETS: Dict[str, int] = {
+    "Concise": 320,
+    "Standard": 520,
+    "Expanded": 720,
+}
+
+# reasoning mode -> reasoning_effort sent upstream; "on" sends nothing and keeps the model's default
+_REASONING_EFFORT: Dict[str, str | None] = {"on": None, "off": "none", "low": "low", "medium": "medium", "high": "high"}
+
+# the verdict is one number; the budget only has to cover the reasoning in front of it
+_SELECTION_ANSWER_TOKENS = 16
+
+
+class AnalysisPrompt(Module):
+    """The raw draft, or the analysis prompt composed from it when ``controls`` are given."""
+
+    pure_ = True
+
+    def __init__(self, layout: str = "classic") -> None:
+        super().__init__()
+        self.layout_ = layout
+
+    def forward(self, text: str, controls: Dict[str, Any] | None = None, angle: str | None = None) -> str:
+        prompt = text if controls is None else _compose_analysis_prompt(text, **controls, layout=self.layout_)
+        if angle is None:
+            return prompt
+        return prompt + _ANGLE_DIRECTIVE.format(angle=angle, instruction=ANGLES[angle])
 
 
 class MessageDirectionAnalyst(Module):
-    def __init__(self, default_language: str = "English"):
+    def __init__(self, default_language: str = "English", prompt_layout: str | None = None):
         super().__init__()
-        self.language = (default_language or "English").strip() or "English"
-        system_prompt = _build_system_prompt(self.language)
-        base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434/v1")
+        self.language = _normalize_language(default_language)
+        # "prefix" keeps static prompt text ahead of anything request-specific for backend KV-cache reuse
+        self.prompt_layout = (prompt_layout or os.getenv("MESSAGE_ANALYST_PROMPT_LAYOUT", "classic")).strip().lower()
+        if self.prompt_layout not in PROMPT_LAYOUTS:
+            raise ValueError(f"Unknown prompt layout: {self.prompt_layout!r}")
+        # "off" asks the backend to skip the hidden <think> block that TextFilter would discard anyway
+        self.reasoning = os.getenv("MESSAGE_ANALYST_REASONING", "on").strip().lower()
+        if self.reasoning not in REASONING_MODES:
+            raise ValueError(f"Unknown reasoning mode: {self.reasoning!r}")
+        # reasoning allowance added to the answer budget while reasoning is not "off"
+        self.think_tokens = int(os.getenv("MESSAGE_ANALYST_THINK_TOKENS", "1536"))
+        # budget for raw queries, which carry no length profile; 0 leaves it to the backend
+        self.max_tokens = int(os.getenv("MESSAGE_ANALYST_MAX_TOKENS", "0")) or None
+        system_prompt = _build_system_prompt(self.language, self.prompt_layout)
+        # a comma-separated OLLAMA_BASE_URL spreads the load over several backends
+        base_urls, weights = parse_backends(
+            os.getenv("OLLAMA_BASE_URL", "http://localhost:11434/v1"), os.getenv("OLLAMA_BASE_URL_WEIGHTS", "")
+        )
         model = os.getenv("OLLAMA_MODEL", "deepseek-r1:8b-0528-qwen3-fp16")
         api_key = os.getenv("OLLAMA_API_KEY", "ollama")
+        conversation_store = ConversationStore(
+            max_sessions=int(os.getenv("MESSAGE_ANALYST_MAX_SESSIONS", "256")),
+            ttl_seconds=float(os.getenv("MESSAGE_ANALYST_SESSION_TTL", "1800")),
+            max_history_tokens=int(os.getenv("MESSAGE_ANALYST_HISTORY_TOKENS", "4096")),
+        )
 
         self.input = TextInput()
         self.ollama = Ollama(
-            base_url=base_url,
+            base_url=base_urls,
+            backend_weights=weights,
+            routing=os.getenv("OLLAMA_ROUTING", "least_outstanding"),
+            health_check_interval=float(os.getenv("OLLAMA_HEALTH_CHECK_INTERVAL", "15")) if len(base_urls) > 1 else 0.0,
             model=model,
             api_key=api_key,
             system_prompt=system_prompt,
             enable_history=False,
+            conversation_store=conversation_store,
+            retry_attempts=int(os.getenv("OLLAMA_RETRY_ATTEMPTS", "4")),
+            deadline=float(os.getenv("OLLAMA_DEADLINE", "110")),
+            failure_threshold=int(os.getenv("OLLAMA_BREAKER_THRESHOLD", "5")),
+            recovery_timeout=float(os.getenv("OLLAMA_BREAKER_RECOVERY", "30")),
         )
         self.filter = TextFilter( "</think>" )
+        self.prompt = AnalysisPrompt(self.prompt_layout)
+        self.stage_seconds = stage_histogram()
+        # near-duplicate drafts (a changed name, a reworded clause) reuse an earlier rewrite; off by default
+        similarity_size = int(os.getenv("MESSAGE_ANALYST_SIMILARITY_CACHE_SIZE", "0"))
+        self.similar = SimilarityCache(
+            max_entries=similarity_size,
+            threshold=float(os.getenv("MESSAGE_ANALYST_SIMILARITY_THRESHOLD", "0.92")),
+            ttl_seconds=float(os.getenv("MESSAGE_ANALYST_SIMILARITY_TTL", "3600")),
+        ) if similarity_size > 0 else None
+
+        # input -> prompt -> upstream -> filter; the pure input/prompt stages run fused
+        graph = Graph()
+        text, controls, angle, system_prompt, session_id, deadline = graph.inputs("text", "controls", "angle", "system_prompt", "session_id", "deadline")
+        max_tokens, temperature, stop, reasoning_effort = graph.inputs("max_tokens", "temperature", "stop", "reasoning_effort")
+        draft = graph.add(self.input, text, name="input")
+        prompt = graph.add(self.prompt, draft, controls, angle, name="prompt")
+        answer = graph.add(
+            self.ollama, prompt, system_prompt=system_prompt, session_id=session_id, deadline=deadline,
+            max_tokens=max_tokens, temperature=temperature, stop=stop, reasoning_effort=reasoning_effort, name="upstream",
+        )
+        graph.output(graph.add(self.filter, answer, name="filter"))
+        self.pipeline = compile_graph(graph, on_stage=lambda stage, seconds: self.stage_seconds.observe(seconds, stage=stage))
 
     def set_language(self, language: str) -> None:
+        """Change the default language; concurrent callers should pass ``language`` per call instead."""
         normalized_language = (language or "").strip()
         if not normalized_language or normalized_language == self.language:
             return
         self.language = normalized_language
-        self.ollama.system_prompt_ = _build_system_prompt(self.language)
-        self.ollama.conversation_history_ = []
+        self.ollama.system_prompt_ = _build_system_prompt(self.language, self.prompt_layout)
+        self.ollama.conversation_store_.clear()
+
+    def system_prompt(self, language: str | None = None) -> str:
+        """System prompt for ``language``, falling back to the default language."""
+        if language is None:
+            return self.ollama.system_prompt_
+        return _build_system_prompt(language, self.prompt_layout)
+
+    def generation(self, controls: Dict[str, Any] | None = None, generation: Dict[str, Any] | None = None, answer_tokens: int | None = None) -> Dict[str, Any]:
+        """Keyword arguments for ``Ollama``: the request's own values, else a token budget from ``length_pref``.
 
-    def forward(self, user_input:str ) -> str:
+        The budget covers the answer plus ``think_tokens`` of reasoning unless reasoning is "off".
+        """
+        generation = generation or {}
+        reasoning = generation.get("reasoning", self.reasoning)
+        max_tokens = generation.get("max_tokens")
+        if max_tokens is None:
+            if answer_tokens is None and controls is not None:
+                answer_tokens = _LENGTH_TOKEN_BUDGETS.get(controls.get("length_pref"), _LENGTH_TOKEN_BUDGETS["Standard"])
+            if answer_tokens is not None:
+                max_tokens = answer_tokens + (0 if reasoning == "off" else self.think_tokens)
+            else:
+                max_tokens = self.max_tokens
+        return {
+            "max_tokens": max_tokens,
+            "temperature": generation.get("temperature"),
+            "stop": generation.get("stop"),
+            "reasoning_effort": _REASONING_EFFORT[reasoning],
+        }
+
+    def user_prompt(self, user_input: str, controls: Dict[str, Any] | None = None, angle: str | None = None) -> str:
+        """The raw draft, or the analysis prompt composed from it when ``controls`` are given."""
+        return self.prompt( self.input(user_input), controls, angle )
+
+    def forward(self, user_input:str, session_id: str | None = None, deadline: float | None = None, language: str | None = None, controls: Dict[str, Any] | None = None, angle: str | None = None, generation: Dict[str, Any] | None = None ) -> str:
+
+        group, answer = self._similar_answer(user_input, session_id, language, controls, angle, generation)
+        if answer is not None:
+            return answer
+        answer = self.pipeline( text=user_input, controls=controls, angle=angle, system_prompt=self.system_prompt(language), session_id=session_id, deadline=deadline, **self.generation(controls, generation) )
+        self._remember(user_input, group, answer)
+        return answer
+
+    def cache_key(self, user_input:str, session_id: str | None = None, language: str | None = None, controls: Dict[str, Any] | None = None, angle: str | None = None, generation: Dict[str, Any] | None = None ) -> str:
+        """Response-cache key: the draft, its controls and generation parameters, plus the model and system prompt that answer it."""
+        controls_key = json.dumps(controls, sort_keys=True, ensure_ascii=False) if controls is not None else ""
+        generation_key = json.dumps(self.generation(controls, generation), sort_keys=True)
+        return cache_key( user_input, controls_key, angle or "", generation_key, self.ollama.model_ or "", self.system_prompt(language) or "" )
+
+    def stream(self, user_input:str, session_id: str | None = None, deadline: float | None = None, language: str | None = None, controls: Dict[str, Any] | None = None, angle: str | None = None, generation: Dict[str, Any] | None = None ) -> Iterator[str]:
+
+        group, answer = self._similar_answer(user_input, session_id, language, controls, angle, generation)
+        if answer is not None:
+            return self.trace_iter( "stream", iter([answer]) )
+        chunks = self.filter.stream( self.ollama.stream( self.user_prompt(user_input, controls, angle), system_prompt=self.system_prompt(language), session_id=session_id, deadline=deadline, **self.generation(controls, generation) ) )
+        return self.trace_iter( "stream", self._remember_stream(user_input, group, chunks) if group is not None else chunks )
+
+    async def aforward(self, user_input:str, session_id: str | None = None, deadline: float | None = None, language: str | None = None, controls: Dict[str, Any] | None = None, angle: str | None = None, generation: Dict[str, Any] | None = None ) -> str:
+
+        # async calls bypass Module.__call__, so the span is opened explicitly
+        with self.span("aforward"):
+            group, answer = self._similar_answer(user_input, session_id, language, controls, angle, generation)
+            if answer is not None:
+                return answer
+            answer = await self.pipeline.aforward( text=user_input, controls=controls, angle=angle, system_prompt=self.system_prompt(language), session_id=session_id, deadline=deadline, **self.generation(controls, generation) )
+            self._remember(user_input, group, answer)
+            return answer
+
+    def astream(self, user_input:str, session_id: str | None = None, deadline: float | None = None, language: str | None = None, controls: Dict[str, Any] | None = None, angle: str | None = None, generation: Dict[str, Any] | None = None ) -> AsyncIterator[str]:
+
+        group, answer = self._similar_answer(user_input, session_id, language, controls, angle, generation)
+        if answer is not None:
+            return self.atrace_iter( "astream", _aiter_once(answer) )
+        chunks = self.filter.astream( self.ollama.astream( self.user_prompt(user_input, controls, angle), system_prompt=self.system_prompt(language), session_id=session_id, deadline=deadline, **self.generation(controls, generation) ) )
+        return self.atrace_iter( "astream", self._aremember_stream(user_input, group, chunks) if group is not None else chunks )
+
+    def _similar_answer(self, user_input: str, session_id: str | None, language: str | None, controls: Dict[str, Any] | None, angle: str | None, generation: Dict[str, Any] | None) -> tuple[str | None, str | None]:
+        """The similarity-cache group of a request and its near-duplicate answer, if any.
+
+        The group is the cache key of an empty draft, so only requests with the same controls,
+        angle, generation parameters, model and system prompt can match. Session turns depend
+        on their history and are never cached.
+        """
+        if self.similar is None or session_id is not None:
+            return None, None
+        group = self.cache_key( "", language=language, controls=controls, angle=angle, generation=generation )
+        return group, self.similar.get(user_input, group)
+
+    def _remember(self, user_input: str, group: str | None, answer: str) -> None:
+        if group is not None and answer:
+            self.similar.set(user_input, group, answer)
+
+    def _remember_stream(self, user_input: str, group: str, chunks: Iterator[str]) -> Iterator[str]:
+        # only a stream that ran to the end, and that the filter left as forward would have, is stored
+        pieces = []
+        for chunk in chunks:
+            pieces.append(chunk)
+            yield chunk
+        answer = "".join(pieces)
+        if self.filter.settled(answer):
+            self._remember(user_input, group, answer)
+
+    async def _aremember_stream(self, user_input: str, group: str, chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+        pieces = []
+        async for chunk in chunks:
+            pieces.append(chunk)
+            yield chunk
+        answer = "".join(pieces)
+        if self.filter.settled(answer):
+            self._remember(user_input, group, answer)
+
+    def _selection_prompt(self, user_input: str, candidates: List[str], controls: Dict[str, Any] | None) -> str:
+        listed = "\n\n".join(f"Candidate {number}:\n{text.strip()}" for number, text in enumerate(candidates, start=1))
+        return _SELECTION_TEMPLATE.format(count=len(candidates), prompt=self.user_prompt(user_input, controls), candidates=listed)
+
+    def select(self, user_input:str, candidates: List[str], deadline: float | None = None, language: str | None = None, controls: Dict[str, Any] | None = None, generation: Dict[str, Any] | None = None, **_: Any ) -> int:
+        """Index of the best of ``candidates``, chosen by one short judge call without the analyst prompt."""
+        if len(candidates) < 2:
+            return 0
+        options = self.generation(controls, {"reasoning": (generation or {}).get("reasoning", self.reasoning)}, _SELECTION_ANSWER_TOKENS)
+        verdict = self.ollama( self._selection_prompt(user_input, candidates, controls), system_prompt=_SELECTION_SYSTEM_PROMPT, deadline=deadline, **options )
+        return _parse_selection(self.filter(verdict), len(candidates))
+
+    async def aselect(self, user_input:str, candidates: List[str], deadline: float | None = None, language: str | None = None, controls: Dict[str, Any] | None = None, generation: Dict[str, Any] | None = None, **_: Any ) -> int:
+        """Asyncio counterpart of ``select``."""
+        if len(candidates) < 2:
+            return 0
+        options = self.generation(controls, {"reasoning": (generation or {}).get("reasoning", self.reasoning)}, _SELECTION_ANSWER_TOKENS)
+        with self.span("aselect"):
+            verdict = await self.ollama.aforward( self._selection_prompt(user_input, candidates, controls), system_prompt=_SELECTION_SYSTEM_PROMPT, deadline=deadline, **options )
+        return _parse_selection(self.filter(verdict), len(candidates))
+
+    def health(self) -> Dict[str, Any]:
+        upstream = self.ollama.health()
+        degraded = any(state["state"] != "closed" for state in upstream.values())
+        # the service is still up while at least one backend can take traffic
+        available = any(state["state"] != "open" for state in upstream.values())
+        status = "ok" if not degraded else ("degraded" if available else "unavailable")
+        health = {"status": status, "upstream": upstream}
+        if self.similar is not None:
+            health["similarity_cache"] = self.similar.stats()
+        return health
+
+
+async def _aiter_once(text: str) -> AsyncIterator[str]:
+    yield text
+
+
+def create_api_server(model: MessageDirectionAnalyst, **options: Any) -> MessageAnalystAPIServer:
+    """The REST server for ``model``, used by the Streamlit app and by ``serve_api`` workers.
+
+    ``options`` override constructor arguments such as ``sock``, ``max_inflight`` or ``health_fn``.
+    """
+    # per-stage traces and sampled profiles, off unless configured
+    install_exporters(
+        trace_path=os.getenv("MESSAGE_ANALYST_TRACE_FILE") or None,
+        profile_every=int(os.getenv("MESSAGE_ANALYST_PROFILE_EVERY", "0")),
+        profile_dir=os.getenv("MESSAGE_ANALYST_PROFILE_DIR", "profiles"),
+        profiler=os.getenv("MESSAGE_ANALYST_PROFILER", "cprofile"),
+    )
+    # the model itself (not model.forward) so each request is one span around its stages
+    return MessageAnalystAPIServer(
+        model,
+        **{
+            "stream_fn": model.stream,
+            "async_forward_fn": model.aforward,
+            "async_stream_fn": model.astream,
+            "cache_key_fn": model.cache_key,
+            "cacheable_fn": model.filter.settled,
+            "controls_fn": _parse_controls,
+            "angles": list(ANGLES),
+            "select_fn": model.select,
+            "async_select_fn": model.aselect,
+            "health_fn": model.health,
+            **options,
+        },
+    )
 
-        return self.filter( self.ollama( self.input(user_input) ) )
 
+def _parse_selection(verdict: str, count: int) -> int:
+    """The first candidate number named in ``verdict``, as an index; the first candidate if none is."""
+    for match in re.finditer(r"\d+", verdict or ""):
+        number = int(match.group())
+        if 1 <= number <= count:
+            return number - 1
+    return 0
 
 
 def _call_api(api_base_url: str, payload: Dict[str, Any], timeout: float = 120.0) -> Dict[str, Any]:
@@ -127,22 +451,146 @@ def _call_api(api_base_url: str, payload: Dict[str, Any], timeout: float = 120.0
         raise RuntimeError("REST API returned an invalid JSON payload.") from exc
 
 
+def _history_api(api_base_url: str, params: Dict[str, Any], timeout: float = 10.0) -> Dict[str, Any]:
+    """One page of ``/api/history``; an empty page if the history is unavailable."""
+    endpoint = f"{api_base_url}/api/history"
+
+    try:
+        response = requests.get(endpoint, params=params, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+    except (requests.exceptions.RequestException, ValueError):
+        # the history is a convenience; the analysis itself must keep working without it
+        return {"items": [], "next_cursor": None, "total": 0}
+
+
+def _stream_api(api_base_url: str, payload: Dict[str, Any], timeout: float = 120.0) -> Iterator[Dict[str, Any]]:
+    """Yield the NDJSON events of ``/api/analyze/stream`` as they arrive."""
+    endpoint = f"{api_base_url}/api/analyze/stream"
+
+    try:
+        # a person is waiting on this one, so it is admitted ahead of API and batch traffic
+        response = requests.post(endpoint, json=payload, headers={"X-Priority": "interactive"}, timeout=timeout, stream=True)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as exc:
+        raise RuntimeError(f"Unable to reach REST API endpoint at {endpoint}. Reason: {exc}") from exc
+
+    with response:
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event.get("type") == "error":
+                    raise RuntimeError(f"REST API failed while streaming: {event.get('detail', 'unknown error')}")
+                yield event
+        except requests.exceptions.RequestException as exc:
+            raise RuntimeError(f"Streaming from {endpoint} was interrupted. Reason: {exc}") from exc
+        except ValueError as exc:
+            raise RuntimeError("REST API returned an invalid JSON event.") from exc
+
+
+_DEPTH_DESCRIPTIONS: Dict[str, str] = {
+    "Snapshot": "Deliver a succinct, high-level rewrite that keeps only the essential intent.",
+    "Balanced": "Balance brevity and elaboration, surfacing the main direction plus one supporting idea.",
+    "Immersive": "Provide a more detailed refinement with layered structure and directional cues.",
+}
+
+_LENGTH_ADVICE: Dict[str, str] = {
+    "Concise": "Stay under 120 words and prioritize crisp sentences.",
+    "Standard": "Roughly 120-200 words with natural pacing.",
+    "Expanded": "Allow up to 250 words, weaving in nuance and supporting context.",
+}
+
+_DIRECTION_BRIEFS: Dict[str, str] = {
+    "Clarify": "distill the message to its sharpest narrative so the receiver instantly grasps the ask.",
+    "Persuade": "emphasize benefits, momentum, and compelling language that nudges agreement.",
+    "Inspire": "elevate the tone with motivating language that sparks curiosity or action.",
+    "Reassure": "project stability, confidence, and calm authority to reduce any doubts.",
+}
+
+_ENERGY_LABELS: Dict[int, str] = {
+    1: "calm and measured",
+    2: "steady and composed",
+    3: "engaged and confident",
+    4: "dynamic and forward-leaning",
+    5: "bold and high-energy",
+}
+
+_ACTION_CLAUSES = {
+    True: "Close with 1 actionable nudge or next step tailored to the audience.",
+    False: "Only rewrite the message; no explicit next steps are required.",
+}
+
+_EMPATHY_CLAUSES = {
+    True: "Infuse subtle empathy and reassurance without sounding overly sentimental.",
+    False: "Maintain professional neutrality without adding emotional framing.",
+}
+
+# dedented once at import; only the per-request fields are filled in
+_ANALYSIS_TEMPLATE = textwrap.dedent(
+    """
+    You are the Message Direction Analyst. Refine the user's message using the controls below.
+
+    Primary directive: {direction} — {direction_brief}
+    Audience emphasis: {audience}
+    Tone palette: {tone} with an overall energy that feels {energy_label}.
+    Depth mode: {depth_mode} ({depth_description})
+    Length preference: {length_pref} ({length_advice})
+    Focus priorities: {focus_section}
+    Guidelines: {action_clause} {empathy_clause}
+
+    Output requirements:
+    - Deliver a single refined message (plain text, no markdown bullets).
+    - Keep the prose fluent and human, mirroring a native {language} writer.
+    - Ensure the final response is written entirely in {language}.
+    - Honor the requested length and tone even if you must rearrange content.
+
+    Original message:
+    ---
+    {message}
+    ---
+    """
+).strip()
+
+# "prefix" layout: the fixed instructions come first and every per-request value
+# (language, controls, draft) follows them, so requests share the longest possible prefix
+_PREFIX_ANALYSIS_TEMPLATE = textwrap.dedent(
+    """
+    You are the Message Direction Analyst. Refine the user's message using the controls listed below.
+
+    Output requirements:
+    - Deliver a single refined message (plain text, no markdown bullets).
+    - Keep the prose fluent and human, mirroring a native writer of the target language.
+    - Ensure the final response is written entirely in the target language.
+    - Honor the requested length and tone even if you must rearrange content.
+
+    Controls:
+    Target language: {language}
+    Primary directive: {direction} — {direction_brief}
+    Audience emphasis: {audience}
+    Tone palette: {tone} with an overall energy that feels {energy_label}.
+    Depth mode: {depth_mode} ({depth_description})
+    Length preference: {length_pref} ({length_advice})
+    Focus priorities: {focus_section}
+    Guidelines: {action_clause} {empathy_clause}
+
+    Original message:
+    ---
+    {message}
+    ---
+    """
+).strip()
+
+_ANALYSIS_TEMPLATES = {"classic": _ANALYSIS_TEMPLATE, "prefix": _PREFIX_ANALYSIS_TEMPLATE}
+
+
 def _depth_description(level: str) -> str:
-    descriptions = {
-        "Snapshot": "Deliver a succinct, high-level rewrite that keeps only the essential intent.",
-        "Balanced": "Balance brevity and elaboration, surfacing the main direction plus one supporting idea.",
-        "Immersive": "Provide a more detailed refinement with layered structure and directional cues.",
-    }
-    return descriptions.get(level, descriptions["Balanced"])
+    return _DEPTH_DESCRIPTIONS.get(level, _DEPTH_DESCRIPTIONS["Balanced"])
 
 
 def _length_advice(length_pref: str) -> str:
-    mapping = {
-        "Concise": "Stay under 120 words and prioritize crisp sentences.",
-        "Standard": "Roughly 120-200 words with natural pacing.",
-        "Expanded": "Allow up to 250 words, weaving in nuance and supporting context.",
-    }
-    return mapping.get(length_pref, mapping["Standard"])
+    return _LENGTH_ADVICE.get(length_pref, _LENGTH_ADVICE["Standard"])
 
 
 def _compose_analysis_prompt(
@@ -158,59 +606,72 @@ def _compose_analysis_prompt(
     actionable: bool,
     empathy: bool,
     language: str,
+    layout: str = "classic",
 ) -> str:
-    normalized_language = (language or "English").strip() or "English"
-    focus_section = ", ".join(focus_points) if focus_points else "core clarity and authentic intent"
-    action_clause = (
-        "Close with 1 actionable nudge or next step tailored to the audience."
-        if actionable
-        else "Only rewrite the message; no explicit next steps are required."
-    )
-    empathy_clause = (
-        "Infuse subtle empathy and reassurance without sounding overly sentimental."
-        if empathy
-        else "Maintain professional neutrality without adding emotional framing."
+    return _ANALYSIS_TEMPLATES[layout].format(
+        direction=direction,
+        direction_brief=_DIRECTION_BRIEFS.get(direction, ""),
+        audience=audience,
+        tone=tone,
+        energy_label=_ENERGY_LABELS.get(energy, "confident"),
+        depth_mode=depth_mode,
+        depth_description=_depth_description(depth_mode),
+        length_pref=length_pref,
+        length_advice=_length_advice(length_pref),
+        focus_section=", ".join(focus_points) if focus_points else "core clarity and authentic intent",
+        action_clause=_ACTION_CLAUSES[bool(actionable)],
+        empathy_clause=_EMPATHY_CLAUSES[bool(empathy)],
+        language=_normalize_language(language),
+        message=message.strip(),
     )
-    direction_briefs = {
-        "Clarify": "distill the message to its sharpest narrative so the receiver instantly grasps the ask.",
-        "Persuade": "emphasize benefits, momentum, and compelling language that nudges agreement.",
-        "Inspire": "elevate the tone with motivating language that sparks curiosity or action.",
-        "Reassure": "project stability, confidence, and calm authority to reduce any doubts.",
-    }
-    energy_labels = {
-        1: "calm and measured",
-        2: "steady and composed",
-        3: "engaged and confident",
-        4: "dynamic and forward-leaning",
-        5: "bold and high-energy",
-    }
 
-    prompt = textwrap.dedent(
-        f"""
-        You are the Message Direction Analyst. Refine the user's message using the controls below.
-
-        Primary directive: {direction} — {direction_briefs.get(direction, '')}
-        Audience emphasis: {audience}
-        Tone palette: {tone} with an overall energy that feels {energy_labels.get(energy, 'confident')}.
-        Depth mode: {depth_mode} ({_depth_description(depth_mode)})
-        Length preference: {length_pref} ({_length_advice(length_pref)})
-        Focus priorities: {focus_section}
-        Guidelines: {action_clause} {empathy_clause}
-
-        Output requirements:
-        - Deliver a single refined message (plain text, no markdown bullets).
-        - Keep the prose fluent and human, mirroring a native {normalized_language} writer.
-        - Ensure the final response is written entirely in {normalized_language}.
-        - Honor the requested length and tone even if you must rearrange content.
-
-        Original message:
-        ---
-        {message.strip()}
-        ---
-        """
-    ).strip()
 
-    return prompt
+_DEFAULT_CONTROLS: Dict[str, Any] = {
+    "tone": "Warm",
+    "direction": "Clarify",
+    "focus_points": ["Call-to-action clarity"],
+    "audience": "Executive stakeholder",
+    "depth_mode": "Balanced",
+    "length_pref": "Standard",
+    "energy": 3,
+    "actionable": True,
+    "empathy": False,
+    "language": "English",
+}
+
+_CONTROL_CHOICES: Dict[str, Dict[Any, str]] = {
+    "direction": _DIRECTION_BRIEFS,
+    "depth_mode": _DEPTH_DESCRIPTIONS,
+    "length_pref": _LENGTH_ADVICE,
+    "energy": _ENERGY_LABELS,
+}
+
+
+def _parse_controls(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate the control fields of a request body, filling in the UI defaults.
+
+    Raises ``ValueError`` naming the first invalid field. The result holds every control
+    except ``message`` and is what ``MessageDirectionAnalyst.forward(controls=...)`` expects.
+    """
+    controls = {name: payload.get(name, default) for name, default in _DEFAULT_CONTROLS.items()}
+
+    for name in ("tone", "audience", "language"):
+        if not isinstance(controls[name], str) or not controls[name].strip():
+            raise ValueError(f"field '{name}' must be a non-empty string")
+        controls[name] = controls[name].strip()
+    for name in ("actionable", "empathy"):
+        if not isinstance(controls[name], bool):
+            raise ValueError(f"field '{name}' must be a boolean")
+    focus_points = controls["focus_points"]
+    if not isinstance(focus_points, list) or not all(isinstance(point, str) for point in focus_points):
+        raise ValueError("field 'focus_points' must be an array of strings")
+    if isinstance(controls["energy"], bool):
+        raise ValueError("field 'energy' must be an integer")
+    for name, choices in _CONTROL_CHOICES.items():
+        if controls[name] not in choices:
+            allowed = ", ".join(str(choice) for choice in choices)
+            raise ValueError(f"field '{name}' must be one of: {allowed}")
+    return controls
 
 
 def _get_message_stats(message: str) -> Dict[str, Any]:
@@ -287,8 +748,6 @@ if __name__ == "__main__":
     import streamlit as st
     from st_copy import copy_button
 
-    model = MessageDirectionAnalyst()
-
     st.set_page_config(
         page_title="Message Direction Analyst",
         page_icon="🧠",
@@ -300,16 +759,21 @@ if __name__ == "__main__":
 
     @st.cache_resource(show_spinner=False)
     def _get_api_server() -> MessageAnalystAPIServer:
-        server = MessageAnalystAPIServer(model.forward)
+        server = create_api_server(MessageDirectionAnalyst())
         server.start()
         return server
 
-    api_server = _get_api_server()
-    api_internal_base_url = api_server.internal_base_url
-    api_public_base_url = api_server.base_url
+    # with a standalone API (python -m serve_api) the UI is a plain client; otherwise it hosts the API itself
+    api_internal_base_url = os.getenv("MESSAGE_ANALYST_API_INTERNAL_URL", "").strip().rstrip("/")
+    if api_internal_base_url:
+        api_public_base_url = (os.getenv("MESSAGE_ANALYST_API_URL") or api_internal_base_url).rstrip("/")
+    else:
+        api_server = _get_api_server()
+        api_internal_base_url = api_server.internal_base_url
+        api_public_base_url = api_server.base_url
+    # composes the same prompt as the server, for the context expander only
+    prompt_preview = AnalysisPrompt(os.getenv("MESSAGE_ANALYST_PROMPT_LAYOUT", "classic").strip().lower())
 
-    if "history" not in st.session_state:
-        st.session_state.history = []
     if "last_latency_ms" not in st.session_state:
         st.session_state.last_latency_ms = None
 
@@ -331,12 +795,13 @@ if __name__ == "__main__":
     with st.sidebar:
         st.subheader("Live REST endpoint")
         st.code(f"POST {api_public_base_url}/api/analyze", language="text")
-        st.caption('Payload: {"query": "..."}')
+        st.caption('Payload: {"message": "...", "direction": "Clarify", "language": "English"}')
         st.divider()
         st.subheader("Session signals")
         latency = st.session_state.last_latency_ms
         st.metric("Last latency", f"{latency} ms" if latency else "—")
-        st.metric("Saved runs", len(st.session_state.history))
+        saved = _history_api(api_internal_base_url, {"limit": 1})
+        st.metric("Saved runs", f"{saved.get('total', 0)}+" if saved.get("total_capped") else saved.get("total", 0))
         st.divider()
         st.caption("Tips")
         st.write(
@@ -420,6 +885,13 @@ if __name__ == "__main__":
         audience = st.selectbox("Audience", options=audience_options, index=0)
         actionable = st.toggle("Highlight actionable next steps", value=True)
         empathy = st.toggle("Include empathetic framing", value=False)
+        angle_count = st.slider(
+            "Alternative angles",
+            min_value=1,
+            max_value=len(ANGLES),
+            value=1,
+            help="Above 1, each angle is generated in parallel and the analyst picks the strongest.",
+        )
 
         user_query = st.text_area(
             "Draft or paste your message",
@@ -472,30 +944,61 @@ if __name__ == "__main__":
         if not trimmed:
             st.warning("Add a message draft to analyze.")
         else:
-            model.set_language(language)
-            composed_prompt = _compose_analysis_prompt(
-                trimmed,
-                tone=tone,
-                direction=direction,
-                focus_points=focus_points,
-                audience=audience,
-                depth_mode=depth_mode,
-                length_pref=length_pref,
-                energy=energy,
-                actionable=actionable,
-                empathy=empathy,
-                language=language,
-            )
+            controls = {
+                "tone": tone,
+                "direction": direction or _DEFAULT_CONTROLS["direction"],
+                "focus_points": focus_points,
+                "audience": audience,
+                "depth_mode": depth_mode,
+                "length_pref": length_pref or _DEFAULT_CONTROLS["length_pref"],
+                "energy": energy,
+                "actionable": actionable,
+                "empathy": empathy,
+                "language": language,
+            }
+            composed_prompt = prompt_preview(trimmed, controls)
+
+            live_output = analysis_container.empty()
+            api_response: Dict[str, Any] = {}
+            payload = {"message": trimmed, **controls}
+            if angle_count > 1:
+                payload["angles"] = angle_count
+
+            def _stream_tokens() -> Iterator[str]:
+                for event in _stream_api(api_internal_base_url, payload):
+                    if event.get("type") == "token":
+                        yield event.get("text", "")
+                    elif event.get("type") == "done":
+                        api_response.update(event)
+
+            def _stream_angles() -> None:
+                # one column per angle, filled in as soon as that angle finishes
+                slots = [column.empty() for column in st.columns(angle_count)]
+                for slot, name in zip(slots, ANGLES):
+                    slot.caption(f"{name} · generating…")
+                for event in _stream_api(api_internal_base_url, payload):
+                    if event.get("type") == "angle":
+                        with slots[event["index"]].container():
+                            st.markdown(f"**{event['angle']}**")
+                            st.write(event.get("response") or event.get("detail", "No answer."))
+                    elif event.get("type") == "done":
+                        api_response.update(event)
 
             with st.status("Synthesizing direction...", expanded=True) as status:
                 status.write("Aligning your controls with the analyst brief.")
                 status.write("Contacting analysis API.")
                 try:
-                    api_response = _call_api(api_internal_base_url, {"query": composed_prompt})
+                    with live_output.container():
+                        if angle_count > 1:
+                            _stream_angles()
+                        else:
+                            st.write_stream(_stream_tokens())
                 except RuntimeError as api_error:
                     status.update(label="Analysis failed", state="error")
+                    live_output.empty()
                     analysis_container.error(str(api_error))
                 else:
+                    live_output.empty()
                     status.update(label="Analysis complete", state="complete")
                     response_text = api_response.get("response", "").strip()
                     metadata = api_response.get("meta", {})
@@ -506,23 +1009,14 @@ if __name__ == "__main__":
                     else:
                         latency = metadata.get("took_ms")
                         st.session_state.last_latency_ms = latency
+                        # the API server records the run in the shared history itself
                         timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
-                        history_entry = {
-                            "ts": timestamp,
-                            "direction": direction,
-                            "tone": tone,
-                            "audience": audience,
-                            "length": length_pref,
-                            "depth": depth_mode,
-                            "focus": focus_points,
-                            "response": response_text,
-                        }
-                        st.session_state.history.insert(0, history_entry)
-                        st.session_state.history = st.session_state.history[:5]
                         analysis_result = {
                             "response": response_text,
                             "meta": metadata,
                             "timestamp": timestamp,
+                            "angles": api_response.get("angles", []),
+                            "selected": api_response.get("selected"),
                         }
 
     if analysis_result:
@@ -536,6 +1030,14 @@ if __name__ == "__main__":
             latency = meta.get("took_ms")
             if latency:
                 st.caption(f"Generated via REST API in {latency} ms at {analysis_result['timestamp']}.")
+            alternatives = [angle for angle in analysis_result["angles"] if angle.get("response")]
+            if len(alternatives) > 1:
+                st.subheader("Alternative angles")
+                for column, angle in zip(st.columns(len(alternatives)), alternatives):
+                    with column:
+                        chosen = " · selected" if angle["index"] == analysis_result["selected"] else ""
+                        st.markdown(f"**{angle['angle']}**{chosen}")
+                        st.write(angle["response"])
             with st.expander("Prompt context sent to analyst", expanded=False):
                 st.code(composed_prompt, language="markdown")
 
@@ -555,14 +1057,20 @@ if __name__ == "__main__":
             st.markdown("\n".join(f"- {p}" for p in summary_points))
 
         with tabs[2]:
-            st.subheader("Session history (latest 5)")
-            if not st.session_state.history:
+            st.subheader("Recent runs")
+            # shared by every user and API client; runs are written within a second of finishing
+            runs = _history_api(api_internal_base_url, {"limit": 10})["items"]
+            if not runs:
                 st.caption("No prior runs yet.")
             else:
-                for entry in st.session_state.history:
-                    st.markdown(f"**{entry['ts']}** — {entry['direction']} · {entry['tone']} · {entry['length']}")
-                    st.caption(f"Audience: {entry['audience']} · Depth: {entry['depth']}")
-                    preview = entry["response"]
+                for entry in runs:
+                    run_controls = entry.get("controls") or {}
+                    run_ts = datetime.utcfromtimestamp(entry["ts"]).strftime("%Y-%m-%d %H:%M UTC")
+                    st.markdown(
+                        f"**{run_ts}** — {entry.get('direction') or 'Raw query'} · {run_controls.get('tone', '—')} · {run_controls.get('length_pref', '—')}"
+                    )
+                    st.caption(f"Audience: {entry.get('audience') or '—'} · Depth: {run_controls.get('depth_mode', '—')} · {entry.get('took_ms')} ms")
+                    preview = entry["response"] or ""
                     if len(preview) > 260:
                         preview = preview[:260] + "…"
                     st.write(preview)
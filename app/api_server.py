@@ -1,31 +1,452 @@
+import asyncio
+import gzip
 import json
 import logging
 import os
+import select
+import socket
 import threading
 import time
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field, replace
 from http import HTTPStatus
 from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
-from typing import Callable, Optional
+from typing import AsyncIterator, Awaitable, Callable, Iterator, Optional, Sequence
+from urllib.parse import parse_qs, urlsplit
+
+from noton.Cache import ResponseCache, cache_key
+from noton.Cancel import CancelToken, RequestCancelled, cancel_scope
+from noton.Flight import SingleFlight
+from noton import Json
+from noton.History import RunHistory
+from noton.Jobs import JobStore, check_callback_url
+from noton.Metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from noton.Metrics import Histogram, MetricsRegistry, default_registry
+from noton.Retry import CircuitOpenError, DeadlineExceededError
+from noton.Scheduler import PRIORITY_CLASSES, AdmissionScheduler, OverloadedError, QueueFullError
+from noton.Usage import track_usage
 
 
 LOGGER = logging.getLogger(__name__)
 
+# "on" keeps the model's default reasoning, "off" disables it, the levels cap it
+REASONING_MODES = ("on", "off", "low", "medium", "high")
+
+_MAX_STOP_SEQUENCES = 4
+
+_METRIC_ROUTES = {"/api/analyze", "/api/analyze/stream", "/api/analyze/batch", "/api/jobs", "/api/health", "/api/metrics", "/api/history"}
+
+_MAX_HISTORY_PAGE = 200
+
+# nginx's status for a client that closed the connection before the answer was ready
+_CLIENT_CLOSED_REQUEST = 499
+
+# shed load and abandoned requests are routine, only real failures get a traceback
+_ROUTINE_ERRORS = (OverloadedError, RequestCancelled)
+
 
-def _read_json_body(handler: BaseHTTPRequestHandler) -> tuple[Optional[dict], Optional[str]]:
-    """Helper to read and parse a JSON body from the incoming request."""
+def stage_histogram(registry: Optional[MetricsRegistry] = None) -> Histogram:
+    """Per-stage request latency; the server records ``queue`` and ``serialize``, the model its pipeline stages."""
+    registry = registry if registry is not None else default_registry()
+    return registry.histogram("message_analyst_stage_seconds", "Time spent in one stage of a request.", ["stage"])
+
+
+class _RequestBodyError(Exception):
+    """A request body refused before it reaches a route, with the status to answer."""
+
+    def __init__(self, status: HTTPStatus, detail: str) -> None:
+        super().__init__(detail)
+        self.status = status
+
+
+def _body_length(headers, max_body_bytes: int) -> int:
+    """Length of the request body announced by ``headers``; refused before any of it is read."""
+    # lower-case names work for both http.server's headers and the asyncio transport's dict
+    if headers.get("transfer-encoding"):
+        raise _RequestBodyError(HTTPStatus.LENGTH_REQUIRED, "Send the request body with a Content-Length header.")
     try:
-        content_length = int(handler.headers.get("Content-Length", "0"))
-    except (TypeError, ValueError):
-        return None, "Invalid Content-Length header"
+        length = int(headers.get("content-length") or "0")
+    except ValueError:
+        raise _RequestBodyError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length header") from None
+    if length < 0:
+        raise _RequestBodyError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length header")
+    if length > max_body_bytes:
+        raise _RequestBodyError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Request body exceeds {max_body_bytes} bytes.")
+    return length
+
+
+def _parse_body(raw: bytes, content_encoding: Optional[str], max_body_bytes: int):
+    """Decode a JSON request body, inflating it first when it was sent with ``Content-Encoding: gzip``."""
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding == "gzip" and raw:
+        inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            # inflating stops one byte past the limit, so a small bomb cannot expand in memory
+            raw = inflater.decompress(raw, max_body_bytes + 1)
+        except zlib.error:
+            raise _RequestBodyError(HTTPStatus.BAD_REQUEST, "Request body is not valid gzip") from None
+        if len(raw) > max_body_bytes:
+            raise _RequestBodyError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Request body exceeds {max_body_bytes} bytes.")
+    elif encoding not in {"identity", "gzip"}:
+        raise _RequestBodyError(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, f"Unsupported Content-Encoding: {encoding}")
+    if not raw:
+        raise _RequestBodyError(HTTPStatus.BAD_REQUEST, "Request body is empty")
+    try:
+        return Json.loads(raw)
+    except ValueError:
+        raise _RequestBodyError(HTTPStatus.BAD_REQUEST, "Request body must be valid JSON") from None
+
+
+def _accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    for part in (accept_encoding or "").lower().split(","):
+        name, _, params = part.partition(";")
+        if name.strip() in {"gzip", "*"}:
+            quality = params.strip().replace(" ", "")
+            return not (quality.startswith("q=") and quality[2:].strip("0.") == "")
+    return False
+
+
+@dataclass
+class _AnalyzeRequest:
+    query: str
+    options: dict = field(default_factory=dict)  # keyword arguments for forward_fn
+    bypass_cache: bool = False
+    priority: str = "normal"  # admission class, see noton.Scheduler.PRIORITY_CLASSES
+    client: str = ""  # fair-share identity within a priority class
+    angles: int = 0  # alternatives generated in parallel; 0 asks for a single answer
+    route: str = "/api/analyze"  # recorded with the run in the history
+    timeout: Optional[float] = None  # seconds the client is willing to wait, from the body
+    deadline: Optional[float] = None  # monotonic time after which the upstream call is abandoned
+    cancel: Optional[CancelToken] = None  # fires on the deadline or when the client disconnects
+
+
+def _parse_generation(payload: dict) -> tuple[dict, Optional[str]]:
+    """Validate the optional generation fields into the model's ``generation`` option."""
+    generation = {}
+
+    max_tokens = payload.get("max_tokens")
+    if max_tokens is not None:
+        if not isinstance(max_tokens, int) or isinstance(max_tokens, bool) or max_tokens < 1:
+            return {}, "Field 'max_tokens' must be a positive integer."
+        generation["max_tokens"] = max_tokens
+
+    temperature = payload.get("temperature")
+    if temperature is not None:
+        if not isinstance(temperature, (int, float)) or isinstance(temperature, bool) or not 0 <= temperature <= 2:
+            return {}, "Field 'temperature' must be a number between 0 and 2."
+        generation["temperature"] = float(temperature)
+
+    stop = payload.get("stop")
+    if stop is not None:
+        stop = [stop] if isinstance(stop, str) else stop
+        if (
+            not isinstance(stop, list)
+            or not 1 <= len(stop) <= _MAX_STOP_SEQUENCES
+            or not all(isinstance(sequence, str) and sequence for sequence in stop)
+        ):
+            return {}, f"Field 'stop' must be a non-empty string or an array of at most {_MAX_STOP_SEQUENCES} of them."
+        generation["stop"] = stop
 
-    raw_body = handler.rfile.read(content_length) if content_length > 0 else b""
-    if not raw_body:
-        return None, "Request body is empty"
+    reasoning = payload.get("reasoning")
+    if reasoning is not None:
+        if reasoning not in REASONING_MODES:
+            return {}, f"Field 'reasoning' must be one of: {', '.join(REASONING_MODES)}."
+        generation["reasoning"] = reasoning
+    return generation, None
 
+
+def _parse_analyze_payload(
+    payload: Optional[dict],
+    controls_fn: Optional[Callable[[dict], dict]] = None,
+    max_angles: int = 0,
+) -> tuple[Optional[_AnalyzeRequest], Optional[str]]:
+    """Validate an analyze body (a 'query', or a 'message' with its controls) into ``(request, error)``."""
+    controls = None
+    if isinstance(payload, dict) and "query" not in payload and "message" in payload:
+        if controls_fn is None:
+            return None, "This server does not accept control sets; send 'query' instead."
+        message = payload.get("message")
+        if not isinstance(message, str) or not message.strip():
+            return None, "Field 'message' must be a non-empty string."
+        try:
+            controls = controls_fn(payload)
+        except (TypeError, ValueError) as exc:
+            return None, f"Invalid control set: {exc}"
+        payload = {**payload, "query": message}
+
+    query = payload.get("query") if isinstance(payload, dict) else None
+    if not isinstance(query, str) or not query.strip():
+        return None, "Field 'query' must be a non-empty string."
+
+    session_id = payload.get("session_id")
+    if session_id is not None and (not isinstance(session_id, str) or not session_id.strip()):
+        return None, "Field 'session_id' must be a non-empty string."
+
+    language = payload.get("language")
+    if language is not None and (not isinstance(language, str) or not language.strip()):
+        return None, "Field 'language' must be a non-empty string."
+
+    cache_mode = payload.get("cache", "use")
+    if cache_mode not in {"use", "bypass"}:
+        return None, "Field 'cache' must be either 'use' or 'bypass'."
+
+    timeout = payload.get("timeout")
+    if timeout is not None and (not isinstance(timeout, (int, float)) or isinstance(timeout, bool) or not timeout > 0):
+        return None, "Field 'timeout' must be a positive number of seconds."
+
+    angles = payload.get("angles", 0)
+    if angles:
+        if max_angles < 2:
+            return None, "This server does not generate alternative angles."
+        if not isinstance(angles, int) or isinstance(angles, bool) or not 2 <= angles <= max_angles:
+            return None, f"Field 'angles' must be an integer between 2 and {max_angles}."
+        if session_id:
+            return None, "Field 'angles' cannot be combined with 'session_id'."
+
+    generation, error = _parse_generation(payload)
+    if error:
+        return None, error
+
+    # only sessions opt into history; plain queries stay stateless
+    options = {"session_id": session_id.strip()} if session_id else {}
+    # the response language travels with the request instead of being set on the shared model
+    if language:
+        options["language"] = language.strip()
+    # the model composes the prompt from the draft and its validated controls
+    if controls is not None:
+        options["controls"] = controls
+    if generation:
+        options["generation"] = generation
+    return _AnalyzeRequest(query=query, options=options, bypass_cache=cache_mode == "bypass", angles=angles or 0, timeout=timeout), None
+
+
+def _upstream_error(exc: BaseException) -> tuple[int, dict]:
+    """Map a failed model call onto an HTTP status and error body."""
+    if isinstance(exc, RequestCancelled):
+        if exc.reason == "disconnect":
+            # recorded in the metrics only; there is nobody left to send it to
+            return _CLIENT_CLOSED_REQUEST, {"error": "Client Closed Request", "detail": "The client disconnected; generation was stopped."}
+        return HTTPStatus.GATEWAY_TIMEOUT, {"error": "Gateway Timeout", "detail": "Request deadline exceeded; generation was stopped."}
+    if isinstance(exc, OverloadedError):
+        status = HTTPStatus.TOO_MANY_REQUESTS if isinstance(exc, QueueFullError) else HTTPStatus.SERVICE_UNAVAILABLE
+        return status, {"error": status.phrase, "detail": str(exc)}
+    if isinstance(exc, CircuitOpenError):
+        return HTTPStatus.SERVICE_UNAVAILABLE, {
+            "error": "Service Unavailable",
+            "detail": "LLM backend is unavailable; retry later.",
+        }
+    if isinstance(exc, (DeadlineExceededError, TimeoutError)):
+        return HTTPStatus.GATEWAY_TIMEOUT, {"error": "Gateway Timeout", "detail": "LLM backend did not answer in time."}
+    return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Internal Server Error", "detail": "Unable to generate response."}
+
+
+def _parse_batch_payload(
+    payload: Optional[dict],
+    controls_fn: Optional[Callable[[dict], dict]],
+    *,
+    max_items: int,
+    default_concurrency: int,
+    max_concurrency: int,
+) -> tuple[list[tuple[Optional[_AnalyzeRequest], Optional[str]]], int, Optional[str]]:
+    """Validate a batch body into per-item ``(request, error)`` pairs and the fan-out width."""
+    items = payload.get("items") if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items:
+        return [], 0, "Field 'items' must be a non-empty array."
+    if len(items) > max_items:
+        return [], 0, f"A batch may contain at most {max_items} items."
+
+    concurrency = payload.get("concurrency", default_concurrency)
+    if not isinstance(concurrency, int) or isinstance(concurrency, bool) or concurrency < 1:
+        return [], 0, "Field 'concurrency' must be a positive integer."
+
+    cache_mode = payload.get("cache", "use")
+    parsed = [_parse_batch_item(item, controls_fn, cache_mode) for item in items]
+    return parsed, min(concurrency, max_concurrency), None
+
+
+def _parse_batch_item(
+    item: object,
+    controls_fn: Optional[Callable[[dict], dict]],
+    cache_mode: object,
+) -> tuple[Optional[_AnalyzeRequest], Optional[str]]:
+    """A batch item is a query string, an analyze body, or a control set with a 'message'."""
+    if isinstance(item, str):
+        item = {"query": item}
+    if not isinstance(item, dict):
+        return None, "Each item must be a query string or an object."
+
+    return _parse_analyze_payload({"cache": cache_mode, **item}, controls_fn)
+
+
+def _client_gone(exc: BaseException) -> bool:
+    return isinstance(exc, RequestCancelled) and exc.reason == "disconnect"
+
+
+def _header_timeout(headers) -> tuple[Optional[float], Optional[str]]:
+    """Seconds asked for by the X-Request-Timeout header (``None`` when absent), or an error."""
+    header = (headers.get("x-request-timeout") or "").strip()
+    if not header:
+        return None, None
     try:
-        return json.loads(raw_body.decode("utf-8")), None
-    except json.JSONDecodeError:
-        return None, "Request body must be valid JSON"
+        timeout = float(header)
+    except ValueError:
+        timeout = 0.0
+    if not timeout > 0:
+        return None, "Header 'X-Request-Timeout' must be a positive number of seconds."
+    return timeout, None
+
+
+def _wait_timeout(request: _AnalyzeRequest) -> Optional[float]:
+    """Seconds a coalesced request may wait for the shared call: what is left of its own deadline."""
+    return max(request.deadline - time.monotonic(), 0.0) if request.deadline is not None else None
+
+
+def _cancelled_for_another(request: _AnalyzeRequest, exc: BaseException) -> bool:
+    """Whether ``exc`` stopped a shared call on behalf of another request, not ``request``."""
+    return isinstance(exc, RequestCancelled) and (request.cancel is None or request.cancel.reason is None)
+
+
+def _peer_closed(sock: socket.socket) -> bool:
+    """Whether the client closed ``sock``: readable, yet a peek finds end-of-stream."""
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        return bool(readable) and sock.recv(1, socket.MSG_PEEK) == b""
+    except (OSError, ValueError):
+        return True
+
+
+def _angle_event(index: int, angle: str, result: Optional[tuple[str, dict]], exc: Optional[BaseException] = None) -> dict:
+    """NDJSON ``angle`` event for one finished alternative, or its error."""
+    if exc is not None:
+        if not isinstance(exc, _ROUTINE_ERRORS):
+            LOGGER.error("Failed to generate angle %r: %s", angle, exc)
+        return {"type": "angle", "index": index, "angle": angle, **_upstream_error(exc)[1]}
+    answer, meta = result
+    return {"type": "angle", "index": index, "angle": angle, "response": answer, "meta": meta}
+
+
+def _total_usage(usages) -> dict:
+    """Sum of several ``meta.usage`` dicts; missing ones (cached or failed answers) count as zero."""
+    total = {"prompt_tokens": 0, "completion_tokens": 0, "reasoning_tokens": 0, "calls": 0, "truncated": False}
+    for usage in usages:
+        for name, value in (usage or {}).items():
+            total[name] = (total[name] or value) if name == "truncated" else total[name] + value
+    return total
+
+
+def _angles_body(request: _AnalyzeRequest, events: list[dict], selected: int, started: float, select_ms: float) -> dict:
+    """Response body of a multi-angle request; ``response`` is the selected alternative."""
+    angles = sorted(({k: v for k, v in event.items() if k != "type"} for event in events), key=lambda angle: angle["index"])
+    elapsed_ms = round((time.perf_counter() - started) * 1000.0, 2)
+    return {
+        "query": request.query,
+        "response": angles[selected]["response"],
+        "selected": selected,
+        "angles": angles,
+        "meta": {
+            "took_ms": elapsed_ms,
+            "select_ms": select_ms,
+            "failed": sum("error" in angle for angle in angles),
+            "usage": _total_usage(angle.get("meta", {}).get("usage") for angle in angles),
+        },
+    }
+
+
+def _error_headers(exc: BaseException) -> dict:
+    if isinstance(exc, OverloadedError):
+        return {"Retry-After": str(int(exc.retry_after + 0.999))}
+    return {}
+
+
+def _priority_keys_from_env() -> dict[str, str]:
+    """Parse MESSAGE_ANALYST_PRIORITY_KEYS ("key1:interactive,key2:batch") into key -> class."""
+    mapping = {}
+    for entry in os.getenv("MESSAGE_ANALYST_PRIORITY_KEYS", "").split(","):
+        key, _, priority = entry.strip().rpartition(":")
+        if key and priority in PRIORITY_CLASSES:
+            mapping[key] = priority
+    return mapping
+
+
+def _default_cache_key(query: str, **options) -> str:
+    controls = options.get("controls")
+    controls_key = json.dumps(controls, sort_keys=True) if controls is not None else ""
+    generation_key = json.dumps(options.get("generation") or {}, sort_keys=True)
+    return cache_key(query, controls_key, options.get("language") or "", options.get("angle") or "", generation_key)
+
+
+def _history_from_env() -> Optional[RunHistory]:
+    path = os.getenv("MESSAGE_ANALYST_HISTORY_PATH", "history.db")
+    if not path:
+        return None
+    return RunHistory(
+        path,
+        batch_size=int(os.getenv("MESSAGE_ANALYST_HISTORY_BATCH", "256")),
+        flush_interval=float(os.getenv("MESSAGE_ANALYST_HISTORY_FLUSH_INTERVAL", "0.5")),
+        max_rows=int(os.getenv("MESSAGE_ANALYST_HISTORY_MAX_ROWS", "100000")),
+        max_age=float(os.getenv("MESSAGE_ANALYST_HISTORY_MAX_AGE", "2592000")),
+    )
+
+
+def _parse_history_query(query_string: str) -> tuple[dict, Optional[str]]:
+    """Validate the ``/api/history`` query string into keyword arguments for ``RunHistory.query``."""
+    params = {name: values[-1] for name, values in parse_qs(query_string).items()}
+    query: dict = {}
+    try:
+        query["limit"] = int(params.pop("limit", "20"))
+        if "cursor" in params:
+            query["before"] = int(params.pop("cursor"))
+        for name in ("since", "until"):
+            if name in params:
+                query[name] = float(params.pop(name))
+    except ValueError:
+        return {}, "Parameters 'limit' and 'cursor' must be integers, 'since' and 'until' Unix timestamps."
+    if not 1 <= query["limit"] <= _MAX_HISTORY_PAGE:
+        return {}, f"Parameter 'limit' must be between 1 and {_MAX_HISTORY_PAGE}."
+    for name in ("direction", "audience", "language", "angle", "prompt_hash"):
+        if name in params:
+            query[name] = params.pop(name)
+    if params:
+        return {}, f"Unknown parameter: {sorted(params)[0]!r}"
+    return query, None
+
+
+def _cache_from_env() -> Optional[ResponseCache]:
+    max_entries = int(os.getenv("MESSAGE_ANALYST_CACHE_SIZE", "1024"))
+    if max_entries <= 0:
+        return None
+    return ResponseCache(
+        max_entries=max_entries,
+        ttl_seconds=float(os.getenv("MESSAGE_ANALYST_CACHE_TTL", "3600")),
+        path=os.getenv("MESSAGE_ANALYST_CACHE_PATH") or None,
+    )
+
+
+def _job_error(exc: BaseException) -> dict:
+    """A failed job's ``error``: the body ``/api/analyze`` would have answered, plus its status."""
+    status, body = _upstream_error(exc)
+    return {"status": int(status), **body}
+
+
+def _jobs_from_env(metrics: MetricsRegistry) -> Optional[JobStore]:
+    workers = int(os.getenv("MESSAGE_ANALYST_JOB_WORKERS", "4"))
+    if workers <= 0:
+        return None
+    return JobStore(
+        workers=workers,
+        max_pending=int(os.getenv("MESSAGE_ANALYST_JOB_MAX_PENDING", "1000")),
+        ttl_seconds=float(os.getenv("MESSAGE_ANALYST_JOB_TTL", "3600")),
+        path=os.getenv("MESSAGE_ANALYST_JOB_STORE_PATH") or None,
+        error_fn=_job_error,
+        # hosts a job's callback_url may point at; empty allows any public address
+        callback_hosts=[host for host in os.getenv("MESSAGE_ANALYST_JOB_CALLBACK_HOSTS", "").split(",") if host.strip()],
+        metrics=metrics,
+    )
+
+
+_ALLOWED_HEADERS = "Content-Type, X-Priority, X-Client-Id, X-API-Key, X-Request-Timeout"
 
 
 class _APIServer(ThreadingHTTPServer):
@@ -37,20 +458,129 @@ class MessageAnalystAPIServer:
 
     def __init__(
         self,
-        forward_fn: Callable[[str], str],
+        forward_fn: Callable[..., str],
         *,
+        stream_fn: Optional[Callable[..., Iterator[str]]] = None,
+        async_forward_fn: Optional[Callable[..., Awaitable[str]]] = None,
+        async_stream_fn: Optional[Callable[..., AsyncIterator[str]]] = None,
         host: Optional[str] = None,
         port: Optional[int] = None,
+        mode: Optional[str] = None,
+        max_inflight: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+        cache: Optional[ResponseCache] = None,
+        cache_key_fn: Optional[Callable[..., str]] = None,
+        cacheable_fn: Optional[Callable[[str], bool]] = None,
+        controls_fn: Optional[Callable[[dict], dict]] = None,
+        angles: Optional[Sequence[str]] = None,
+        select_fn: Optional[Callable[..., int]] = None,
+        async_select_fn: Optional[Callable[..., Awaitable[int]]] = None,
+        health_fn: Optional[Callable[[], dict]] = None,
+        request_timeout: Optional[float] = None,
+        batch_concurrency: Optional[int] = None,
+        metrics: Optional[MetricsRegistry] = None,
+        history: Optional[RunHistory] = None,
+        jobs: Optional[JobStore] = None,
+        sock: Optional[socket.socket] = None,
+        drain_timeout: Optional[float] = None,
+        idle_timeout: Optional[float] = None,
+        max_body_bytes: Optional[int] = None,
+        gzip_min_bytes: Optional[int] = None,
         ready_timeout: float = 5.0,
     ) -> None:
         self._forward_fn = forward_fn
+        # without a streaming model, the stream route emits the full answer as one token
+        self._stream_fn = stream_fn or (lambda query, **options: iter([forward_fn(query, **options)]))
+        self._async_forward_fn = async_forward_fn or (
+            lambda query, **options: asyncio.to_thread(forward_fn, query, **options)
+        )
+        self._async_stream_fn = async_stream_fn or self._single_token_stream
+
+        # "threaded" (one thread per connection) or "asyncio" (one event loop for all connections)
+        self._mode = (mode or os.getenv("MESSAGE_ANALYST_API_MODE", "threaded")).strip().lower()
+        if self._mode not in {"threaded", "asyncio"}:
+            raise ValueError(f"Unknown API server mode: {self._mode!r}")
+        self._max_inflight = max_inflight or int(os.getenv("MESSAGE_ANALYST_API_MAX_INFLIGHT", "32"))
+        self._max_queue = max_queue if max_queue is not None else int(os.getenv("MESSAGE_ANALYST_API_MAX_QUEUE", "256"))
+        self._queue_timeout = queue_timeout or float(os.getenv("MESSAGE_ANALYST_API_QUEUE_TIMEOUT", "30"))
+        # every upstream call in either mode is admitted here: bounded, prioritized and fair per client
+        self._scheduler = AdmissionScheduler(self._max_inflight, self._max_queue, self._queue_timeout)
+        self._priority_keys = _priority_keys_from_env()
+
+        # cache_key_fn(query, **options) should fold in everything that shapes the answer (model, system prompt)
+        self._cache = cache if cache is not None else _cache_from_env()
+        self._cache_key_fn = cache_key_fn or _default_cache_key
+        # a streamed answer is filtered chunk by chunk; cacheable_fn(answer) says whether it
+        # equals what forward_fn would have returned, and only then is it cached
+        self._cacheable_fn = cacheable_fn or (lambda answer: True)
+        self._single_flight = SingleFlight()
+
+        # every answered run is appended here off the request path and served by GET /api/history
+        self._history = history if history is not None else _history_from_env()
+
+        # model calls receive deadline=<monotonic time>, keeping retries inside the client's timeout;
+        # a client may ask for less with X-Request-Timeout or a "timeout" field, never for more
+        self._request_timeout = request_timeout or float(os.getenv("MESSAGE_ANALYST_REQUEST_TIMEOUT", "110"))
+        # health_fn() may report upstream state, e.g. {"status": "degraded", "upstream": {...}}
+        self._health_fn = health_fn
+
+        # controls_fn(body) validates the controls sent with a 'message'; they reach the model as controls=...
+        self._controls_fn = controls_fn
+        self._batch_concurrency = batch_concurrency or int(os.getenv("MESSAGE_ANALYST_BATCH_CONCURRENCY", "4"))
+        self._batch_max_concurrency = max(
+            int(os.getenv("MESSAGE_ANALYST_BATCH_MAX_CONCURRENCY", "16")), self._batch_concurrency
+        )
+        self._batch_max_items = int(os.getenv("MESSAGE_ANALYST_BATCH_MAX_ITEMS", "10000"))
+
+        # "angles": n runs forward_fn once per angle name in parallel (angle=<name>), then
+        # select_fn(query, candidates, **options) picks the index of the answer to return
+        self._angles = list(angles or [])
+        self._select_fn = select_fn or (lambda query, candidates, **options: 0)
+        self._async_select_fn = async_select_fn or (
+            lambda query, candidates, **options: asyncio.to_thread(self._select_fn, query, candidates, **options)
+        )
+
+        # served as Prometheus text from GET /api/metrics, together with the LLM client's metrics
+        self._metrics = metrics if metrics is not None else default_registry()
+        self._http_requests = self._metrics.counter("message_analyst_http_requests_total", "HTTP requests by route and status.", ["route", "status"])
+        self._http_seconds = self._metrics.histogram("message_analyst_http_request_seconds", "HTTP request latency by route, streamed bodies included.", ["route"])
+        self._http_in_flight = self._metrics.gauge("message_analyst_http_in_flight", "HTTP requests being handled.", ["route"])
+        self._stage_seconds = stage_histogram(self._metrics)
+        self._cancellations = self._metrics.counter("message_analyst_cancelled_total", "Upstream generations stopped because the client left or its deadline passed.", ["reason"])
+        self._metrics.gauge("message_analyst_upstream_in_flight", "Upstream calls admitted by the scheduler.").set_function(
+            lambda: self._scheduler.stats()["in_flight"]
+        )
+        self._metrics.gauge("message_analyst_queue_depth", "Requests waiting for an upstream slot.", ["priority"]).set_function(
+            lambda: {(name,): depth for name, depth in self._scheduler.stats()["queued"].items()}
+        )
+
+        # POST /api/jobs answers at once; the analysis runs on the job store's worker pool
+        self._jobs = jobs if jobs is not None else _jobs_from_env(self._metrics)
+
         self._host = host or os.getenv("MESSAGE_ANALYST_API_HOST", "0.0.0.0")
         default_port = int(os.getenv("MESSAGE_ANALYST_API_PORT", "8601"))
         self._port = port or default_port
         self._public_base_url = os.getenv("MESSAGE_ANALYST_API_URL")
         self._ready_timeout = ready_timeout
+        # a listening socket to serve on instead of binding host:port, e.g. one shared by pre-forked workers
+        self._sock = sock
+        # on stop, requests already being answered get this many seconds to finish
+        self._drain_timeout = drain_timeout if drain_timeout is not None else float(os.getenv("MESSAGE_ANALYST_API_DRAIN_TIMEOUT", "10"))
+        self._active_requests = 0
+        self._idle = threading.Condition()
+        self._closing = False
+
+        # both modes keep HTTP/1.1 connections open between requests for this many idle seconds
+        self._idle_timeout = idle_timeout or float(os.getenv("MESSAGE_ANALYST_API_IDLE_TIMEOUT", "75"))
+        # larger request bodies are refused with a 413 before they are read
+        self._max_body_bytes = max_body_bytes or int(os.getenv("MESSAGE_ANALYST_API_MAX_BODY_BYTES", str(8 * 1024 * 1024)))
+        # JSON responses at least this large are gzipped for clients that accept it; 0 turns compression off
+        self._gzip_min_bytes = gzip_min_bytes if gzip_min_bytes is not None else int(os.getenv("MESSAGE_ANALYST_API_GZIP_MIN_BYTES", "4096"))
 
         self._httpd: Optional[_APIServer] = None
+        self._async_server = None
+        self._bound_port: Optional[int] = None
         self._thread: Optional[threading.Thread] = None
         self._ready = threading.Event()
         self._startup_error: Optional[BaseException] = None
@@ -61,8 +591,8 @@ class MessageAnalystAPIServer:
 
     @property
     def port(self) -> int:
-        if self._httpd:
-            return self._httpd.server_address[1]
+        if self._bound_port:
+            return self._bound_port
         return self._port
 
     @property
@@ -96,12 +626,44 @@ class MessageAnalystAPIServer:
         if self._startup_error:
             raise self._startup_error
 
-        LOGGER.info("Message analyst API server listening on %s:%s", self.host, self.port)
+        LOGGER.info("Message analyst API server (%s) listening on %s:%s", self._mode, self.host, self.port)
+
+    def stop(self, drain_timeout: Optional[float] = None) -> None:
+        """Stop accepting connections, let requests in progress finish for up to ``drain_timeout`` seconds, then close."""
+        drain_timeout = self._drain_timeout if drain_timeout is None else drain_timeout
+        drain_until = time.monotonic() + drain_timeout
+        # answers still being written tell their clients not to reuse the connection
+        self._closing = True
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            with self._idle:
+                self._idle.wait_for(lambda: self._active_requests == 0, timeout=drain_timeout)
+            self._httpd.server_close()
+        if self._async_server is not None:
+            self._async_server.stop(drain_timeout)
+        if self._thread is not None:
+            self._thread.join(timeout=self._ready_timeout + drain_timeout)
+        if self._jobs is not None:
+            # queued and running jobs share the drain time with the requests
+            self._jobs.close(max(drain_until - time.monotonic(), 0.0))
+        if self._history is not None:
+            # runs still queued for the history are written before the server is gone
+            self._history.flush()
 
     def _serve_forever(self) -> None:
         try:
+            if self._mode == "asyncio":
+                asyncio.run(self._serve_asyncio())
+                return
             handler_cls = self._build_handler()
-            self._httpd = _APIServer((self._host, self._port), handler_cls)
+            if self._sock is not None:
+                self._httpd = _APIServer(self._sock.getsockname(), handler_cls, bind_and_activate=False)
+                self._httpd.socket.close()
+                self._httpd.socket = self._sock
+                self._httpd.server_address = self._sock.getsockname()
+            else:
+                self._httpd = _APIServer((self._host, self._port), handler_cls)
+            self._bound_port = self._httpd.server_address[1]
             self._ready.set()
             self._httpd.serve_forever(poll_interval=0.5)
         except BaseException as ex:  # pylint: disable=broad-except
@@ -109,84 +671,696 @@ class MessageAnalystAPIServer:
             self._ready.set()
             LOGGER.exception("Failed to start API server: %s", ex)
 
+    def _cached_answer(self, request: _AnalyzeRequest) -> Optional[str]:
+        # session turns depend on earlier history, so they are never served from cache
+        if self._cache is None or request.bypass_cache or request.options.get("session_id"):
+            return None
+        return self._cache.get(self._cache_key_fn(request.query, **request.options))
+
+    def _store_answer(self, request: _AnalyzeRequest, answer: Optional[str]) -> None:
+        if self._cache is None or not answer or request.options.get("session_id"):
+            return
+        self._cache.set(self._cache_key_fn(request.query, **request.options), answer)
+
+    def _record_run(self, request: _AnalyzeRequest, answer: str, meta: dict) -> None:
+        if self._history is None:
+            return
+        controls = request.options.get("controls") or {}
+        usage = meta.get("usage") or {}
+        self._history.record(
+            {
+                "route": request.route,
+                # the cache key covers draft, controls, model and system prompt: runs with equal hashes asked the same thing
+                "prompt_hash": self._cache_key_fn(request.query, **request.options),
+                "direction": controls.get("direction"),
+                "audience": controls.get("audience"),
+                "language": request.options.get("language") or controls.get("language"),
+                "angle": request.options.get("angle"),
+                "controls": json.dumps({**controls, **request.options.get("generation", {})}, ensure_ascii=False),
+                "query": request.query,
+                "response": answer,
+                "took_ms": meta.get("took_ms"),
+                "queue_ms": meta.get("queue_ms"),
+                "prompt_tokens": usage.get("prompt_tokens"),
+                "completion_tokens": usage.get("completion_tokens"),
+                "cached": meta.get("cached", False),
+                "coalesced": meta.get("coalesced", False),
+            }
+        )
+
+    def _history_page(self, query_string: str) -> tuple[HTTPStatus, dict]:
+        if self._history is None:
+            return HTTPStatus.NOT_FOUND, {"error": "Not Found", "detail": "Run history is disabled."}
+        query, error = _parse_history_query(query_string)
+        if error:
+            return HTTPStatus.BAD_REQUEST, {"error": "Bad Request", "detail": error}
+        return HTTPStatus.OK, self._history.query(**query)
+
+    def _flight_key(self, request: _AnalyzeRequest) -> Optional[str]:
+        # session turns differ by history even for the same text, so they are never merged
+        if request.options.get("session_id"):
+            return None
+        return self._cache_key_fn(request.query, **request.options)
+
+    def _generate(self, request: _AnalyzeRequest) -> tuple[tuple[str, float, dict], bool]:
+        """Run forward_fn, sharing one call among identical concurrent requests.
+
+        Returns ``((answer, queue_ms, usage), coalesced)``.
+        """
+        flight_key = self._flight_key(request)
+        if flight_key is None:
+            return self._scheduled_forward(request), False
+        if request.cancel is not None:
+            # a shared call keeps going while other requests wait on it, whoever started it
+            request.cancel.hold_while(lambda: self._single_flight.waiting(flight_key) > 0)
+        while True:
+            try:
+                return self._single_flight.do(flight_key, self._scheduled_forward, request, wait_timeout=_wait_timeout(request))
+            except TimeoutError:
+                # the shared call outlived this request's deadline: the same 504 a leader gets
+                if request.cancel is not None:
+                    request.cancel.cancel("deadline")
+                    request.cancel.check()
+                raise
+            except RequestCancelled as exc:
+                # the leader ran out of time or lost its client; this request still has its own budget
+                if not _cancelled_for_another(request, exc):
+                    raise
+
+    def _scheduled_forward(self, request: _AnalyzeRequest) -> tuple[str, float, dict]:
+        with self._scheduler.slot(request.priority, request.client) as waited, track_usage() as usage:
+            self._stage_seconds.observe(waited, stage="queue")
+            with cancel_scope(request.cancel):
+                answer = self._forward_fn(request.query, **self._call_options(request))
+        return answer, round(waited * 1000.0, 2), usage.as_dict()
+
+    def _metric_route(self, path: str) -> str:
+        # unknown paths share one label so scanners cannot blow up the series count
+        route = path.split("?", 1)[0].rstrip("/")
+        if route.startswith("/api/jobs/"):
+            return "/api/jobs/{id}"
+        return route if route in _METRIC_ROUTES else "other"
+
+    def _observe_request(self, route: str, status: int, started: float) -> None:
+        self._http_requests.inc(route=route, status=str(status))
+        self._http_seconds.observe(time.perf_counter() - started, route=route)
+
+    def _dumps(self, payload: dict) -> bytes:
+        with self._stage_seconds.time(stage="serialize"):
+            return Json.dumps(payload)
+
+    def _encode(self, body: bytes, accept_encoding: Optional[str]) -> tuple[bytes, dict]:
+        """Gzip a response body that is large enough, for a client that accepts it; returns the body and its headers."""
+        if not self._gzip_min_bytes or len(body) < self._gzip_min_bytes:
+            return body, {}
+        if not _accepts_gzip(accept_encoding):
+            return body, {"Vary": "Accept-Encoding"}
+        with self._stage_seconds.time(stage="compress"):
+            # level 5 gets most of the size reduction at a fraction of level 9's cost
+            body = gzip.compress(body, compresslevel=5)
+        return body, {"Content-Encoding": "gzip", "Vary": "Accept-Encoding"}
+
+    def _classify(self, request: _AnalyzeRequest, headers, peer: str, default: str = "normal") -> None:
+        """Set the admission class and fair-share client of ``request`` from its HTTP headers.
+
+        A key listed in MESSAGE_ANALYST_PRIORITY_KEYS fixes the class; otherwise the
+        X-Priority header picks one of PRIORITY_CLASSES.
+        """
+        # lower-case names work for both http.server's headers and the asyncio transport's dict
+        api_key = headers.get("x-api-key") or ""
+        priority = self._priority_keys.get(api_key) or (headers.get("x-priority") or default).strip().lower()
+        request.priority = priority if priority in PRIORITY_CLASSES else default
+        request.client = api_key or headers.get("x-client-id") or peer
+
+    def _arm(self, request: _AnalyzeRequest, headers, probe: Optional[Callable[[], bool]] = None) -> Optional[str]:
+        """Give ``request`` its deadline and a cancel token; returns an error for a bad X-Request-Timeout.
+
+        The deadline is the shortest of the server's request timeout, the X-Request-Timeout
+        header and the body's ``timeout``, counted from now. ``probe()`` reports whether the
+        client has disconnected.
+        """
+        timeouts = [self._request_timeout]
+        if request.timeout is not None:
+            timeouts.append(float(request.timeout))
+        header_timeout, error = _header_timeout(headers)
+        if error:
+            return error
+        if header_timeout is not None:
+            timeouts.append(header_timeout)
+        request.deadline = time.monotonic() + min(timeouts)
+        request.cancel = CancelToken(request.deadline, probe, on_cancel=lambda reason: self._cancellations.inc(reason=reason))
+        return None
+
+    def _call_options(self, request: _AnalyzeRequest) -> dict:
+        """Keyword arguments for the model call: the request options plus a monotonic deadline."""
+        deadline = request.deadline if request.deadline is not None else time.monotonic() + self._request_timeout
+        return {**request.options, "deadline": deadline}
+
+    def _answer(self, request: _AnalyzeRequest) -> tuple[str, dict]:
+        """Answer from cache or the model; returns ``(answer, meta)``."""
+        started = time.perf_counter()
+        answer = self._cached_answer(request)
+        cached = answer is not None
+        coalesced = False
+        queue_ms = 0.0
+        usage = None  # token counts of the upstream call; a cached answer cost none
+        if not cached:
+            (answer, queue_ms, usage), coalesced = self._generate(request)
+            if not coalesced:
+                self._store_answer(request, answer)
+        elapsed_ms = round((time.perf_counter() - started) * 1000.0, 2)
+        meta = {"took_ms": elapsed_ms, "queue_ms": queue_ms, "cached": cached, "coalesced": coalesced, "usage": usage}
+        self._record_run(request, answer, meta)
+        return answer, meta
+
+    def _parse(self, payload: Optional[dict]) -> tuple[Optional[_AnalyzeRequest], Optional[str]]:
+        return _parse_analyze_payload(payload, self._controls_fn, len(self._angles))
+
+    def _angle_requests(self, request: _AnalyzeRequest) -> list[tuple[str, _AnalyzeRequest]]:
+        """One ordinary request per angle; each is cached, coalesced and admitted on its own."""
+        return [
+            (angle, replace(request, options={**request.options, "angle": angle}, angles=0))
+            for angle in self._angles[: request.angles]
+        ]
+
+    def _select(self, request: _AnalyzeRequest, events: list[dict]) -> tuple[int, float]:
+        """Index of the alternative to return, and the time the choice took in milliseconds."""
+        answered = sorted((event for event in events if "error" not in event), key=lambda event: event["index"])
+        started = time.perf_counter()
+        try:
+            with self._scheduler.slot(request.priority, request.client), cancel_scope(request.cancel):
+                choice = self._select_fn(request.query, [event["response"] for event in answered], **self._call_options(request))
+            if isinstance(choice, bool) or not isinstance(choice, int) or not 0 <= choice < len(answered):
+                raise ValueError(f"select_fn returned {choice!r}, not an angle index")
+        except RequestCancelled:
+            raise
+        except Exception as exc:  # pylint: disable=broad-except
+            # the alternatives are still worth returning; the first one stands in
+            LOGGER.warning("Angle selection failed, returning the first angle: %s", exc)
+            choice = 0
+        index = answered[choice]["index"]
+        return index, round((time.perf_counter() - started) * 1000.0, 2)
+
+    def _answer_angles(self, request: _AnalyzeRequest, on_angle: Optional[Callable[[dict], None]] = None) -> dict:
+        """Generate every angle in parallel, report each as it finishes, then select one."""
+        started = time.perf_counter()
+        events: list[dict] = []
+        errors: list[BaseException] = []
+        angle_requests = self._angle_requests(request)
+        with ThreadPoolExecutor(max_workers=len(angle_requests), thread_name_prefix="angle") as pool:
+            futures = {pool.submit(self._answer, sub): (index, angle) for index, (angle, sub) in enumerate(angle_requests)}
+            for future in as_completed(futures):
+                index, angle = futures[future]
+                exc = future.exception()
+                if exc is not None:
+                    errors.append(exc)
+                event = _angle_event(index, angle, None if exc else future.result(), exc)
+                events.append(event)
+                if on_angle is not None:
+                    on_angle(event)
+        if len(errors) == len(events):
+            # nothing to choose from: fail like a single-answer request would
+            raise errors[0]
+        selected, select_ms = self._select(request, events)
+        return _angles_body(request, events, selected, started, select_ms)
+
+    def _submit_job(self, payload: Optional[dict], headers, peer: str) -> tuple[HTTPStatus, dict, dict]:
+        """Validate an analyze body and queue it as a job; returns ``(status, body, headers)``."""
+        if self._jobs is None:
+            return HTTPStatus.NOT_FOUND, {"error": "Not Found", "detail": "Jobs are disabled on this server."}, {}
+        callback_url = payload.get("callback_url") if isinstance(payload, dict) else None
+        if callback_url is not None:
+            error = check_callback_url(callback_url, self._jobs.callback_hosts_)
+            if error:
+                return HTTPStatus.BAD_REQUEST, {"error": "Bad Request", "detail": error}, {}
+        request, error = self._parse(payload)
+        if error:
+            return HTTPStatus.BAD_REQUEST, {"error": "Bad Request", "detail": error}, {}
+        request.route = "/api/jobs"
+        self._classify(request, headers, peer)
+        # checked now so a bad header is a 400; the deadline itself starts with the job
+        error = self._arm(request, headers)
+        if error:
+            return HTTPStatus.BAD_REQUEST, {"error": "Bad Request", "detail": error}, {}
+        try:
+            job = self._jobs.submit(lambda: self._run_job(request, headers), callback_url and callback_url.strip())
+        except OverloadedError as exc:
+            status, body = _upstream_error(exc)
+            return status, body, _error_headers(exc)
+        return HTTPStatus.ACCEPTED, job, {"Location": f"/api/jobs/{job['id']}"}
+
+    def _run_job(self, request: _AnalyzeRequest, headers) -> dict:
+        """Body of a job on a worker thread: what ``/api/analyze`` would have answered."""
+        self._arm(request, headers)
+        if request.angles:
+            return self._answer_angles(request)
+        answer, meta = self._answer(request)
+        return {"query": request.query, "response": answer, "meta": meta}
+
+    def _job_status(self, job_id: str) -> tuple[HTTPStatus, dict]:
+        job = self._jobs.get(job_id) if self._jobs is not None else None
+        if job is None:
+            return HTTPStatus.NOT_FOUND, {"error": "Not Found", "detail": "Unknown or expired job."}
+        return HTTPStatus.OK, job
+
+    def _parse_batch(self, payload: Optional[dict]) -> tuple[list, int, Optional[str]]:
+        return _parse_batch_payload(
+            payload,
+            self._controls_fn,
+            max_items=self._batch_max_items,
+            default_concurrency=self._batch_concurrency,
+            max_concurrency=self._batch_max_concurrency,
+        )
+
+    def _batch_item_event(
+        self,
+        index: int,
+        request: Optional[_AnalyzeRequest],
+        error: Optional[str],
+        headers=None,
+        probe: Optional[Callable[[], bool]] = None,
+    ) -> dict:
+        """Answer one batch item; its deadline starts now, not when the batch arrived."""
+        if error:
+            return {"type": "item", "index": index, "error": "Bad Request", "detail": error}
+        self._arm(request, headers if headers is not None else {}, probe)
+        try:
+            answer, meta = self._answer(request)
+        except Exception as exc:  # pylint: disable=broad-except
+            if not isinstance(exc, _ROUTINE_ERRORS):
+                LOGGER.exception("Failed to process batch item %s: %s", index, exc)
+            return {"type": "item", "index": index, **_upstream_error(exc)[1]}
+        return {"type": "item", "index": index, "query": request.query, "response": answer, "meta": meta}
+
+    def _health(self) -> dict:
+        flights = [self._single_flight.stats()]
+        if self._async_server is not None:
+            flights.append(self._async_server._single_flight.stats())
+        health = {"status": "ok"}
+        if self._health_fn is not None:
+            health.update(self._health_fn())
+        health["single_flight"] = {
+            name: sum(stats[name] for stats in flights) for name in ("executed", "coalesced", "in_flight")
+        }
+        health["scheduler"] = self._scheduler.stats()
+        health["json"] = Json.BACKEND
+        if self._history is not None:
+            health["history"] = self._history.stats()
+        if self._jobs is not None:
+            health["jobs"] = self._jobs.stats()
+        return health
+
+    async def _serve_asyncio(self) -> None:
+        from async_api_server import AsyncAPIServer
+
+        self._async_server = AsyncAPIServer(self, idle_timeout=self._idle_timeout)
+
+        def on_ready(address: tuple) -> None:
+            self._bound_port = address[1]
+            self._ready.set()
+
+        await self._async_server.serve(self._host, self._port, on_ready, sock=self._sock)
+
+    async def _single_token_stream(self, query: str, **options: object) -> AsyncIterator[str]:
+        yield await self._async_forward_fn(query, **options)
+
     def _build_handler(self) -> type[BaseHTTPRequestHandler]:
-        forward_fn = self._forward_fn
+        server = self
+        stream_fn = self._stream_fn
 
         class RequestHandler(BaseHTTPRequestHandler):
-            routes: set[str] = {"/api/analyze", "/api/analyze/"}
+            routes: set[str] = {"/api/analyze", "/api/analyze/stream", "/api/analyze/batch", "/api/jobs"}
+            # keep-alive: every response carries a Content-Length or chunked framing
+            protocol_version = "HTTP/1.1"
+            # an idle keep-alive connection holds a thread, so it is closed after this long
+            timeout = server._idle_timeout
+            # headers and body go out in separate writes; without this, delayed ACKs stall each response
+            disable_nagle_algorithm = True
 
-            def _set_common_headers(self, status: HTTPStatus) -> None:
+            def _set_common_headers(
+                self,
+                status: HTTPStatus,
+                content_type: str = "application/json",
+                extra_headers: Optional[dict] = None,
+            ) -> None:
                 self.send_response(status)
-                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Type", content_type)
                 self.send_header("Access-Control-Allow-Origin", "*")
                 self.send_header("Access-Control-Allow-Methods", "POST, OPTIONS, GET")
-                self.send_header("Access-Control-Allow-Headers", "Content-Type")
+                self.send_header("Access-Control-Allow-Headers", _ALLOWED_HEADERS)
+                for name, value in (extra_headers or {}).items():
+                    self.send_header(name, value)
+                if server._closing or self.close_connection:
+                    self.send_header("Connection", "close")
                 self.end_headers()
 
+            def _start_stream(self) -> None:
+                """Send the 200 head of an NDJSON stream, chunked so the connection can be reused."""
+                self._chunked = self.request_version == "HTTP/1.1"
+                if not self._chunked:
+                    # an HTTP/1.0 client reads the stream until the connection closes
+                    self.close_connection = True
+                self._set_common_headers(HTTPStatus.OK, "application/x-ndjson", {"Transfer-Encoding": "chunked"} if self._chunked else None)
+
+            def _end_stream(self) -> None:
+                if not self._chunked:
+                    return
+                try:
+                    self.wfile.write(b"0\r\n\r\n")
+                except OSError:
+                    self.close_connection = True
+
             def log_message(self, format: str, *args: object) -> None:  # noqa: A003
                 LOGGER.debug("%s - %s", self.address_string(), format % args)
 
+            def send_response(self, code: int, message: Optional[str] = None) -> None:
+                self._status = int(code)
+                super().send_response(code, message)
+
+            def _abandon(self) -> None:
+                """Drop the response of a request whose client went away."""
+                self._status = _CLIENT_CLOSED_REQUEST
+                self.close_connection = True
+
+            def _disconnected(self) -> bool:
+                return _peer_closed(self.connection)
+
+            def _tracked(self, handle: Callable[[], None]) -> None:
+                route = server._metric_route(self.path)
+                self._status = 0
+                self._chunked = False
+                started = time.perf_counter()
+                server._http_in_flight.inc(route=route)
+                with server._idle:
+                    server._active_requests += 1
+                try:
+                    handle()
+                finally:
+                    with server._idle:
+                        server._active_requests -= 1
+                        server._idle.notify_all()
+                    server._http_in_flight.dec(route=route)
+                    server._observe_request(route, self._status, started)
+
             def do_OPTIONS(self) -> None:  # noqa: N802
+                self._skip_body()
                 self.send_response(HTTPStatus.NO_CONTENT)
                 self.send_header("Access-Control-Allow-Origin", "*")
                 self.send_header("Access-Control-Allow-Methods", "POST, OPTIONS")
-                self.send_header("Access-Control-Allow-Headers", "Content-Type")
+                self.send_header("Access-Control-Allow-Headers", _ALLOWED_HEADERS)
+                self.send_header("Content-Length", "0")
                 self.end_headers()
 
             def do_GET(self) -> None:  # noqa: N802
-                if self.path.rstrip("/") == "/api/health":
-                    self._send_json({"status": "ok"}, HTTPStatus.OK)
+                self._tracked(self._get)
+
+            def do_POST(self) -> None:  # noqa: N802
+                self._tracked(self._post)
+
+            def _get(self) -> None:
+                self._skip_body()
+                target = urlsplit(self.path)
+                route = target.path.rstrip("/")
+                if route == "/api/health":
+                    self._send_json(server._health(), HTTPStatus.OK)
+                elif route == "/api/history":
+                    status, body = server._history_page(target.query)
+                    self._send_json(body, status)
+                elif route.startswith("/api/jobs/"):
+                    status, body = server._job_status(route[len("/api/jobs/"):])
+                    self._send_json(body, status)
+                elif route == "/api/metrics":
+                    self._send_body(server._metrics.render().encode("utf-8"), HTTPStatus.OK, METRICS_CONTENT_TYPE)
                 else:
                     self._send_json(
                         {"error": "Not Found", "detail": "Unknown endpoint"},
                         HTTPStatus.NOT_FOUND,
                     )
 
-            def do_POST(self) -> None:  # noqa: N802
-                if self.path.rstrip("/") not in self.routes:
+            def _post(self) -> None:
+                route = self.path.rstrip("/")
+                if route not in self.routes:
+                    self._skip_body()
                     self._send_json(
                         {"error": "Not Found", "detail": "Unknown endpoint"},
                         HTTPStatus.NOT_FOUND,
                     )
                     return
 
-                payload, error = _read_json_body(self)
+                payload, error = self._read_json_body()
+                if error:
+                    self._send_json({"error": error.status.phrase, "detail": str(error)}, error.status)
+                    return
+
+                if route == "/api/jobs":
+                    status, body, headers = server._submit_job(payload, self.headers, self.client_address[0])
+                    self._send_json(body, status, headers)
+                    return
+
+                if route == "/api/analyze/batch":
+                    items, concurrency, error = server._parse_batch(payload)
+                    if error:
+                        self._send_json({"error": "Bad Request", "detail": error}, HTTPStatus.BAD_REQUEST)
+                        return
+                    # each item is armed when it starts; the header is checked once, up front
+                    _, error = _header_timeout(self.headers)
+                    if error:
+                        self._send_json({"error": "Bad Request", "detail": error}, HTTPStatus.BAD_REQUEST)
+                        return
+                    # bulk work queues behind interactive traffic unless the caller says otherwise
+                    for request, _ in items:
+                        if request is not None:
+                            request.route = route
+                            server._classify(request, self.headers, self.client_address[0], default="batch")
+                    self._run_batch(items, concurrency)
+                    self._end_stream()
+                    return
+
+                request, error = server._parse(payload)
+                if error:
+                    self._send_json({"error": "Bad Request", "detail": error}, HTTPStatus.BAD_REQUEST)
+                    return
+                request.route = route
+                server._classify(request, self.headers, self.client_address[0])
+                error = server._arm(request, self.headers, self._disconnected)
                 if error:
                     self._send_json({"error": "Bad Request", "detail": error}, HTTPStatus.BAD_REQUEST)
                     return
 
-                query = payload.get("query") if isinstance(payload, dict) else None
-                if not isinstance(query, str) or not query.strip():
-                    self._send_json(
-                        {"error": "Bad Request", "detail": "Field 'query' must be a non-empty string."},
-                        HTTPStatus.BAD_REQUEST,
-                    )
+                if route == "/api/analyze/stream":
+                    if request.angles:
+                        self._stream_angles(request)
+                    else:
+                        self._stream_analysis(request)
+                    self._end_stream()
                     return
 
-                started = time.perf_counter()
                 try:
-                    answer = forward_fn(query)
+                    if request.angles:
+                        self._send_json(server._answer_angles(request), HTTPStatus.OK)
+                        return
+                    answer, meta = server._answer(request)
                 except Exception as exc:  # pylint: disable=broad-except
-                    LOGGER.exception("Failed to process query: %s", exc)
-                    self._send_json(
-                        {"error": "Internal Server Error", "detail": "Unable to generate response."},
-                        HTTPStatus.INTERNAL_SERVER_ERROR,
-                    )
+                    # shedding load is routine, only real failures get a traceback
+                    if not isinstance(exc, _ROUTINE_ERRORS):
+                        LOGGER.exception("Failed to process query: %s", exc)
+                    if _client_gone(exc):
+                        self._abandon()
+                        return
+                    status, body = _upstream_error(exc)
+                    self._send_json(body, status, _error_headers(exc))
                     return
 
-                elapsed_ms = round((time.perf_counter() - started) * 1000.0, 2)
                 self._send_json(
                     {
-                        "query": query,
+                        "query": request.query,
                         "response": answer,
-                        "meta": {"took_ms": elapsed_ms},
+                        "meta": meta,
                     },
                     HTTPStatus.OK,
                 )
 
-            def _send_json(self, payload: dict, status: HTTPStatus) -> None:
-                self._set_common_headers(status)
-                body = json.dumps(payload).encode("utf-8")
+            def _run_batch(self, items: list, concurrency: int) -> None:
+                """Fan items out over ``concurrency`` workers and stream NDJSON results in input order.
+
+                At most a small window of items beyond the running ones is kept pending, so
+                memory stays bounded however long the batch is.
+                """
+                started = time.perf_counter()
+                self._start_stream()
+
+                failed = 0
+                indexed = enumerate(items)
+                pending: deque[Future] = deque()
+                with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as pool:
+
+                    def submit_next() -> None:
+                        nxt = next(indexed, None)
+                        if nxt is not None:
+                            index, (request, error) = nxt
+                            pending.append(
+                                pool.submit(server._batch_item_event, index, request, error, self.headers, self._disconnected)
+                            )
+
+                    for _ in range(concurrency * 4):
+                        submit_next()
+                    try:
+                        while pending:
+                            event = pending.popleft().result()
+                            submit_next()
+                            failed += "error" in event
+                            self._write_event(event)
+                    except (BrokenPipeError, ConnectionResetError):
+                        LOGGER.info("Client disconnected during batch analysis")
+                        self.close_connection = True
+                        for future in pending:
+                            future.cancel()
+                        return
+
+                elapsed_ms = round((time.perf_counter() - started) * 1000.0, 2)
+                self._write_event(
+                    {"type": "done", "meta": {"items": len(items), "failed": failed, "took_ms": elapsed_ms}}
+                )
+
+            def _stream_analysis(self, request: _AnalyzeRequest) -> None:
+                """Send the completion as NDJSON events: ``token`` lines, then ``done`` or ``error``."""
+                started = time.perf_counter()
+                cached_answer = server._cached_answer(request)
+                if cached_answer is not None:
+                    self._start_stream()
+                    self._relay_stream(request, started, iter([cached_answer]), cached_answer=cached_answer)
+                    return
+
+                # admission happens before the 200 so a rejection is still a plain 429/503
+                try:
+                    waited = server._scheduler.acquire(request.priority, request.client)
+                    server._stage_seconds.observe(waited, stage="queue")
+                except OverloadedError as exc:
+                    status, body = _upstream_error(exc)
+                    self._send_json(body, status, _error_headers(exc))
+                    return
+                admitted = time.monotonic()
+                try:
+                    self._start_stream()
+                    with track_usage() as usage, cancel_scope(request.cancel):
+                        chunks = stream_fn(request.query, **server._call_options(request))
+                        self._relay_stream(request, started, chunks, queue_ms=round(waited * 1000.0, 2), usage=usage)
+                finally:
+                    server._scheduler.release(time.monotonic() - admitted)
+
+            def _stream_angles(self, request: _AnalyzeRequest) -> None:
+                """Send one ``angle`` event per alternative as it finishes, then ``done`` with the selection."""
+                self._start_stream()
+                try:
+                    body = server._answer_angles(request, on_angle=self._write_event)
+                except (BrokenPipeError, ConnectionResetError):
+                    LOGGER.info("Client disconnected during multi-angle analysis")
+                    self.close_connection = True
+                    return
+                except Exception as exc:  # pylint: disable=broad-except
+                    if not isinstance(exc, _ROUTINE_ERRORS):
+                        LOGGER.exception("Failed to generate angles: %s", exc)
+                    if _client_gone(exc):
+                        self.close_connection = True
+                        return
+                    self._write_event({"type": "error", **_upstream_error(exc)[1]})
+                    return
+                self._write_event({"type": "done", **body})
+
+            def _relay_stream(
+                self,
+                request: _AnalyzeRequest,
+                started: float,
+                chunks: Iterator[str],
+                cached_answer: Optional[str] = None,
+                queue_ms: float = 0.0,
+                usage=None,
+            ) -> None:
+                pieces: list[str] = []
+                first_token_ms = None
+                try:
+                    for piece in chunks:
+                        if not piece:
+                            continue
+                        if first_token_ms is None:
+                            first_token_ms = round((time.perf_counter() - started) * 1000.0, 2)
+                        pieces.append(piece)
+                        self._write_event({"type": "token", "text": piece})
+                except (BrokenPipeError, ConnectionResetError):
+                    LOGGER.info("Client disconnected during streamed analysis")
+                    self.close_connection = True
+                    return
+                except Exception as exc:  # pylint: disable=broad-except
+                    if _client_gone(exc):
+                        LOGGER.info("Client disconnected during streamed analysis")
+                        self.close_connection = True
+                        return
+                    if not isinstance(exc, _ROUTINE_ERRORS):
+                        LOGGER.exception("Failed to stream query: %s", exc)
+                    self._write_event({"type": "error", **_upstream_error(exc)[1]})
+                    return
+                finally:
+                    # closing the generator also closes the upstream completion
+                    close = getattr(chunks, "close", None)
+                    if close is not None:
+                        close()
+
+                answer = "".join(pieces)
+                if cached_answer is None and server._cacheable_fn(answer):
+                    server._store_answer(request, answer)
+
+                elapsed_ms = round((time.perf_counter() - started) * 1000.0, 2)
+                meta = {
+                    "took_ms": elapsed_ms,
+                    "first_token_ms": first_token_ms,
+                    "queue_ms": queue_ms,
+                    "cached": cached_answer is not None,
+                    "usage": usage.as_dict() if usage is not None else None,
+                }
+                server._record_run(request, answer, meta)
+                self._write_event({"type": "done", "query": request.query, "response": answer, "meta": meta})
+
+            def _write_event(self, event: dict) -> None:
+                data = server._dumps(event) + b"\n"
+                if self._chunked:
+                    data = b"%x\r\n%s\r\n" % (len(data), data)
+                self.wfile.write(data)
+                self.wfile.flush()
+
+            def _skip_body(self) -> None:
+                """Close the connection after a response that leaves a request body unread.
+
+                Otherwise the body would be parsed as the next request on the connection.
+                """
+                if self.headers.get("Transfer-Encoding") or (self.headers.get("Content-Length") or "0").strip() != "0":
+                    self.close_connection = True
+
+            def _read_json_body(self) -> tuple[Optional[dict], Optional[_RequestBodyError]]:
+                try:
+                    length = _body_length(self.headers, server._max_body_bytes)
+                except _RequestBodyError as exc:
+                    # the unread body is still on the connection, so it cannot carry another request
+                    self.close_connection = True
+                    return None, exc
+                raw_body = self.rfile.read(length) if length > 0 else b""
+                try:
+                    return _parse_body(raw_body, self.headers.get("Content-Encoding"), server._max_body_bytes), None
+                except _RequestBodyError as exc:
+                    return None, exc
+
+            def _send_body(
+                self,
+                body: bytes,
+                status: HTTPStatus,
+                content_type: str = "application/json",
+                extra_headers: Optional[dict] = None,
+            ) -> None:
+                body, encoding_headers = server._encode(body, self.headers.get("Accept-Encoding"))
+                headers = {**(extra_headers or {}), **encoding_headers, "Content-Length": str(len(body))}
+                self._set_common_headers(status, content_type, headers)
                 self.wfile.write(body)
 
+            def _send_json(self, payload: dict, status: HTTPStatus, extra_headers: Optional[dict] = None) -> None:
+                self._send_body(server._dumps(payload), status, extra_headers=extra_headers)
+
         return RequestHandler
@@ -0,0 +1,629 @@
+import asyncio
+import logging
+import socket
+import time
+from collections import deque
+from http import HTTPStatus
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional
+
+from api_server import (
+    _ALLOWED_HEADERS,
+    _CLIENT_CLOSED_REQUEST,
+    _ROUTINE_ERRORS,
+    _AnalyzeRequest,
+    _RequestBodyError,
+    _angle_event,
+    _angles_body,
+    _body_length,
+    _cancelled_for_another,
+    _client_gone,
+    _error_headers,
+    _header_timeout,
+    _parse_body,
+    _upstream_error,
+    _wait_timeout,
+)
+from noton.Cancel import RequestCancelled, cancel_scope
+from noton.Flight import AsyncSingleFlight
+from noton.Metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from noton.Scheduler import OverloadedError
+from noton.Usage import track_usage
+
+if TYPE_CHECKING:
+    from api_server import MessageAnalystAPIServer
+
+
+LOGGER = logging.getLogger(__name__)
+
+_MAX_HEADER_LINES = 100
+
+
+class _BadRequest(Exception):
+    pass
+
+
+class AsyncAPIServer:
+    """Asyncio transport serving the analyst routes without a thread per connection.
+
+    Upstream calls go through the owner's admission scheduler, shared with the threaded
+    transport: a full queue is rejected with a 429, a call that cannot start within the
+    queue timeout with a 503.
+    """
+
+    def __init__(self, owner: "MessageAnalystAPIServer", *, idle_timeout: float = 75.0) -> None:
+        self._owner = owner
+        self._scheduler = owner._scheduler
+        self._idle_timeout = idle_timeout
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._connections: dict[asyncio.Task, asyncio.StreamWriter] = {}
+        # connection tasks with a request in progress
+        self._busy: set[asyncio.Task] = set()
+        self._drain_timeout = 5.0
+        # status of the response being written on each connection, for the request metrics
+        self._statuses: dict[asyncio.StreamWriter, int] = {}
+        # read side of each connection, watched for the client going away mid-request
+        self._readers: dict[asyncio.StreamWriter, asyncio.StreamReader] = {}
+        # Accept-Encoding of the request being answered on each connection
+        self._accept_encodings: dict[asyncio.StreamWriter, str] = {}
+        # HTTP version of the request being answered on each connection
+        self._versions: dict[asyncio.StreamWriter, str] = {}
+        self._single_flight = AsyncSingleFlight()
+
+    async def serve(self, host: str, port: int, on_ready: Callable[[tuple], None], sock: Optional[socket.socket] = None) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+
+        if sock is not None:
+            server = await asyncio.start_server(self._handle_connection, sock=sock, backlog=1024)
+        else:
+            server = await asyncio.start_server(self._handle_connection, host, port, backlog=1024)
+        on_ready(server.sockets[0].getsockname())
+        await self._stopping.wait()
+        server.close()
+
+        # idle keep-alive connections are closed at once; requests being answered get the drain timeout
+        for task, writer in list(self._connections.items()):
+            if task not in self._busy:
+                writer.close()
+        if self._connections:
+            await asyncio.wait(list(self._connections), timeout=self._drain_timeout)
+        for writer in list(self._connections.values()):
+            writer.close()
+        if self._connections:
+            await asyncio.wait(list(self._connections), timeout=1.0)
+        await server.wait_closed()
+
+    def stop(self, drain_timeout: float = 5.0) -> None:
+        if self._loop is not None and self._stopping is not None:
+            self._drain_timeout = drain_timeout
+            self._loop.call_soon_threadsafe(self._stopping.set)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        self._readers[writer] = reader
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except _BadRequest as exc:
+                    await self._send_json(writer, {"error": "Bad Request", "detail": str(exc)}, HTTPStatus.BAD_REQUEST, False)
+                    break
+                except _RequestBodyError as exc:
+                    # the unread body is still on the connection, so it cannot carry another request
+                    await self._send_json(writer, {"error": exc.status.phrase, "detail": str(exc)}, exc.status, False)
+                    break
+                if request is None:
+                    break
+                method, path, version, headers, body, keep_alive = request
+                self._accept_encodings[writer] = headers.get("accept-encoding", "")
+                self._versions[writer] = version
+                if self._stopping.is_set():
+                    keep_alive = False
+                peer = (writer.get_extra_info("peername") or ("",))[0]
+                self._busy.add(task)
+                try:
+                    keep_alive = await self._tracked_dispatch(writer, method, path, headers, body, keep_alive, peer)
+                finally:
+                    self._busy.discard(task)
+                if not keep_alive or self._stopping.is_set():
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as exc:  # pylint: disable=broad-except
+            LOGGER.exception("Unexpected error on API connection: %s", exc)
+        finally:
+            self._connections.pop(task, None)
+            self._statuses.pop(writer, None)
+            self._readers.pop(writer, None)
+            self._accept_encodings.pop(writer, None)
+            self._versions.pop(writer, None)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:  # pylint: disable=broad-except
+                pass
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[tuple[str, str, str, dict, bytes, bool]]:
+        request_line = await asyncio.wait_for(reader.readline(), self._idle_timeout)
+        if not request_line.strip():
+            return None
+
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError as exc:
+            raise _BadRequest("Malformed request line") from exc
+
+        headers: dict[str, str] = {}
+        for _ in range(_MAX_HEADER_LINES):
+            line = await asyncio.wait_for(reader.readline(), self._idle_timeout)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise _BadRequest("Too many headers")
+
+        content_length = _body_length(headers, self._owner._max_body_bytes)
+        # a client that stalls mid-body is dropped like one that stalls between requests
+        body = await asyncio.wait_for(reader.readexactly(content_length), self._idle_timeout) if content_length > 0 else b""
+
+        connection = headers.get("connection", "").lower()
+        if version == "HTTP/1.1":
+            keep_alive = connection != "close"
+        else:
+            keep_alive = connection == "keep-alive"
+        return method.upper(), target, version, headers, body, keep_alive
+
+    async def _tracked_dispatch(self, writer: asyncio.StreamWriter, method: str, path: str, *args) -> bool:
+        route = self._owner._metric_route(path)
+        started = time.perf_counter()
+        self._owner._http_in_flight.inc(route=route)
+        try:
+            return await self._dispatch(writer, method, path, *args)
+        finally:
+            self._owner._http_in_flight.dec(route=route)
+            self._owner._observe_request(route, self._statuses.pop(writer, 0), started)
+
+    async def _dispatch(
+        self,
+        writer: asyncio.StreamWriter,
+        method: str,
+        path: str,
+        headers: dict,
+        body: bytes,
+        keep_alive: bool,
+        peer: str = "",
+    ) -> bool:
+        path, _, query_string = path.partition("?")
+        route = path.rstrip("/")
+        if method == "OPTIONS":
+            await self._send(writer, b"", HTTPStatus.NO_CONTENT, keep_alive)
+            return keep_alive
+
+        if method == "GET":
+            if route == "/api/health":
+                await self._send_json(writer, self._owner._health(), HTTPStatus.OK, keep_alive)
+            elif route == "/api/history":
+                # a page is one indexed SQLite read, small enough to run on the loop
+                status, page = self._owner._history_page(query_string)
+                await self._send_json(writer, page, status, keep_alive)
+            elif route.startswith("/api/jobs/"):
+                # a dict lookup, or one primary-key read from a shared job store
+                status, job = self._owner._job_status(route[len("/api/jobs/"):])
+                await self._send_json(writer, job, status, keep_alive)
+            elif route == "/api/metrics":
+                body = self._owner._metrics.render().encode("utf-8")
+                await self._send(writer, body, HTTPStatus.OK, keep_alive, content_type=METRICS_CONTENT_TYPE)
+            else:
+                await self._send_json(writer, {"error": "Not Found", "detail": "Unknown endpoint"}, HTTPStatus.NOT_FOUND, keep_alive)
+            return keep_alive
+
+        if method != "POST" or route not in {"/api/analyze", "/api/analyze/stream", "/api/analyze/batch", "/api/jobs"}:
+            await self._send_json(writer, {"error": "Not Found", "detail": "Unknown endpoint"}, HTTPStatus.NOT_FOUND, keep_alive)
+            return keep_alive
+
+        try:
+            payload = _parse_body(body, headers.get("content-encoding"), self._owner._max_body_bytes)
+        except _RequestBodyError as exc:
+            await self._send_json(writer, {"error": exc.status.phrase, "detail": str(exc)}, exc.status, keep_alive)
+            return keep_alive
+
+        if route == "/api/jobs":
+            # jobs run on the owner's worker threads, not on this loop; so does the callback's DNS check
+            status, job, job_headers = await asyncio.to_thread(self._owner._submit_job, payload, headers, peer)
+            await self._send_json(writer, job, status, keep_alive, job_headers)
+            return keep_alive
+
+        if route == "/api/analyze/batch":
+            items, concurrency, error = self._owner._parse_batch(payload)
+            if error:
+                await self._send_json(writer, {"error": "Bad Request", "detail": error}, HTTPStatus.BAD_REQUEST, keep_alive)
+                return keep_alive
+            # each item is armed when it starts; the header is checked once, up front
+            _, error = _header_timeout(headers)
+            if error:
+                await self._send_json(writer, {"error": "Bad Request", "detail": error}, HTTPStatus.BAD_REQUEST, keep_alive)
+                return keep_alive
+            for request, _ in items:
+                if request is not None:
+                    request.route = route
+                    self._owner._classify(request, headers, peer, default="batch")
+            return await self._run_batch(writer, items, concurrency, keep_alive, headers)
+
+        request, error = self._owner._parse(payload)
+        if error:
+            await self._send_json(writer, {"error": "Bad Request", "detail": error}, HTTPStatus.BAD_REQUEST, keep_alive)
+            return keep_alive
+        request.route = route
+        self._owner._classify(request, headers, peer)
+        error = self._owner._arm(request, headers, self._probe(writer))
+        if error:
+            await self._send_json(writer, {"error": "Bad Request", "detail": error}, HTTPStatus.BAD_REQUEST, keep_alive)
+            return keep_alive
+
+        if route == "/api/analyze/stream" and request.angles:
+            return await self._stream_angles(writer, request, keep_alive)
+
+        if route == "/api/analyze/stream":
+            started = time.perf_counter()
+            cached_answer = self._owner._cached_answer(request)
+            if cached_answer is not None:
+                return await self._stream_analysis(writer, request, started, keep_alive, cached_answer)
+            try:
+                async with self._scheduler.aslot(request.priority, request.client) as waited:
+                    self._owner._stage_seconds.observe(waited, stage="queue")
+                    # the stream is consumed in this task, so its LLM calls report to this tracker
+                    with track_usage() as usage, cancel_scope(request.cancel):
+                        return await self._stream_analysis(writer, request, started, keep_alive, queue_ms=round(waited * 1000.0, 2), usage=usage)
+            except OverloadedError as exc:
+                status, error_body = _upstream_error(exc)
+                await self._send_json(writer, error_body, status, keep_alive, _error_headers(exc))
+                return keep_alive
+
+        try:
+            if request.angles:
+                body = await self._answer_angles(request)
+            else:
+                answer, meta = await self._answer(request)
+                body = {"query": request.query, "response": answer, "meta": meta}
+        except Exception as exc:  # pylint: disable=broad-except
+            if not isinstance(exc, _ROUTINE_ERRORS):
+                LOGGER.exception("Failed to process query: %s", exc)
+            if _client_gone(exc):
+                self._statuses[writer] = _CLIENT_CLOSED_REQUEST
+                return False
+            status, error_body = _upstream_error(exc)
+            await self._send_json(writer, error_body, status, keep_alive, _error_headers(exc))
+            return keep_alive
+
+        await self._send_json(writer, body, HTTPStatus.OK, keep_alive)
+        return keep_alive
+
+    async def _answer(self, request: _AnalyzeRequest) -> tuple[str, dict]:
+        """Answer from cache or the model; returns ``(answer, meta)``."""
+        started = time.perf_counter()
+        answer = self._owner._cached_answer(request)
+        cached = answer is not None
+        coalesced = False
+        queue_ms = 0.0
+        usage = None
+        if not cached:
+            # identical in-flight requests share one upstream call (and one slot)
+            flight_key = self._owner._flight_key(request)
+            if flight_key is None:
+                answer, queue_ms, usage = await self._scheduled_forward(request)
+            else:
+                if request.cancel is not None:
+                    request.cancel.hold_while(lambda: self._single_flight.waiting(flight_key) > 0)
+                while True:
+                    try:
+                        (answer, queue_ms, usage), coalesced = await self._single_flight.do(
+                            flight_key, self._scheduled_forward, request, wait_timeout=_wait_timeout(request)
+                        )
+                        break
+                    except TimeoutError:
+                        # the shared call outlived this request's deadline: the same 504 a leader gets
+                        if request.cancel is not None:
+                            request.cancel.cancel("deadline")
+                            request.cancel.check()
+                        raise
+                    except RequestCancelled as exc:
+                        # the leader ran out of time or lost its client; this request still has its own budget
+                        if not _cancelled_for_another(request, exc):
+                            raise
+            if not coalesced:
+                self._owner._store_answer(request, answer)
+        elapsed_ms = round((time.perf_counter() - started) * 1000.0, 2)
+        meta = {"took_ms": elapsed_ms, "queue_ms": queue_ms, "cached": cached, "coalesced": coalesced, "usage": usage}
+        self._owner._record_run(request, answer, meta)
+        return answer, meta
+
+    async def _answer_angles(self, request: _AnalyzeRequest, on_angle: Optional[Callable[[dict], Awaitable[None]]] = None) -> dict:
+        """Generate every angle concurrently, report each as it finishes, then select one."""
+        started = time.perf_counter()
+
+        async def run(index: int, angle: str, sub: _AnalyzeRequest) -> tuple[dict, Optional[BaseException]]:
+            try:
+                return _angle_event(index, angle, await self._answer(sub)), None
+            except Exception as exc:  # pylint: disable=broad-except
+                return _angle_event(index, angle, None, exc), exc
+
+        tasks = [asyncio.ensure_future(run(index, angle, sub)) for index, (angle, sub) in enumerate(self._owner._angle_requests(request))]
+        events: list[dict] = []
+        errors: list[BaseException] = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                event, exc = await next_done
+                if exc is not None:
+                    errors.append(exc)
+                events.append(event)
+                if on_angle is not None:
+                    await on_angle(event)
+        finally:
+            # only left running when the client went away mid-stream
+            for task in tasks:
+                task.cancel()
+        if len(errors) == len(events):
+            raise errors[0]
+        selected, select_ms = await self._select(request, events)
+        return _angles_body(request, events, selected, started, select_ms)
+
+    async def _select(self, request: _AnalyzeRequest, events: list[dict]) -> tuple[int, float]:
+        """Asyncio counterpart of ``MessageAnalystAPIServer._select``."""
+        answered = sorted((event for event in events if "error" not in event), key=lambda event: event["index"])
+        started = time.perf_counter()
+        try:
+            async with self._scheduler.aslot(request.priority, request.client):
+                with cancel_scope(request.cancel):
+                    choice = await self._owner._async_select_fn(
+                        request.query, [event["response"] for event in answered], **self._owner._call_options(request)
+                    )
+            if isinstance(choice, bool) or not isinstance(choice, int) or not 0 <= choice < len(answered):
+                raise ValueError(f"select_fn returned {choice!r}, not an angle index")
+        except RequestCancelled:
+            raise
+        except Exception as exc:  # pylint: disable=broad-except
+            LOGGER.warning("Angle selection failed, returning the first angle: %s", exc)
+            choice = 0
+        index = answered[choice]["index"]
+        return index, round((time.perf_counter() - started) * 1000.0, 2)
+
+    async def _stream_angles(self, writer: asyncio.StreamWriter, request: _AnalyzeRequest, keep_alive: bool) -> bool:
+        """Asyncio counterpart of the threaded multi-angle stream: ``angle`` events, then ``done``."""
+        keep_alive = self._chunked(writer, keep_alive)
+        await self._send_head(
+            writer,
+            HTTPStatus.OK,
+            "application/x-ndjson",
+            {"Transfer-Encoding": "chunked"} if keep_alive else {},
+            keep_alive,
+        )
+        try:
+            body = await self._answer_angles(request, on_angle=lambda event: self._write_event(writer, event, keep_alive))
+            await self._write_event(writer, {"type": "done", **body}, keep_alive)
+        except ConnectionError:
+            LOGGER.info("Client disconnected during multi-angle analysis")
+            return False
+        except Exception as exc:  # pylint: disable=broad-except
+            if not isinstance(exc, _ROUTINE_ERRORS):
+                LOGGER.exception("Failed to generate angles: %s", exc)
+            if _client_gone(exc):
+                return False
+            await self._write_event(writer, {"type": "error", **_upstream_error(exc)[1]}, keep_alive)
+
+        if keep_alive:
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        return keep_alive
+
+    async def _run_batch(self, writer: asyncio.StreamWriter, items: list, concurrency: int, keep_alive: bool, headers: dict) -> bool:
+        """Asyncio counterpart of the threaded batch route: ordered NDJSON with a bounded window."""
+        started = time.perf_counter()
+        keep_alive = self._chunked(writer, keep_alive)
+        await self._send_head(
+            writer,
+            HTTPStatus.OK,
+            "application/x-ndjson",
+            {"Transfer-Encoding": "chunked"} if keep_alive else {},
+            keep_alive,
+        )
+
+        gate = asyncio.Semaphore(concurrency)
+
+        async def run(index: int, request: Optional[_AnalyzeRequest], error: Optional[str]) -> dict:
+            if error:
+                return {"type": "item", "index": index, "error": "Bad Request", "detail": error}
+            async with gate:
+                # the deadline counts from the item's start, not from the batch's arrival
+                self._owner._arm(request, headers, self._probe(writer))
+                try:
+                    answer, meta = await self._answer(request)
+                except Exception as exc:  # pylint: disable=broad-except
+                    if not isinstance(exc, _ROUTINE_ERRORS):
+                        LOGGER.exception("Failed to process batch item %s: %s", index, exc)
+                    return {"type": "item", "index": index, **_upstream_error(exc)[1]}
+            return {"type": "item", "index": index, "query": request.query, "response": answer, "meta": meta}
+
+        failed = 0
+        indexed = enumerate(items)
+        pending: deque[asyncio.Task] = deque()
+
+        def submit_next() -> None:
+            nxt = next(indexed, None)
+            if nxt is not None:
+                index, (request, error) = nxt
+                pending.append(asyncio.ensure_future(run(index, request, error)))
+
+        for _ in range(concurrency * 4):
+            submit_next()
+        try:
+            while pending:
+                event = await pending.popleft()
+                submit_next()
+                failed += "error" in event
+                await self._write_event(writer, event, keep_alive)
+        except ConnectionError:
+            LOGGER.info("Client disconnected during batch analysis")
+            for task in pending:
+                task.cancel()
+            return False
+
+        elapsed_ms = round((time.perf_counter() - started) * 1000.0, 2)
+        await self._write_event(
+            writer, {"type": "done", "meta": {"items": len(items), "failed": failed, "took_ms": elapsed_ms}}, keep_alive
+        )
+        if keep_alive:
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        return keep_alive
+
+    async def _scheduled_forward(self, request: _AnalyzeRequest) -> tuple[str, float, dict]:
+        async with self._scheduler.aslot(request.priority, request.client) as waited:
+            self._owner._stage_seconds.observe(waited, stage="queue")
+            # the default async_forward_fn runs forward_fn in a thread, which inherits this context
+            with track_usage() as usage, cancel_scope(request.cancel):
+                answer = await self._owner._async_forward_fn(request.query, **self._owner._call_options(request))
+        return answer, round(waited * 1000.0, 2), usage.as_dict()
+
+    async def _stream_analysis(
+        self,
+        writer: asyncio.StreamWriter,
+        request: _AnalyzeRequest,
+        started: float,
+        keep_alive: bool,
+        cached_answer: Optional[str] = None,
+        queue_ms: float = 0.0,
+        usage=None,
+    ) -> bool:
+        # chunked framing keeps the connection reusable; without keep-alive we end by closing
+        keep_alive = self._chunked(writer, keep_alive)
+        await self._send_head(
+            writer,
+            HTTPStatus.OK,
+            "application/x-ndjson",
+            {"Transfer-Encoding": "chunked"} if keep_alive else {},
+            keep_alive,
+        )
+
+        if cached_answer is not None:
+            chunks = self._single_chunk(cached_answer)
+        else:
+            chunks = self._owner._async_stream_fn(request.query, **self._owner._call_options(request))
+        pieces: list[str] = []
+        first_token_ms = None
+        try:
+            async for piece in chunks:
+                if not piece:
+                    continue
+                if first_token_ms is None:
+                    first_token_ms = round((time.perf_counter() - started) * 1000.0, 2)
+                pieces.append(piece)
+                await self._write_event(writer, {"type": "token", "text": piece}, keep_alive)
+
+            answer = "".join(pieces)
+            if cached_answer is None and self._owner._cacheable_fn(answer):
+                self._owner._store_answer(request, answer)
+
+            elapsed_ms = round((time.perf_counter() - started) * 1000.0, 2)
+            meta = {
+                "took_ms": elapsed_ms,
+                "first_token_ms": first_token_ms,
+                "queue_ms": queue_ms,
+                "cached": cached_answer is not None,
+                "usage": usage.as_dict() if usage is not None else None,
+            }
+            self._owner._record_run(request, answer, meta)
+            await self._write_event(writer, {"type": "done", "query": request.query, "response": answer, "meta": meta}, keep_alive)
+        except ConnectionError:
+            LOGGER.info("Client disconnected during streamed analysis")
+            return False
+        except Exception as exc:  # pylint: disable=broad-except
+            if _client_gone(exc):
+                LOGGER.info("Client disconnected during streamed analysis")
+                return False
+            if not isinstance(exc, _ROUTINE_ERRORS):
+                LOGGER.exception("Failed to stream query: %s", exc)
+            await self._write_event(writer, {"type": "error", **_upstream_error(exc)[1]}, keep_alive)
+        finally:
+            # closing the generator also closes the upstream completion
+            aclose = getattr(chunks, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+        if keep_alive:
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        return keep_alive
+
+    def _probe(self, writer: asyncio.StreamWriter) -> Callable[[], bool]:
+        """Whether the client of ``writer`` has closed its side of the connection."""
+        reader = self._readers.get(writer)
+        return lambda: writer.is_closing() or (reader is not None and reader.at_eof())
+
+    def _chunked(self, writer: asyncio.StreamWriter, keep_alive: bool) -> bool:
+        """Whether a stream on ``writer`` is sent chunked and the connection kept open after it.
+
+        HTTP/1.0 clients cannot read chunked framing, so their streams end by closing.
+        """
+        return keep_alive and self._versions.get(writer) == "HTTP/1.1"
+
+    async def _write_event(self, writer: asyncio.StreamWriter, event: dict, chunked: bool) -> None:
+        data = self._owner._dumps(event) + b"\n"
+        if chunked:
+            data = b"%x\r\n%s\r\n" % (len(data), data)
+        writer.write(data)
+        await writer.drain()
+
+    @staticmethod
+    async def _single_chunk(text: str):
+        yield text
+
+    async def _send_json(
+        self,
+        writer: asyncio.StreamWriter,
+        payload: dict,
+        status: HTTPStatus,
+        keep_alive: bool,
+        extra_headers: Optional[dict] = None,
+    ) -> None:
+        await self._send(writer, self._owner._dumps(payload), status, keep_alive, extra_headers)
+
+    async def _send(
+        self,
+        writer: asyncio.StreamWriter,
+        body: bytes,
+        status: HTTPStatus,
+        keep_alive: bool,
+        extra_headers: Optional[dict] = None,
+        content_type: str = "application/json",
+    ) -> None:
+        body, encoding_headers = self._owner._encode(body, self._accept_encodings.get(writer))
+        headers = {**(extra_headers or {}), **encoding_headers}
+        headers["Content-Length"] = str(len(body))
+        await self._send_head(writer, status, content_type, headers, keep_alive)
+        writer.write(body)
+        await writer.drain()
+
+    async def _send_head(
+        self,
+        writer: asyncio.StreamWriter,
+        status: HTTPStatus,
+        content_type: str,
+        extra_headers: dict,
+        keep_alive: bool,
+    ) -> None:
+        self._statuses[writer] = status.value
+        lines = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            f"Content-Type: {content_type}",
+            "Access-Control-Allow-Origin: *",
+            "Access-Control-Allow-Methods: POST, OPTIONS, GET",
+            f"Access-Control-Allow-Headers: {_ALLOWED_HEADERS}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        lines.extend(f"{name}: {value}" for name, value in extra_headers.items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
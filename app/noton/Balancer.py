@@ -0,0 +1,171 @@
+import random
+import threading
+import time
+from typing import Iterable, Optional, Sequence
+
+import httpx
+
+from noton.Retry import CircuitBreaker, CircuitOpenError, is_retryable
+
+
+class Backend:
+    """One LLM endpoint: routing weight, circuit breaker and live load/latency figures."""
+
+    def __init__(self, url: str, weight: float = 1.0, failure_threshold: int = 5, recovery_timeout: float = 30.0) -> None:
+        self.url_ = url
+        self.weight_ = weight if weight > 0 else 1.0
+        self.breaker_ = CircuitBreaker(failure_threshold, recovery_timeout)
+        self.outstanding_ = 0
+        self.requests_ = 0
+        self.errors_ = 0
+        self.latency_ = 0.0  # EWMA of successful call latency, seconds; 0 until measured
+        self.lock_ = threading.Lock()
+
+    def begin(self) -> float:
+        with self.lock_:
+            self.outstanding_ += 1
+            self.requests_ += 1
+        return time.monotonic()
+
+    def end(self) -> None:
+        with self.lock_:
+            self.outstanding_ -= 1
+
+    def succeeded(self, started: float, alpha: float) -> None:
+        elapsed = time.monotonic() - started
+        with self.lock_:
+            self.latency_ = elapsed if self.latency_ == 0.0 else alpha * elapsed + (1 - alpha) * self.latency_
+        self.breaker_.record_success()
+
+    def failed(self, error: BaseException) -> None:
+        with self.lock_:
+            self.errors_ += 1
+        # a rejected request still proves the backend is answering
+        if is_retryable(error):
+            self.breaker_.record_failure()
+        else:
+            self.breaker_.record_success()
+
+    def stats(self) -> dict:
+        with self.lock_:
+            stats = {
+                "weight": self.weight_,
+                "outstanding": self.outstanding_,
+                "requests": self.requests_,
+                "errors": self.errors_,
+                "latency_ms": round(self.latency_ * 1000.0, 2),
+            }
+        stats.update(self.breaker_.snapshot())
+        return stats
+
+
+class BackendPool:
+    """Weighted router over several OpenAI-compatible endpoints.
+
+    ``strategy`` is ``least_outstanding`` (fewest in-flight calls per unit of weight) or
+    ``latency`` (in-flight calls scaled by the latency EWMA, so slow nodes get less work).
+    Backends whose circuit breaker is open are skipped; ``pick`` raises
+    ``CircuitOpenError`` only when none is left.
+    """
+
+    STRATEGIES = ("least_outstanding", "latency")
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        weights: Optional[Sequence[float]] = None,
+        strategy: str = "least_outstanding",
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        latency_alpha: float = 0.3,
+    ) -> None:
+        assert strategy in self.STRATEGIES, f"strategy must be one of {self.STRATEGIES}"
+        weights = list(weights or [])
+        self.strategy_ = strategy
+        self.failure_threshold_ = failure_threshold
+        self.recovery_timeout_ = recovery_timeout
+        self.latency_alpha_ = latency_alpha
+        self.backends_ = [
+            Backend(url, weights[i] if i < len(weights) else 1.0, failure_threshold, recovery_timeout)
+            for i, url in enumerate(urls)
+        ]
+        # endpoints that are only reached through an explicit per-call base_url
+        self.extra_: dict[str, Backend] = {}
+        self.lock_ = threading.Lock()
+        self.checker_: Optional[threading.Thread] = None
+        self.stop_checks_ = threading.Event()
+
+    @property
+    def urls(self) -> list[str]:
+        return [backend.url_ for backend in self.backends_]
+
+    def backend(self, url: str) -> Backend:
+        for backend in self.backends_:
+            if backend.url_ == url:
+                return backend
+        with self.lock_:
+            backend = self.extra_.get(url)
+            if backend is None:
+                backend = Backend(url, 1.0, self.failure_threshold_, self.recovery_timeout_)
+                self.extra_[url] = backend
+            return backend
+
+    def pick(self, exclude: Iterable[str] = (), url: Optional[str] = None) -> Backend:
+        """Best available backend, preferring ones not in ``exclude`` (already failed for this call)."""
+        if url is not None:
+            candidates = [self.backend(url)]
+        else:
+            excluded = set(exclude)
+            candidates = [backend for backend in self.backends_ if backend.url_ not in excluded] or list(self.backends_)
+
+        # score, then a random tie-breaker so equal backends share the load
+        for backend in sorted(candidates, key=lambda backend: (self._score(backend), random.random())):
+            if backend.breaker_.allow():
+                return backend
+        raise CircuitOpenError("LLM backend is unavailable (circuit open)")
+
+    def _score(self, backend: Backend) -> float:
+        load = (backend.outstanding_ + 1) / backend.weight_
+        if self.strategy_ == "latency":
+            # unmeasured backends score 0 and get probed first
+            return load * backend.latency_
+        return load
+
+    def check(self, timeout: float = 5.0) -> None:
+        """Actively probe every backend's ``/models`` route and feed the result to its breaker."""
+        for backend in self.backends_:
+            try:
+                response = httpx.get(backend.url_.rstrip("/") + "/models", timeout=timeout)
+                healthy = response.status_code < 500
+            except httpx.HTTPError:
+                healthy = False
+            if healthy:
+                backend.breaker_.record_success()
+            else:
+                backend.breaker_.record_failure()
+
+    def start_health_checks(self, interval: float = 15.0, timeout: float = 5.0) -> None:
+        if interval <= 0 or self.checker_ is not None:
+            return
+
+        def run() -> None:
+            while not self.stop_checks_.wait(interval):
+                self.check(timeout)
+
+        self.checker_ = threading.Thread(target=run, name="noton-health-check", daemon=True)
+        self.checker_.start()
+
+    def stop_health_checks(self) -> None:
+        self.stop_checks_.set()
+
+    def stats(self) -> dict:
+        with self.lock_:
+            extra = list(self.extra_.values())
+        return {backend.url_: backend.stats() for backend in self.backends_ + extra}
+
+
+def parse_backends(urls: str, weights: str = "") -> tuple[list[str], list[float]]:
+    """Split comma-separated ``urls`` and matching ``weights`` (missing weights default to 1)."""
+    url_list = [url.strip() for url in urls.split(",") if url.strip()]
+    weight_list = [float(weight) for weight in weights.split(",") if weight.strip()]
+    return url_list, weight_list
@@ -0,0 +1,137 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# the SQLite tier is trimmed to max_disk_entries, and cleared of expired rows, once per this many writes
+_TRIM_EVERY = 256
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for cache keys: unified newlines, no trailing blanks."""
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+
+def cache_key(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(normalize_text(part or "").encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """Exact-match response cache: in-memory LRU with TTL, plus an optional SQLite tier.
+
+    Memory misses fall through to the SQLite file (if ``path`` is given) and are promoted
+    back into memory, so a restarted process keeps its warm entries. The file has its own
+    lock, so memory hits never wait on disk; it is trimmed every ``_TRIM_EVERY`` writes.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 3600.0,
+        path: Optional[str] = None,
+        max_disk_entries: int = 100000,
+    ) -> None:
+        self.max_entries_ = max(max_entries, 1)
+        self.ttl_seconds_ = ttl_seconds
+        self.path_ = path
+        self.max_disk_entries_ = max(max_disk_entries, 1)
+
+        self.entries_: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self.lock_ = threading.Lock()
+        self.hits_ = 0
+        self.misses_ = 0
+
+        self.db_: Optional[sqlite3.Connection] = None
+        self.db_lock_ = threading.Lock()
+        self.writes_ = 0
+        if path:
+            self.db_ = sqlite3.connect(path, check_same_thread=False)
+            self.db_.execute("PRAGMA journal_mode=WAL")
+            # WAL keeps commits durable across a crash of the process, not of the OS; fine for a cache
+            self.db_.execute("PRAGMA synchronous=NORMAL")
+            self.db_.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self.db_.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created)")
+            self.db_.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self.lock_:
+            entry = self.entries_.get(key)
+            if entry is not None and not self._expired(entry[0], now):
+                self.entries_.move_to_end(key)
+                self.hits_ += 1
+                return entry[1]
+            if entry is not None:
+                del self.entries_[key]
+
+        row = None
+        with self.db_lock_:
+            if self.db_ is not None:
+                row = self.db_.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+
+        with self.lock_:
+            if row is not None and not self._expired(row[1], now):
+                self._put_memory(key, row[1], row[0])
+                self.hits_ += 1
+                return row[0]
+            self.misses_ += 1
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self.lock_:
+            self._put_memory(key, now, value)
+        with self.db_lock_:
+            if self.db_ is None:
+                return
+            self.db_.execute("INSERT OR REPLACE INTO responses (key, value, created) VALUES (?, ?, ?)", (key, value, now))
+            self.writes_ += 1
+            if self.writes_ % _TRIM_EVERY == 0:
+                self._trim(now)
+            self.db_.commit()
+
+    def clear(self) -> None:
+        with self.lock_:
+            self.entries_.clear()
+        with self.db_lock_:
+            if self.db_ is not None:
+                self.db_.execute("DELETE FROM responses")
+                self.db_.commit()
+
+    def stats(self) -> dict:
+        with self.lock_:
+            return {"entries": len(self.entries_), "hits": self.hits_, "misses": self.misses_}
+
+    def close(self) -> None:
+        with self.db_lock_:
+            if self.db_ is not None:
+                self.db_.close()
+                self.db_ = None
+
+    def _trim(self, now: float) -> None:
+        if self.ttl_seconds_ is not None and self.ttl_seconds_ > 0:
+            self.db_.execute("DELETE FROM responses WHERE created <= ?", (now - self.ttl_seconds_,))
+        # one walk down the created index finds the oldest entry still kept
+        self.db_.execute(
+            "DELETE FROM responses WHERE created < "
+            "(SELECT created FROM responses ORDER BY created DESC LIMIT 1 OFFSET ?)",
+            (self.max_disk_entries_ - 1,),
+        )
+
+    def _put_memory(self, key: str, created: float, value: str) -> None:
+        self.entries_[key] = (created, value)
+        self.entries_.move_to_end(key)
+        while len(self.entries_) > self.max_entries_:
+            self.entries_.popitem(last=False)
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl_seconds_ is not None and self.ttl_seconds_ > 0 and now - created >= self.ttl_seconds_
@@ -0,0 +1,91 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+_current_token: contextvars.ContextVar[Optional["CancelToken"]] = contextvars.ContextVar("noton_cancel", default=None)
+
+
+class RequestCancelled(Exception):
+    """Raised inside an LLM call whose caller went away ("disconnect") or ran out of time ("deadline")."""
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(f"LLM call cancelled ({reason})")
+        self.reason = reason
+
+
+class CancelToken:
+    """Cancellation state of one request, polled by LLM calls between streamed chunks.
+
+    ``probe()`` reports whether the caller is gone, e.g. its socket was closed; it is run
+    at most every ``probe_interval`` seconds. ``deadline`` is an absolute ``time.monotonic()``
+    value. A disconnect is ignored while any ``hold_while`` predicate holds, so a call that
+    other requests share keeps running. ``on_cancel(reason)`` runs once, when the token fires.
+    """
+
+    def __init__(
+        self,
+        deadline: Optional[float] = None,
+        probe: Optional[Callable[[], bool]] = None,
+        probe_interval: float = 0.1,
+        on_cancel: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self.deadline_ = deadline
+        self.probe_ = probe
+        self.probe_interval_ = probe_interval
+        self.on_cancel_ = on_cancel
+        self.holds_: list[Callable[[], bool]] = []
+        self.reason_: Optional[str] = None
+        self.next_probe_ = 0.0
+        self.lock_ = threading.Lock()
+
+    def hold_while(self, predicate: Callable[[], bool]) -> None:
+        self.holds_.append(predicate)
+
+    def cancel(self, reason: str) -> None:
+        with self.lock_:
+            if self.reason_ is not None:
+                return
+            self.reason_ = reason
+        if self.on_cancel_ is not None:
+            self.on_cancel_(reason)
+
+    @property
+    def reason(self) -> Optional[str]:
+        """Why the request is cancelled, or ``None`` while it may go on."""
+        if self.reason_ is None:
+            now = time.monotonic()
+            if self.deadline_ is not None and now >= self.deadline_:
+                self.cancel("deadline")
+            elif self.probe_ is not None and now >= self.next_probe_:
+                self.next_probe_ = now + self.probe_interval_
+                if self.probe_() and not any(hold() for hold in self.holds_):
+                    self.cancel("disconnect")
+        return self.reason_
+
+    def check(self) -> None:
+        reason = self.reason
+        if reason is not None:
+            raise RequestCancelled(reason)
+
+
+@contextmanager
+def cancel_scope(token: Optional[CancelToken]) -> Iterator[Optional[CancelToken]]:
+    """Make ``token`` the one checked by LLM calls made inside the block (``None`` clears it)."""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+def current_token() -> Optional[CancelToken]:
+    return _current_token.get()
+
+
+def check_cancelled() -> None:
+    """Raise ``RequestCancelled`` if the current request is cancelled; a no-op outside ``cancel_scope``."""
+    token = _current_token.get()
+    if token is not None:
+        token.check()
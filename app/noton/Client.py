@@ -0,0 +1,124 @@
+import asyncio
+import atexit
+import os
+import threading
+from typing import Optional
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+
+class ClientPool:
+    """Thread-safe cache of OpenAI clients keyed by (base_url, api_key).
+
+    Every cached client shares one keep-alive ``httpx.Client`` so that connections
+    (and TLS sessions) are reused across calls, retries and server worker threads.
+    Async clients are bound to an event loop, so ``get_async`` keeps one
+    ``httpx.AsyncClient`` per running loop.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        timeout: float = 600.0,
+        connect_timeout: float = 5.0,
+    ) -> None:
+        self.limits_ = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout_ = httpx.Timeout(timeout, connect=connect_timeout)
+
+        self.http_client_: Optional[httpx.Client] = None
+        self.clients_: dict[tuple[str, str], OpenAI] = {}
+        self.async_http_clients_: dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+        self.async_clients_: dict[tuple[asyncio.AbstractEventLoop, str, str], AsyncOpenAI] = {}
+        self.lock_ = threading.Lock()
+
+    def get(self, base_url: str, api_key: str) -> OpenAI:
+        key = (base_url, api_key)
+        client = self.clients_.get(key)
+        if client is not None:
+            return client
+
+        with self.lock_:
+            client = self.clients_.get(key)
+            if client is None:
+                if self.http_client_ is None:
+                    self.http_client_ = httpx.Client(limits=self.limits_, timeout=self.timeout_)
+                # retries are handled by noton.Retry.RetryPolicy, not inside the client
+                client = OpenAI(api_key=api_key, base_url=base_url, http_client=self.http_client_, max_retries=0)
+                self.clients_[key] = client
+            return client
+
+    def get_async(self, base_url: str, api_key: str) -> AsyncOpenAI:
+        loop = asyncio.get_running_loop()
+        key = (loop, base_url, api_key)
+        client = self.async_clients_.get(key)
+        if client is not None:
+            return client
+
+        with self.lock_:
+            client = self.async_clients_.get(key)
+            if client is None:
+                http_client = self.async_http_clients_.get(loop)
+                if http_client is None:
+                    http_client = httpx.AsyncClient(limits=self.limits_, timeout=self.timeout_)
+                    self.async_http_clients_[loop] = http_client
+                client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+                self.async_clients_[key] = client
+            return client
+
+    async def aclose(self) -> None:
+        """Close the async clients bound to the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self.lock_:
+            for key in [key for key in self.async_clients_ if key[0] is loop]:
+                del self.async_clients_[key]
+            http_client = self.async_http_clients_.pop(loop, None)
+        if http_client is not None:
+            await http_client.aclose()
+
+    def close(self) -> None:
+        with self.lock_:
+            self.clients_.clear()
+            if self.http_client_ is not None:
+                self.http_client_.close()
+                self.http_client_ = None
+
+
+_default_pool: Optional[ClientPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def default_pool() -> ClientPool:
+    """Process-wide pool, sized through the ``OLLAMA_POOL_*`` environment variables."""
+    global _default_pool
+    if _default_pool is None:
+        with _default_pool_lock:
+            if _default_pool is None:
+                _default_pool = ClientPool(
+                    max_connections=int(os.getenv("OLLAMA_POOL_MAX_CONNECTIONS", "100")),
+                    max_keepalive_connections=int(os.getenv("OLLAMA_POOL_MAX_KEEPALIVE", "20")),
+                    keepalive_expiry=float(os.getenv("OLLAMA_POOL_KEEPALIVE_EXPIRY", "30")),
+                )
+    return _default_pool
+
+
+def get_client(base_url: str, api_key: str) -> OpenAI:
+    return default_pool().get(base_url, api_key)
+
+
+def get_async_client(base_url: str, api_key: str) -> AsyncOpenAI:
+    return default_pool().get_async(base_url, api_key)
+
+
+def close_clients() -> None:
+    if _default_pool is not None:
+        _default_pool.close()
+
+
+atexit.register(close_clients)
@@ -0,0 +1,376 @@
+import asyncio
+import contextvars
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Optional, Sequence
+
+from noton.Module import Module
+
+
+class GraphInput:
+    """A named value supplied when the compiled graph is called."""
+
+    def __init__(self, name: str) -> None:
+        self.name_ = name
+
+    def __repr__(self) -> str:
+        return f"GraphInput({self.name_!r})"
+
+
+class Node:
+    """One module call in a graph; its arguments may be inputs, other nodes or constants."""
+
+    def __init__(self, graph: "Graph", module: Module, args: tuple, kwargs: dict, name: str, method: str) -> None:
+        self.graph_ = graph
+        self.module_ = module
+        self.args_ = args
+        self.kwargs_ = kwargs
+        self.name_ = name
+        self.method_ = method
+
+    def dependencies(self) -> list["Node"]:
+        seen = []
+        for value in list(self.args_) + list(self.kwargs_.values()):
+            if isinstance(value, Node) and value not in seen:
+                seen.append(value)
+        return seen
+
+    def __repr__(self) -> str:
+        return f"Node({self.name_!r})"
+
+
+class Graph:
+    """Declarative pipeline of ``Module`` calls.
+
+        graph = Graph()
+        text = graph.input("text")
+        answer = graph.add(ollama, graph.add(TextInput(), text))
+        graph.output(graph.add(TextFilter(), answer))
+        pipeline = compile_graph(graph)
+        pipeline(text="...")
+
+    Nodes can only refer to inputs and nodes added before them, so a graph is acyclic
+    and already in topological order.
+    """
+
+    def __init__(self) -> None:
+        self.inputs_: list[GraphInput] = []
+        self.nodes_: list[Node] = []
+        self.output_: Optional[Node] = None
+
+    def input(self, name: str) -> GraphInput:
+        assert all(graph_input.name_ != name for graph_input in self.inputs_), f"duplicate graph input {name!r}"
+        graph_input = GraphInput(name)
+        self.inputs_.append(graph_input)
+        return graph_input
+
+    def inputs(self, *names: str) -> tuple[GraphInput, ...]:
+        return tuple(self.input(name) for name in names)
+
+    def add(self, module: Module, *args, name: Optional[str] = None, method: str = "forward", **kwargs) -> Node:
+        """Add ``module.<method>(*args, **kwargs)``; returns the node standing for its result."""
+        assert isinstance(module, Module), "graph stages must be noton Modules"
+        for value in list(args) + list(kwargs.values()):
+            if isinstance(value, Node):
+                assert value.graph_ is self, f"{value!r} belongs to another graph"
+            elif isinstance(value, GraphInput):
+                assert value in self.inputs_, f"{value!r} belongs to another graph"
+        node = Node(self, module, args, kwargs, name or f"{type(module).__name__}_{len(self.nodes_)}", method)
+        self.nodes_.append(node)
+        return node
+
+    def output(self, node: Node) -> Node:
+        assert node.graph_ is self, f"{node!r} belongs to another graph"
+        self.output_ = node
+        return node
+
+
+class _Step:
+    """Nodes executed back to back without a scheduling hop (a fused chain or a single node)."""
+
+    def __init__(self, index: int, node: Node) -> None:
+        self.index_ = index
+        self.nodes_ = [node]
+        self.deps_: list["_Step"] = []
+        self.consumers_: list["_Step"] = []
+
+
+class _Memo:
+    """Small LRU of results keyed by the call arguments; unhashable arguments are not cached."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries_ = max(max_entries, 1)
+        self.entries_: OrderedDict = OrderedDict()
+        self.lock_ = threading.Lock()
+
+    @staticmethod
+    def key(args: tuple, kwargs: dict) -> Optional[tuple]:
+        key = (args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def get(self, key: tuple) -> tuple[bool, Any]:
+        with self.lock_:
+            if key in self.entries_:
+                self.entries_.move_to_end(key)
+                return True, self.entries_[key]
+        return False, None
+
+    def set(self, key: tuple, value: Any) -> None:
+        with self.lock_:
+            self.entries_[key] = value
+            self.entries_.move_to_end(key)
+            while len(self.entries_) > self.max_entries_:
+                self.entries_.popitem(last=False)
+
+
+class CompiledGraph(Module):
+    """Executor for a ``Graph``; itself a ``Module``, so compiled graphs nest.
+
+    - independent steps run concurrently (a thread pool for ``forward``, tasks for ``aforward``)
+    - chains of pure stages (``pure_ = True``) with a single consumer are fused into one step
+    - stages with ``memoize_ = True`` get an LRU cache keyed by their arguments
+    - ``batch``/``abatch`` run many inputs with bounded concurrency
+
+    ``on_stage(name, seconds)``, when given, receives the duration of every node.
+    """
+
+    def __init__(self, graph: Graph, max_workers: int = 8, memo_size: int = 1024, on_stage: Optional[Callable[[str, float], None]] = None) -> None:
+        super().__init__()
+        assert graph.output_ is not None, "graph has no output; call graph.output(node)"
+        self.graph_ = graph
+        self.max_workers_ = max(max_workers, 1)
+        self.on_stage_ = on_stage
+        self.memos_ = {id(node): _Memo(memo_size) for node in graph.nodes_ if node.module_.memoize_}
+
+        # only nodes the output depends on are executed
+        needed = {id(graph.output_)}
+        for node in reversed(graph.nodes_):
+            if id(node) in needed:
+                needed.update(id(dep) for dep in node.dependencies())
+        self.steps_ = self._fuse([node for node in graph.nodes_ if id(node) in needed])
+        self.output_step_ = self.steps_[-1]
+
+        self.pool_: Optional[ThreadPoolExecutor] = None
+        self.pool_lock_ = threading.Lock()
+
+    def plan(self) -> list[list[str]]:
+        """Node names per step, in execution order; fused nodes share a step."""
+        return [[node.name_ for node in step.nodes_] for step in self.steps_]
+
+    def _fuse(self, nodes: list[Node]) -> list[_Step]:
+        consumers: dict[int, int] = {id(node): 0 for node in nodes}
+        for node in nodes:
+            for dep in node.dependencies():
+                consumers[id(dep)] += 1
+
+        steps: list[_Step] = []
+        step_of: dict[int, _Step] = {}
+        for node in nodes:
+            deps = node.dependencies()
+            parent = deps[0] if len(deps) == 1 else None
+            if (
+                parent is not None
+                and node.module_.pure_
+                and parent.module_.pure_
+                and consumers[id(parent)] == 1
+                and step_of[id(parent)].nodes_[-1] is parent
+            ):
+                step = step_of[id(parent)]
+                step.nodes_.append(node)
+            else:
+                step = _Step(len(steps), node)
+                steps.append(step)
+            step_of[id(node)] = step
+
+        for step in steps:
+            for node in step.nodes_:
+                for dep in node.dependencies():
+                    dep_step = step_of[id(dep)]
+                    if dep_step is not step and dep_step not in step.deps_:
+                        step.deps_.append(dep_step)
+                        dep_step.consumers_.append(step)
+        return steps
+
+    def _bind(self, args: tuple, kwargs: dict) -> dict:
+        names = [graph_input.name_ for graph_input in self.graph_.inputs_]
+        assert len(args) <= len(names), f"expected at most {len(names)} positional inputs"
+        bound = dict(zip(names, args))
+        bound.update(kwargs)
+        missing = [name for name in names if name not in bound]
+        assert not missing, f"missing graph inputs: {missing}"
+        return bound
+
+    @staticmethod
+    def _resolve(value: Any, inputs: dict, values: dict) -> Any:
+        if isinstance(value, GraphInput):
+            return inputs[value.name_]
+        if isinstance(value, Node):
+            return values[id(value)]
+        return value
+
+    def _arguments(self, node: Node, inputs: dict, values: dict) -> tuple[tuple, dict]:
+        args = tuple(self._resolve(value, inputs, values) for value in node.args_)
+        kwargs = {key: self._resolve(value, inputs, values) for key, value in node.kwargs_.items()}
+        return args, kwargs
+
+    def _run_node(self, node: Node, inputs: dict, values: dict) -> None:
+        args, kwargs = self._arguments(node, inputs, values)
+        memo = self.memos_.get(id(node))
+        key = _Memo.key(args, kwargs) if memo is not None else None
+        if key is not None:
+            hit, value = memo.get(key)
+            if hit:
+                values[id(node)] = value
+                return
+
+        started = time.perf_counter()
+        if node.method_ == "forward":
+            # __call__ keeps the module's tracing hooks
+            value = node.module_(*args, **kwargs)
+        else:
+            value = getattr(node.module_, node.method_)(*args, **kwargs)
+        if self.on_stage_ is not None:
+            self.on_stage_(node.name_, time.perf_counter() - started)
+
+        if key is not None:
+            memo.set(key, value)
+        values[id(node)] = value
+
+    async def _arun_node(self, node: Node, inputs: dict, values: dict) -> None:
+        module = node.module_
+        async_method = getattr(module, "a" + node.method_, None)
+        if not inspect.iscoroutinefunction(async_method):
+            if module.pure_:
+                # cheap and CPU-only: not worth a thread hop
+                self._run_node(node, inputs, values)
+            else:
+                await asyncio.to_thread(self._run_node, node, inputs, values)
+            return
+
+        args, kwargs = self._arguments(node, inputs, values)
+        memo = self.memos_.get(id(node))
+        key = _Memo.key(args, kwargs) if memo is not None else None
+        if key is not None:
+            hit, value = memo.get(key)
+            if hit:
+                values[id(node)] = value
+                return
+
+        started = time.perf_counter()
+        # async methods bypass Module.__call__, so the span is opened here
+        with module.span("a" + node.method_):
+            value = await async_method(*args, **kwargs)
+        if self.on_stage_ is not None:
+            self.on_stage_(node.name_, time.perf_counter() - started)
+
+        if key is not None:
+            memo.set(key, value)
+        values[id(node)] = value
+
+    def _run_step(self, step: _Step, inputs: dict, values: dict) -> None:
+        for node in step.nodes_:
+            self._run_node(node, inputs, values)
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self.pool_ is None:
+            with self.pool_lock_:
+                if self.pool_ is None:
+                    self.pool_ = ThreadPoolExecutor(max_workers=self.max_workers_, thread_name_prefix="noton-graph")
+        return self.pool_
+
+    def forward(self, *args, **kwargs) -> Any:
+        inputs = self._bind(args, kwargs)
+        values: dict[int, Any] = {}
+        waiting = {step.index_: len(step.deps_) for step in self.steps_}
+        ready = [step for step in self.steps_ if not step.deps_]
+        running: dict[Future, _Step] = {}
+
+        def finished(step: _Step) -> None:
+            for consumer in step.consumers_:
+                waiting[consumer.index_] -= 1
+                if waiting[consumer.index_] == 0:
+                    ready.append(consumer)
+
+        try:
+            while ready or running:
+                if ready:
+                    # all but one ready step go to the pool; the caller's thread runs the last one
+                    *others, mine = ready
+                    ready.clear()
+                    for step in others:
+                        # a fresh context copy per step keeps span parents across threads
+                        future = self._pool().submit(contextvars.copy_context().run, self._run_step, step, inputs, values)
+                        running[future] = step
+                    self._run_step(mine, inputs, values)
+                    finished(mine)
+                    done = [future for future in running if future.done()]
+                else:
+                    done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    step = running.pop(future)
+                    future.result()
+                    finished(step)
+        except BaseException:
+            for future in running:
+                future.cancel()
+            raise
+        return values[id(self.graph_.output_)]
+
+    async def aforward(self, *args, **kwargs) -> Any:
+        inputs = self._bind(args, kwargs)
+        values: dict[int, Any] = {}
+        tasks: dict[int, asyncio.Task] = {}
+
+        async def run(step: _Step) -> None:
+            if step.deps_:
+                await asyncio.gather(*(tasks[dep.index_] for dep in step.deps_))
+            for node in step.nodes_:
+                await self._arun_node(node, inputs, values)
+
+        # steps are in topological order, so every dependency's task exists already
+        for step in self.steps_:
+            tasks[step.index_] = asyncio.ensure_future(run(step))
+        try:
+            await tasks[self.output_step_.index_]
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            # collect sibling failures too, so none is reported as never retrieved
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+        return values[id(self.graph_.output_)]
+
+    def batch(self, items: Sequence[dict], max_workers: Optional[int] = None) -> list:
+        """Run the graph once per input dict; results keep the input order."""
+        if not items:
+            return []
+        workers = min(max_workers or self.max_workers_, len(items))
+        # a separate pool, so batch items never wait for the pool their own steps use
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="noton-batch") as pool:
+            futures = [pool.submit(contextvars.copy_context().run, lambda item=item: self.forward(**item)) for item in items]
+            return [future.result() for future in futures]
+
+    async def abatch(self, items: Sequence[dict], concurrency: Optional[int] = None) -> list:
+        """Asyncio counterpart of ``batch``."""
+        gate = asyncio.Semaphore(concurrency or self.max_workers_)
+
+        async def run(item: dict) -> Any:
+            async with gate:
+                return await self.aforward(**item)
+
+        return list(await asyncio.gather(*(run(item) for item in items)))
+
+    def close(self) -> None:
+        if self.pool_ is not None:
+            self.pool_.shutdown(wait=False)
+
+
+def compile_graph(graph: Graph, max_workers: int = 8, memo_size: int = 1024, on_stage: Optional[Callable[[str, float], None]] = None) -> CompiledGraph:
+    """Turn a declared ``Graph`` into an optimized executor."""
+    return CompiledGraph(graph, max_workers, memo_size, on_stage)
@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+
+def estimate_tokens(message: dict) -> int:
+    """Rough token count for a chat message (~4 characters per token plus framing)."""
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return len(content) // 4 + 4
+
+
+class ConversationStore:
+    """Bounded per-session chat history with LRU/TTL eviction and a token budget.
+
+    Only user/assistant turns are stored; the system prompt is supplied per call so
+    that it never accumulates. When a session exceeds ``max_history_tokens`` the oldest
+    turns are dropped, and optionally condensed through ``summarizer``.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 256,
+        ttl_seconds: float = 1800.0,
+        max_history_tokens: int = 4096,
+        summarizer: Optional[Callable[[list[dict]], str]] = None,
+    ) -> None:
+        self.max_sessions_ = max(max_sessions, 1)
+        self.ttl_seconds_ = ttl_seconds
+        self.max_history_tokens_ = max(max_history_tokens, 0)
+        self.summarizer_ = summarizer
+
+        self.sessions_: OrderedDict[str, tuple[float, list[dict]]] = OrderedDict()
+        self.lock_ = threading.Lock()
+
+    def __len__(self) -> int:
+        with self.lock_:
+            return len(self.sessions_)
+
+    def history(self, session_id: str) -> list[dict]:
+        now = time.monotonic()
+        with self.lock_:
+            self._evict_expired(now)
+            entry = self.sessions_.get(session_id)
+            if entry is None:
+                return []
+            self.sessions_[session_id] = (now, entry[1])
+            self.sessions_.move_to_end(session_id)
+            return list(entry[1])
+
+    def append(self, session_id: str, *messages: dict) -> None:
+        now = time.monotonic()
+        with self.lock_:
+            self._evict_expired(now)
+            _, history = self.sessions_.pop(session_id, (now, []))
+            history = history + list(messages)
+            history, dropped = self._truncate(history)
+            self.sessions_[session_id] = (now, history)
+            while len(self.sessions_) > self.max_sessions_:
+                self.sessions_.popitem(last=False)
+
+        if dropped and self.summarizer_ is not None:
+            self._summarize(session_id, dropped)
+
+    def clear(self, session_id: Optional[str] = None) -> None:
+        with self.lock_:
+            if session_id is None:
+                self.sessions_.clear()
+            else:
+                self.sessions_.pop(session_id, None)
+
+    def _evict_expired(self, now: float) -> None:
+        if self.ttl_seconds_ is None or self.ttl_seconds_ <= 0:
+            return
+        # entries are kept in access order, so expired sessions sit at the front
+        while self.sessions_:
+            session_id, (last_access, _) = next(iter(self.sessions_.items()))
+            if now - last_access < self.ttl_seconds_:
+                break
+            self.sessions_.popitem(last=False)
+
+    def _truncate(self, history: list[dict]) -> tuple[list[dict], list[dict]]:
+        budget = self.max_history_tokens_
+        kept: list[dict] = []
+        used = 0
+        for message in reversed(history):
+            cost = estimate_tokens(message)
+            if used + cost > budget:
+                break
+            kept.append(message)
+            used += cost
+        kept.reverse()
+        # never start a session history with a dangling assistant reply
+        while kept and kept[0].get("role") == "assistant":
+            kept.pop(0)
+        dropped = history[: len(history) - len(kept)]
+        return kept, dropped
+
+    def _summarize(self, session_id: str, dropped: list[dict]) -> None:
+        try:
+            summary = self.summarizer_(dropped)
+        except Exception as e:
+            print(f"Error while summarizing conversation: {str(e)}")
+            return
+        if not summary:
+            return
+        note = {"role": "system", "content": f"Summary of the earlier conversation: {summary}"}
+        with self.lock_:
+            entry = self.sessions_.get(session_id)
+            if entry is None:
+                return
+            history = [message for message in entry[1] if not self._is_summary(message)]
+            self.sessions_[session_id] = (entry[0], [note] + history)
+
+    @staticmethod
+    def _is_summary(message: dict) -> bool:
+        content = message.get("content")
+        return (
+            message.get("role") == "system"
+            and isinstance(content, str)
+            and content.startswith("Summary of the earlier conversation: ")
+        )
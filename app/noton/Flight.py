@@ -0,0 +1,128 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Optional
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done_ = threading.Event()
+        self.result_: Any = None
+        self.error_: BaseException | None = None
+        self.waiting_ = 0
+
+
+class SingleFlight:
+    """Collapse concurrent calls that share a key into one execution.
+
+    The first caller for a key runs ``fn``; callers arriving while it is in flight wait
+    and receive the same result (or exception). ``do`` returns ``(result, shared)``.
+    A waiting caller gives up with ``TimeoutError`` after ``wait_timeout`` seconds; the
+    call itself goes on for the others.
+    """
+
+    def __init__(self) -> None:
+        self.lock_ = threading.Lock()
+        self.calls_: dict[str, _Call] = {}
+        self.executed_ = 0
+        self.coalesced_ = 0
+
+    def do(self, key: str, fn: Callable[..., Any], *args: Any, wait_timeout: Optional[float] = None, **kwargs: Any) -> tuple[Any, bool]:
+        with self.lock_:
+            call = self.calls_.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self.calls_[key] = call
+                self.executed_ += 1
+            else:
+                self.coalesced_ += 1
+                call.waiting_ += 1
+
+        if not leader:
+            try:
+                if not call.done_.wait(wait_timeout):
+                    raise TimeoutError("gave up waiting for the shared call")
+            finally:
+                with self.lock_:
+                    call.waiting_ -= 1
+            if call.error_ is not None:
+                raise call.error_
+            return call.result_, True
+
+        try:
+            call.result_ = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error_ = e
+            raise
+        finally:
+            with self.lock_:
+                del self.calls_[key]
+            call.done_.set()
+        return call.result_, False
+
+    def waiting(self, key: str) -> int:
+        """Callers currently waiting on the in-flight call for ``key``."""
+        with self.lock_:
+            call = self.calls_.get(key)
+            return call.waiting_ if call is not None else 0
+
+    def stats(self) -> dict:
+        with self.lock_:
+            return {"executed": self.executed_, "coalesced": self.coalesced_, "in_flight": len(self.calls_)}
+
+
+class AsyncSingleFlight:
+    """Asyncio counterpart of ``SingleFlight``; must be used from a single event loop.
+
+    The shared call runs as its own task, so the caller that started it may be cancelled
+    while others still wait; the task is cancelled only when no caller is left waiting.
+    """
+
+    def __init__(self) -> None:
+        self.calls_: dict[str, asyncio.Task] = {}
+        self.callers_: dict[asyncio.Task, int] = {}
+        self.waiting_: dict[asyncio.Task, int] = {}
+        self.executed_ = 0
+        self.coalesced_ = 0
+
+    async def do(self, key: str, fn: Callable[..., Awaitable[Any]], *args: Any, wait_timeout: Optional[float] = None, **kwargs: Any) -> tuple[Any, bool]:
+        task = self.calls_.get(key)
+        shared = task is not None
+        if shared:
+            self.coalesced_ += 1
+            self.waiting_[task] = self.waiting_.get(task, 0) + 1
+        else:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self.calls_[key] = task
+            self.executed_ += 1
+            task.add_done_callback(lambda done: self._forget(key, done))
+        self.callers_[task] = self.callers_.get(task, 0) + 1
+        try:
+            # shield so that one caller going away does not cancel the call the others wait on
+            if shared and wait_timeout is not None:
+                return await asyncio.wait_for(asyncio.shield(task), wait_timeout), shared
+            return await asyncio.shield(task), shared
+        finally:
+            self.callers_[task] -= 1
+            if not self.callers_[task]:
+                del self.callers_[task]
+                if not task.done():
+                    task.cancel()
+            if shared:
+                self.waiting_[task] -= 1
+                if not self.waiting_[task]:
+                    del self.waiting_[task]
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self.calls_.get(key) is task:
+            del self.calls_[key]
+        if not task.cancelled():
+            task.exception()  # mark as retrieved when every caller had already gone
+
+    def waiting(self, key: str) -> int:
+        """Callers other than the one that started it still waiting on the call for ``key``."""
+        task = self.calls_.get(key)
+        return self.waiting_.get(task, 0) if task is not None else 0
+
+    def stats(self) -> dict:
+        return {"executed": self.executed_, "coalesced": self.coalesced_, "in_flight": len(self.calls_)}
@@ -0,0 +1,222 @@
+import json
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+# stored per run; "controls" holds a JSON object, everything else is a scalar
+_COLUMNS = (
+    "ts",
+    "route",
+    "prompt_hash",
+    "direction",
+    "audience",
+    "language",
+    "angle",
+    "controls",
+    "query",
+    "response",
+    "took_ms",
+    "queue_ms",
+    "prompt_tokens",
+    "completion_tokens",
+    "cached",
+    "coalesced",
+)
+
+_FILTERS = ("direction", "audience", "language", "angle", "prompt_hash")
+
+# matching runs counted for a page's total; beyond this the count stops and is reported as capped
+_MAX_TOTAL = 10000
+
+_STOP = object()
+
+
+class RunHistory:
+    """Append-only run log in SQLite (WAL mode), written by a background thread.
+
+    ``record`` only enqueues: runs are inserted in batches of up to ``batch_size`` at most
+    ``flush_interval`` seconds after they arrive, so the request path never waits on disk.
+    When more than ``max_pending`` runs are waiting, new ones are dropped and counted.
+    Reads use their own connection and see every committed batch.
+
+    After each batch the writer removes the oldest runs beyond ``max_rows`` and runs older
+    than ``max_age`` seconds; ``0`` turns either limit off.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 256,
+        flush_interval: float = 0.5,
+        max_pending: int = 10000,
+        max_rows: int = 100000,
+        max_age: float = 0.0,
+    ) -> None:
+        self.path_ = path
+        self.batch_size_ = max(batch_size, 1)
+        self.flush_interval_ = flush_interval
+        self.max_rows_ = max(max_rows, 0)
+        self.max_age_ = max(max_age, 0.0)
+        self.queue_: queue.Queue = queue.Queue(maxsize=max(max_pending, 1))
+        self.written_ = 0
+        self.dropped_ = 0
+        self.evicted_ = 0
+        self.stats_lock_ = threading.Lock()
+
+        self.db_ = sqlite3.connect(path, check_same_thread=False)
+        self.db_.execute("PRAGMA journal_mode=WAL")
+        # WAL keeps committed batches durable across a crash of the process, not of the OS
+        self.db_.execute("PRAGMA synchronous=NORMAL")
+        self.db_.execute(
+            "CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL, route TEXT, "
+            "prompt_hash TEXT, direction TEXT, audience TEXT, language TEXT, angle TEXT, controls TEXT, query TEXT, "
+            "response TEXT, took_ms REAL, queue_ms REAL, prompt_tokens INTEGER, completion_tokens INTEGER, "
+            "cached INTEGER, coalesced INTEGER)"
+        )
+        # pages are read newest first by id, so the filtered indexes end in id as well
+        self.db_.execute("CREATE INDEX IF NOT EXISTS runs_ts ON runs (ts)")
+        self.db_.execute("CREATE INDEX IF NOT EXISTS runs_direction ON runs (direction, id)")
+        self.db_.execute("CREATE INDEX IF NOT EXISTS runs_audience ON runs (audience, id)")
+        self.db_.execute("CREATE INDEX IF NOT EXISTS runs_language ON runs (language, id)")
+        self.db_.execute("CREATE INDEX IF NOT EXISTS runs_angle ON runs (angle, id)")
+        self.db_.execute("CREATE INDEX IF NOT EXISTS runs_prompt_hash ON runs (prompt_hash, id)")
+        self.db_.commit()
+
+        self.reader_ = sqlite3.connect(path, check_same_thread=False)
+        self.reader_.row_factory = sqlite3.Row
+        self.reader_lock_ = threading.Lock()
+
+        self.writer_ = threading.Thread(target=self._write_loop, name="noton-history", daemon=True)
+        self.writer_.start()
+
+    def record(self, run: dict) -> bool:
+        """Queue one run for writing; returns False if it was dropped because the queue is full."""
+        row = tuple(run.get(name) for name in _COLUMNS[1:])
+        try:
+            self.queue_.put_nowait((run.get("ts") or time.time(),) + row)
+        except queue.Full:
+            with self.stats_lock_:
+                self.dropped_ += 1
+            return False
+        return True
+
+    def query(
+        self,
+        limit: int = 20,
+        before: Optional[int] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        **filters: Optional[str],
+    ) -> dict:
+        """One page of runs, newest first.
+
+        ``before`` is the ``next_cursor`` of the previous page. ``filters`` match columns in
+        ``_FILTERS`` exactly; ``since``/``until`` bound ``ts`` (Unix seconds). ``total`` counts
+        the matching runs up to ``_MAX_TOTAL``; ``total_capped`` says the count stopped there.
+        """
+        clauses, params = [], []
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("ts < ?")
+            params.append(until)
+        for name, value in filters.items():
+            assert name in _FILTERS, f"cannot filter runs by {name!r}"
+            if value is not None:
+                clauses.append(f"{name} = ?")
+                params.append(value)
+        # the total counts every page, so the cursor only narrows the page query
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        page_clauses = clauses + ["id < ?"] if before is not None else clauses
+        page_params = params + [before] if before is not None else params
+        page_where = f"WHERE {' AND '.join(page_clauses)} " if page_clauses else ""
+
+        with self.reader_lock_:
+            rows = self.reader_.execute(
+                f"SELECT * FROM runs {page_where}ORDER BY id DESC LIMIT ?", (*page_params, limit + 1)
+            ).fetchall()
+            # a bounded count keeps every page as cheap as its own rows, however large the log
+            total = self.reader_.execute(
+                f"SELECT COUNT(*) FROM (SELECT 1 FROM runs {where}LIMIT ?)", (*params, _MAX_TOTAL + 1)
+            ).fetchone()[0]
+
+        items = [_row_to_run(row) for row in rows[:limit]]
+        next_cursor = items[-1]["id"] if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor, "total": min(total, _MAX_TOTAL), "total_capped": total > _MAX_TOTAL}
+
+    def flush(self) -> None:
+        """Block until every queued run is written."""
+        self.queue_.join()
+
+    def stats(self) -> dict:
+        with self.stats_lock_:
+            return {"written": self.written_, "dropped": self.dropped_, "evicted": self.evicted_, "pending": self.queue_.qsize()}
+
+    def close(self) -> None:
+        self.queue_.put(_STOP)
+        self.writer_.join(timeout=5.0)
+        with self.reader_lock_:
+            self.reader_.close()
+
+    def _write_loop(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self.queue_.get()
+            if first is _STOP:
+                self.queue_.task_done()
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval_
+            while len(batch) < self.batch_size_:
+                try:
+                    item = self.queue_.get(timeout=max(deadline - time.monotonic(), 0.0))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self.queue_.task_done()
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write(batch)
+        self.db_.close()
+
+    def _write(self, batch: list) -> None:
+        try:
+            with self.db_:
+                self.db_.executemany(
+                    f"INSERT INTO runs ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})", batch
+                )
+                evicted = self._evict()
+            with self.stats_lock_:
+                self.written_ += len(batch)
+                self.evicted_ += evicted
+        except sqlite3.Error as e:
+            # a broken history must not take the API down with it
+            print(f"Error writing {len(batch)} runs to {self.path_}: {str(e)}")
+            with self.stats_lock_:
+                self.dropped_ += len(batch)
+        finally:
+            for _ in batch:
+                self.queue_.task_done()
+
+    def _evict(self) -> int:
+        evicted = 0
+        if self.max_rows_:
+            # ids only grow and old runs go first, so the newest max_rows ids are the ones kept
+            evicted += self.db_.execute(
+                "DELETE FROM runs WHERE id <= (SELECT MAX(id) FROM runs) - ?", (self.max_rows_,)
+            ).rowcount
+        if self.max_age_:
+            evicted += self.db_.execute("DELETE FROM runs WHERE ts < ?", (time.time() - self.max_age_,)).rowcount
+        return evicted
+
+
+def _row_to_run(row: sqlite3.Row) -> dict[str, Any]:
+    run = dict(row)
+    run["controls"] = json.loads(run["controls"]) if run["controls"] else None
+    run["cached"] = bool(run["cached"])
+    run["coalesced"] = bool(run["coalesced"])
+    return run
@@ -2,6 +2,8 @@ from noton.Module import Module
 
 
 class TextInput(Module):
+    pure_ = True
+
     def __init__(self ) -> None:
         super().__init__()
 
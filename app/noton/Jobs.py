@@ -0,0 +1,341 @@
+import http.client
+import ipaddress
+import json
+import secrets
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, Sequence
+from urllib.parse import urlsplit
+
+from noton.Metrics import MetricsRegistry, default_registry
+from noton.Scheduler import OverloadedError, QueueFullError
+
+# a SQLite store drops expired jobs at most this often
+_EVICT_INTERVAL = 30.0
+
+
+def check_callback_url(url: Any, allowed_hosts: Sequence[str] = ()) -> Optional[str]:
+    """Why ``url`` cannot be notified, or ``None``.
+
+    A host listed in ``allowed_hosts`` is accepted as it is, and with a non-empty list no
+    other host is. Otherwise the host must resolve only to public addresses, so callers
+    cannot make the server reach loopback, private, link-local or metadata endpoints.
+    """
+    return _callback_address(url, allowed_hosts)[1]
+
+
+def _callback_address(url: Any, allowed_hosts: Sequence[str]) -> tuple[Optional[str], Optional[str]]:
+    """``(address, None)`` with the checked address to connect to, or ``(None, why refused)``.
+
+    An allowed host gets ``(None, None)``: it is trusted, so it is resolved as usual.
+    """
+    if not isinstance(url, str) or not url.strip():
+        return None, "Field 'callback_url' must be a non-empty string."
+    parts = urlsplit(url.strip())
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+    except ValueError:
+        return None, "Field 'callback_url' has an invalid port."
+    if parts.scheme not in {"http", "https"} or not parts.hostname:
+        return None, "Field 'callback_url' must be an http or https URL."
+    host = parts.hostname.lower()
+    if allowed_hosts:
+        return None, None if host in allowed_hosts else f"Callbacks to host {host!r} are not allowed."
+    try:
+        addresses = [info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)]
+    except (OSError, UnicodeError):
+        return None, f"Callback host {host!r} cannot be resolved."
+    for address in addresses:
+        if not _public_address(address):
+            return None, f"Callbacks to host {host!r} are not allowed: it resolves to a non-public address."
+    return addresses[0], None
+
+
+def _public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def _post_json(url: str, body: bytes, address: Optional[str], timeout: float) -> int:
+    """POST ``body`` to ``url`` and return the status; with ``address``, connect there and nowhere else.
+
+    Resolving the host again could give a different answer than the one just checked, so the
+    socket goes to ``address`` while the Host header and TLS still name the URL's host.
+    Redirects are not followed.
+    """
+    parts = urlsplit(url.strip())
+    connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+    connection = connection_class(parts.hostname, parts.port, timeout=timeout)
+    if address is not None:
+        connection._create_connection = lambda target, *args: socket.create_connection((address, target[1]), *args)
+    try:
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        connection.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+
+def _default_error(exc: BaseException) -> dict:
+    return {"error": "Internal Server Error", "detail": str(exc)}
+
+
+class JobStore:
+    """Background jobs: a bounded pool of worker threads and the state of every job.
+
+    ``submit(fn)`` returns the new job at once; a worker later runs ``fn()``, and the dict
+    it returns becomes the job's ``result``. An exception becomes its ``error`` through
+    ``error_fn``. At most ``max_pending`` jobs wait or run in this process; further
+    submissions get ``QueueFullError``. Finished jobs are kept for ``ttl_seconds``.
+
+    With ``path``, job states are kept in SQLite (WAL mode), so every process sharing the
+    file can report on any job; otherwise they stay in memory, at most ``max_finished`` of
+    them. A job's final state is POSTed as JSON to its ``callback_url``, with up to
+    ``callback_attempts`` tries; delivery is best effort and stops with ``close``. The URL is
+    checked against ``callback_hosts`` (see ``check_callback_url``) again before every try,
+    and redirects are not followed.
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        max_pending: int = 1000,
+        ttl_seconds: float = 3600.0,
+        path: Optional[str] = None,
+        max_finished: int = 10000,
+        error_fn: Optional[Callable[[BaseException], dict]] = None,
+        callback_attempts: int = 3,
+        callback_timeout: float = 10.0,
+        callback_hosts: Sequence[str] = (),
+        metrics: Optional[MetricsRegistry] = None,
+    ) -> None:
+        self.workers_ = max(workers, 1)
+        self.max_pending_ = max(max_pending, 1)
+        self.ttl_seconds_ = ttl_seconds
+        self.path_ = path
+        self.max_finished_ = max(max_finished, 1)
+        self.error_fn_ = error_fn or _default_error
+        self.callback_attempts_ = max(callback_attempts, 1)
+        self.callback_timeout_ = callback_timeout
+        self.callback_hosts_ = tuple(host.strip().lower() for host in callback_hosts if host.strip())
+
+        self.pool_ = ThreadPoolExecutor(max_workers=self.workers_, thread_name_prefix="noton-job")
+        self.callbacks_ = ThreadPoolExecutor(max_workers=2, thread_name_prefix="noton-job-callback")
+        self.lock_ = threading.Lock()
+        self.idle_ = threading.Condition(self.lock_)
+        # queued and running jobs of this process; finished ones move to the store
+        self.live_: dict[str, dict] = {}
+        self.finished_: OrderedDict[str, dict] = OrderedDict()
+        self.closing_ = False
+        self.next_evict_ = 0.0
+
+        self.db_: Optional[sqlite3.Connection] = None
+        if path:
+            self.db_ = sqlite3.connect(path, check_same_thread=False, timeout=10.0)
+            self.db_.execute("PRAGMA journal_mode=WAL")
+            self.db_.execute("PRAGMA synchronous=NORMAL")
+            self.db_.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, created REAL NOT NULL, "
+                "finished REAL, record TEXT NOT NULL)"
+            )
+            self.db_.execute("CREATE INDEX IF NOT EXISTS jobs_expiry ON jobs (COALESCE(finished, created))")
+            self.db_.commit()
+            self.db_lock_ = threading.Lock()
+
+        registry = metrics if metrics is not None else default_registry()
+        self.outcomes_ = registry.counter("noton_jobs_total", "Background jobs by outcome.", ["outcome"])
+        self.callback_outcomes_ = registry.counter("noton_job_callbacks_total", "Job completion callbacks by outcome.", ["outcome"])
+        registry.gauge("noton_jobs_pending", "Background jobs waiting or running in this process.", ["status"]).set_function(
+            lambda: {(name,): count for name, count in self._live_counts().items()}
+        )
+
+    def submit(self, fn: Callable[[], dict], callback_url: Optional[str] = None) -> dict:
+        """Queue ``fn`` and return the new job; raises ``OverloadedError`` when it cannot be taken."""
+        job = {
+            "id": secrets.token_urlsafe(12),
+            "status": "queued",
+            "created": time.time(),
+            "started": None,
+            "finished": None,
+            "result": None,
+            "error": None,
+            "callback": {"url": callback_url, "status": "pending", "attempts": 0} if callback_url else None,
+        }
+        with self.lock_:
+            if self.closing_:
+                raise OverloadedError("The server is shutting down; retry later.", 5.0)
+            if len(self.live_) >= self.max_pending_:
+                self.outcomes_.inc(outcome="rejected")
+                # every worker is busy with a full backlog; the oldest one frees a slot first
+                raise QueueFullError("Too many jobs are pending; retry later.", max(len(self.live_) / self.workers_, 1.0))
+            self.live_[job["id"]] = job
+            view = dict(job)
+        self._save(view)
+        try:
+            self.pool_.submit(self._run, job["id"], fn)
+        except RuntimeError:
+            # closed between the check above and now
+            self._finish(job["id"], "failed", error={"error": "Service Unavailable", "detail": "The server stopped before the job started."})
+        self._evict()
+        return view
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Current state of the job, or ``None`` if it is unknown or expired."""
+        self._evict()
+        with self.lock_:
+            job = self.live_.get(job_id) or self.finished_.get(job_id)
+            if job is not None:
+                return dict(job)
+        if self.db_ is None:
+            return None
+        # another process sharing the store may own the job
+        with self.db_lock_:
+            row = self.db_.execute(
+                "SELECT record FROM jobs WHERE id = ? AND COALESCE(finished, created) >= ?", (job_id, time.time() - self.ttl_seconds_)
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def stats(self) -> dict:
+        with self.lock_:
+            counts = self._live_counts_locked()
+            finished = len(self.finished_)
+        if self.db_ is not None:
+            # every process sharing the store counts the same finished jobs
+            with self.db_lock_:
+                finished = self.db_.execute("SELECT COUNT(*) FROM jobs WHERE finished IS NOT NULL").fetchone()[0]
+        return {**counts, "finished": finished, "workers": self.workers_, "max_pending": self.max_pending_}
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Stop taking jobs, give the pending ones ``timeout`` seconds, then fail the rest."""
+        with self.lock_:
+            self.closing_ = True
+            self.idle_.wait_for(lambda: not self.live_, timeout=timeout)
+            abandoned = list(self.live_)
+        self.pool_.shutdown(wait=False, cancel_futures=True)
+        for job_id in abandoned:
+            # pollers would otherwise see "queued" or "running" until the job expires
+            self._finish(job_id, "failed", error={"error": "Service Unavailable", "detail": "The server stopped before the job finished."})
+        # callbacks still being retried are given up with the process
+        self.callbacks_.shutdown(wait=False)
+
+    def _run(self, job_id: str, fn: Callable[[], dict]) -> None:
+        with self.lock_:
+            job = self.live_.get(job_id)
+            if job is None:
+                return
+            job["status"] = "running"
+            job["started"] = time.time()
+            view = dict(job)
+        self._save(view)
+        try:
+            result = fn()
+        except Exception as exc:  # pylint: disable=broad-except
+            self._finish(job_id, "failed", error=self.error_fn_(exc))
+        else:
+            self._finish(job_id, "succeeded", result=result)
+
+    def _finish(self, job_id: str, status: str, result: Optional[dict] = None, error: Optional[dict] = None) -> None:
+        with self.lock_:
+            job = self.live_.pop(job_id, None)
+            if job is None:
+                return
+            job.update(status=status, finished=time.time(), result=result, error=error)
+            if self.db_ is None:
+                self.finished_[job_id] = job
+                while len(self.finished_) > self.max_finished_:
+                    self.finished_.popitem(last=False)
+            view = dict(job)
+            self.idle_.notify_all()
+        self._save(view)
+        self.outcomes_.inc(outcome=status)
+        if view["callback"] is not None:
+            try:
+                self.callbacks_.submit(self._notify, view)
+            except RuntimeError:
+                # callbacks are already shut down; the job can still be polled
+                pass
+
+    def _notify(self, job: dict) -> None:
+        callback = dict(job["callback"])
+        body = json.dumps({**job, "callback": None}).encode("utf-8")
+        for attempt in range(self.callback_attempts_):
+            # the host may resolve elsewhere by now than when the job was submitted
+            address, refused = _callback_address(callback["url"], self.callback_hosts_)
+            if refused:
+                print(f"Error notifying {callback['url']} of job {job['id']}: {refused}")
+                callback["status"] = "failed"
+                break
+            callback["attempts"] = attempt + 1
+            try:
+                status = _post_json(callback["url"], body, address, self.callback_timeout_)
+                if not 200 <= status < 300:
+                    raise ValueError(f"HTTP {status}")
+                callback["status"] = "delivered"
+                break
+            except (http.client.HTTPException, OSError, ValueError) as e:
+                print(f"Error notifying {callback['url']} of job {job['id']} (attempt {attempt + 1}/{self.callback_attempts_}): {str(e)}")
+                if attempt < self.callback_attempts_ - 1:
+                    time.sleep(min(2.0 ** attempt, 30.0))
+        else:
+            callback["status"] = "failed"
+        self.callback_outcomes_.inc(outcome=callback["status"])
+        job = {**job, "callback": callback}
+        if self.db_ is None:
+            with self.lock_:
+                if job["id"] in self.finished_:
+                    self.finished_[job["id"]]["callback"] = callback
+        else:
+            self._save(job)
+
+    def _save(self, job: dict) -> None:
+        if self.db_ is None:
+            return
+        try:
+            with self.db_lock_:
+                self.db_.execute(
+                    "INSERT OR REPLACE INTO jobs (id, status, created, finished, record) VALUES (?, ?, ?, ?, ?)",
+                    (job["id"], job["status"], job["created"], job["finished"], json.dumps(job)),
+                )
+                self.db_.commit()
+        except sqlite3.Error as e:
+            print(f"Error saving job {job['id']} to {self.path_}: {str(e)}")
+
+    def _evict(self) -> None:
+        now = time.time()
+        cutoff = now - self.ttl_seconds_
+        if self.db_ is None:
+            with self.lock_:
+                while self.finished_:
+                    job_id, job = next(iter(self.finished_.items()))
+                    if job["finished"] >= cutoff:
+                        break
+                    del self.finished_[job_id]
+            return
+        if now < self.next_evict_:
+            return
+        self.next_evict_ = now + _EVICT_INTERVAL
+        try:
+            with self.db_lock_:
+                # unfinished rows this old belong to a process that died with them
+                self.db_.execute("DELETE FROM jobs WHERE COALESCE(finished, created) < ?", (cutoff,))
+                self.db_.commit()
+        except sqlite3.Error as e:
+            print(f"Error evicting jobs from {self.path_}: {str(e)}")
+
+    def _live_counts(self) -> dict:
+        with self.lock_:
+            return self._live_counts_locked()
+
+    def _live_counts_locked(self) -> dict:
+        counts = {"queued": 0, "running": 0}
+        for job in self.live_.values():
+            counts[job["status"]] += 1
+        return counts
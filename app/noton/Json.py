@@ -0,0 +1,24 @@
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# "orjson" when the fast codec is installed; reported by GET /api/health
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def dumps(value: Any) -> bytes:
+    """Compact UTF-8 JSON; both codecs produce the same text for plain JSON values."""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: bytes) -> Any:
+    """Parse UTF-8 JSON; raises ``ValueError`` for invalid JSON or encoding."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data.decode("utf-8"))
@@ -1,13 +1,20 @@
 import time
-from openai import OpenAI
+from typing import AsyncIterator, Iterator
 from noton.Module import Module
+from noton.Client import default_pool
+from noton.Conversation import ConversationStore
+from noton.Balancer import BackendPool
+from noton.Cancel import RequestCancelled, check_cancelled, current_token
+from noton.Metrics import default_registry
+from noton.Retry import RetryPolicy
+from noton.Usage import record_usage
 
 class LLM(Module):
     def __init__(self) -> None:
         super().__init__()
 
 class Ollama(LLM):
-    def __init__(self, base_url=None, api_key = None, model=None, image_url=None, user_prompt=None, system_prompt=None, retry_attempts=10, retry_interval=15, enable_history=True) -> None:
+    def __init__(self, base_url=None, api_key = None, model=None, image_url=None, user_prompt=None, system_prompt=None, retry_attempts=4, retry_interval=0.5, enable_history=False, session_id=None, conversation_store=None, client_pool=None, deadline=None, retry_policy=None, failure_threshold=5, recovery_timeout=30.0, backend_weights=None, routing="least_outstanding", health_check_interval=0.0, metrics=None, max_tokens=None, temperature=None, stop=None, reasoning_effort=None) -> None:
         super().__init__()
         self.base_url_ = base_url
         self.api_key_ = api_key
@@ -15,62 +22,296 @@ class Ollama(LLM):
         self.image_url_ = image_url
         self.user_prompt_ = user_prompt
         self.system_prompt_ = system_prompt
-        self.retry_attempts_ = max( retry_attempts, 1 )
-        self.retry_interval_ = max( retry_interval, 1 )
+        # generation defaults; None leaves the backend's own default in place
+        self.max_tokens_ = max_tokens
+        self.temperature_ = temperature
+        self.stop_ = stop
+        # "none" switches thinking off on backends that support it, "low"/"medium"/"high" cap it
+        self.reasoning_effort_ = reasoning_effort
+        # exponential backoff starting at retry_interval seconds, bounded by deadline seconds per call
+        self.retry_policy_ = retry_policy if retry_policy is not None else RetryPolicy(max_attempts=retry_attempts, base_delay=retry_interval, deadline=deadline)
         self.enable_history_ = enable_history
+        self.session_id_ = session_id if session_id is not None else "default"
 
-        self.conversation_history_ = []  # to store the conversation history if needed
+        # per-session history, bounded by LRU/TTL eviction and a token budget
+        self.conversation_store_ = conversation_store if conversation_store is not None else ConversationStore()
 
-    def forward(self, user_prompt=None, system_prompt=None, base_url=None, api_key=None, model=None, image_url=None) -> str | None:
+        # shared keep-alive clients, reused across calls, retries and threads
+        self.client_pool_ = client_pool if client_pool is not None else default_pool()
+
+        # base_url may be one URL, a list of URLs or a BackendPool; every attempt is routed
+        # to the least loaded healthy backend, and a retry fails over to another one
+        if isinstance(base_url, BackendPool):
+            self.backends_ = base_url
+        else:
+            urls = [base_url] if isinstance(base_url, str) else list(base_url or [])
+            self.backends_ = BackendPool(urls, backend_weights, routing, failure_threshold, recovery_timeout)
+        self.backends_.start_health_checks(health_check_interval)
+
+        # retries, token usage, per-attempt latency and in-flight calls, exported by the API server's /api/metrics
+        self.metrics_ = metrics if metrics is not None else default_registry()
+        self.retry_counter_ = self.metrics_.counter("noton_llm_retries_total", "LLM attempts repeated after a transient error.", ["model"])
+        self.token_counter_ = self.metrics_.counter("noton_llm_tokens_total", "Tokens reported in the usage field of LLM responses.", ["model", "kind"])
+        self.latency_histogram_ = self.metrics_.histogram("noton_llm_request_seconds", "Duration of LLM attempts; streams are timed to their last chunk.", ["backend", "outcome"])
+        self.metrics_.gauge("noton_llm_in_flight", "LLM calls currently running per backend.", ["backend"]).set_function(
+            lambda: {(url,): stats["outstanding"] for url, stats in self.backends_.stats().items()}
+        )
+
+    def health(self) -> dict:
+        return self.backends_.stats()
+
+    def _route(self, call: dict, tried: set):
+        # an explicit per-call base_url pins the call to that endpoint
+        backend = self.backends_.pick(tried, call["base_url"])
+        if tried:
+            self.retry_counter_.inc(model=call["model"])
+        tried.add(backend.url_)
+        return backend
+
+    def _succeeded(self, backend, started: float) -> None:
+        backend.succeeded(started, self.backends_.latency_alpha_)
+        self.latency_histogram_.observe(time.monotonic() - started, backend=backend.url_, outcome="ok")
+
+    def _failed(self, backend, started: float, error: BaseException) -> None:
+        backend.failed(error)
+        self.latency_histogram_.observe(time.monotonic() - started, backend=backend.url_, outcome="error")
+
+    def _cancelled(self, backend, started: float) -> None:
+        # the caller went away; says nothing about the backend's health, so a probe is freed
+        backend.breaker_.release_probe()
+        self.latency_histogram_.observe(time.monotonic() - started, backend=backend.url_, outcome="cancelled")
+
+    def _count_usage(self, call: dict, usage, finish_reason=None) -> None:
+        # the caller's usage tracker sees every completed call, with or without a usage field
+        record_usage(usage, finish_reason)
+        # backends that do not report usage simply leave the counters alone
+        if usage is None:
+            return
+        self.token_counter_.inc(usage.prompt_tokens or 0, model=call["model"], kind="prompt")
+        self.token_counter_.inc(usage.completion_tokens or 0, model=call["model"], kind="completion")
+
+    def _prepare(self, user_prompt=None, system_prompt=None, base_url=None, api_key=None, model=None, image_url=None, session_id=None, max_tokens=None, temperature=None, stop=None, reasoning_effort=None) -> dict:
         # defaults to the instance variables if not provided
         user_prompt = user_prompt if user_prompt is not None else self.user_prompt_
         system_prompt = system_prompt if system_prompt is not None else self.system_prompt_
-        base_url = base_url if base_url is not None else self.base_url_
         api_key = api_key if api_key is not None else self.api_key_
         api_key = api_key if api_key is not None else 'ollama'
         model = model if model is not None else self.model_
         image_url = image_url if image_url is not None else self.image_url_
+        generation = {
+            "max_tokens": max_tokens if max_tokens is not None else self.max_tokens_,
+            "temperature": temperature if temperature is not None else self.temperature_,
+            "stop": stop if stop is not None else self.stop_,
+            "reasoning_effort": reasoning_effort if reasoning_effort is not None else self.reasoning_effort_,
+        }
 
         assert user_prompt is not None, "user_prompt must be provided"
-        assert base_url is not None, "base_url must be provided"
+        assert base_url is not None or self.backends_.urls, "base_url must be provided"
         assert model is not None, "model must be provided"
 
+        # calls are stateless unless a session is given explicitly or history is enabled
+        if session_id is None and self.enable_history_:
+            session_id = self.session_id_
+
         # Prepare messages
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ]
+        user_message = {"role": "user", "content": user_prompt}
         if image_url is not None and image_url.strip() != "":
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": [{"type":"text", "text":user_prompt}, {"type":"image_url", "image_url": {"url": image_url}}]},
-            ]
+            user_message = {"role": "user", "content": [{"type":"text", "text":user_prompt}, {"type":"image_url", "image_url": {"url": image_url}}]}
+
+        messages = [{"role": "system", "content": system_prompt}] if system_prompt is not None else []
+        if session_id is not None:
+            messages.extend(self.conversation_store_.history(session_id))
+        messages.append(user_message)
+
+        return {
+            "base_url": base_url,
+            "api_key": api_key,
+            "model": model,
+            "messages": messages,
+            "user_message": user_message,
+            "session_id": session_id,
+            # only the parameters that are set are sent, so backends keep their defaults
+            "generation": {name: value for name, value in generation.items() if value is not None},
+        }
+
+    def _remember(self, call: dict, ans: str) -> None:
+        if call["session_id"] is not None:
+            self.conversation_store_.append(call["session_id"], call["user_message"], {"role": "assistant", "content": ans})
+
+    def forward(self, user_prompt=None, system_prompt=None, base_url=None, api_key=None, model=None, image_url=None, session_id=None, deadline=None, max_tokens=None, temperature=None, stop=None, reasoning_effort=None) -> str:
+        """Return the completion text; ``deadline`` is an absolute ``time.monotonic()`` bound.
+
+        Raises ``CircuitOpenError`` while every backend is unhealthy, ``DeadlineExceededError``
+        when no time is left, or the last upstream error once retries are exhausted. Inside a
+        ``noton.Cancel.cancel_scope`` the completion is streamed, so that it can be abandoned
+        between chunks with ``RequestCancelled``.
+        """
+        if current_token() is not None:
+            return "".join(self.stream(user_prompt, system_prompt, base_url, api_key, model, image_url, session_id, deadline, max_tokens, temperature, stop, reasoning_effort))
+        call = self._prepare(user_prompt, system_prompt, base_url, api_key, model, image_url, session_id, max_tokens, temperature, stop, reasoning_effort)
+        tried = set()
+
+        def create(timeout):
+            backend = self._route(call, tried)
+            client = self.client_pool_.get(backend.url_, call["api_key"])
+            started = backend.begin()
+            try:
+                response = client.chat.completions.create( model=call["model"], messages=call["messages"], **call["generation"], **_timeout_option(timeout),)
+            except Exception as e:
+                self._failed(backend, started, e)
+                raise
+            finally:
+                backend.end()
+            self._succeeded(backend, started)
+            return response
+
+        response = self.retry_policy_.call(create, None, deadline)
+        self._count_usage(call, response.usage, response.choices[0].finish_reason)
+        ans = response.choices[0].message.content
+        self._remember(call, ans)
+        return ans
+
+    def stream(self, user_prompt=None, system_prompt=None, base_url=None, api_key=None, model=None, image_url=None, session_id=None, deadline=None, max_tokens=None, temperature=None, stop=None, reasoning_effort=None) -> Iterator[str]:
+        """Yield completion text deltas as the backend produces them.
+
+        Opening the stream is retried like ``forward``; errors after that are raised to the
+        consumer. Closing the generator closes the upstream response, which stops the
+        generation on the backend; so does a cancelled ``cancel_scope``, checked between chunks.
+        """
+        call = self._prepare(user_prompt, system_prompt, base_url, api_key, model, image_url, session_id, max_tokens, temperature, stop, reasoning_effort)
+        tried = set()
+
+        def create(timeout):
+            backend = self._route(call, tried)
+            client = self.client_pool_.get(backend.url_, call["api_key"])
+            started = backend.begin()
+            try:
+                response = client.chat.completions.create( model=call["model"], messages=call["messages"], stream=True, stream_options={"include_usage": True}, **call["generation"], **_timeout_option(timeout),)
+            except Exception as e:
+                self._failed(backend, started, e)
+                backend.end()
+                raise
+            return backend, started, response
 
-        self.conversation_history_.extend(messages)
+        check_cancelled()
+        backend, started, response = self.retry_policy_.call(create, None, deadline)
+        pieces = []
+        usage, finish_reason = None, None
+        try:
+            for chunk in response:
+                check_cancelled()
+                # with include_usage the last chunk carries the token counts and no choices
+                usage = getattr(chunk, "usage", None) or usage
+                if not chunk.choices:
+                    continue
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    pieces.append(delta)
+                    yield delta
+        except RequestCancelled:
+            self._cancelled(backend, started)
+            raise
+        except Exception as e:
+            self._failed(backend, started, e)
+            raise
+        else:
+            self._succeeded(backend, started)
+            self._count_usage(call, usage, finish_reason)
+        finally:
+            backend.end()
+            # a consumer that closed the generator early gave no verdict either
+            backend.breaker_.release_probe()
+            response.close()
+        self._remember(call, "".join(pieces))
 
+    async def aforward(self, user_prompt=None, system_prompt=None, base_url=None, api_key=None, model=None, image_url=None, session_id=None, deadline=None, max_tokens=None, temperature=None, stop=None, reasoning_effort=None) -> str:
+        """Asyncio counterpart of ``forward``; waits without holding a thread."""
+        if current_token() is not None:
+            return "".join([delta async for delta in self.astream(user_prompt, system_prompt, base_url, api_key, model, image_url, session_id, deadline, max_tokens, temperature, stop, reasoning_effort)])
+        call = self._prepare(user_prompt, system_prompt, base_url, api_key, model, image_url, session_id, max_tokens, temperature, stop, reasoning_effort)
+        tried = set()
 
-        for attempt in range(self.retry_attempts_):
+        async def create(timeout):
+            backend = self._route(call, tried)
+            client = self.client_pool_.get_async(backend.url_, call["api_key"])
+            started = backend.begin()
             try:
-                client = OpenAI(api_key=api_key, base_url=base_url)
-                response = client.chat.completions.create( model=model, messages=self.conversation_history_,)
-                ans = response.choices[0].message.content
-                if self.enable_history_:
-                    self.conversation_history_.append({"role": "assistant", "content": ans})
-                return ans
+                response = await client.chat.completions.create( model=call["model"], messages=call["messages"], **call["generation"], **_timeout_option(timeout),)
+            except Exception as e:
+                self._failed(backend, started, e)
+                raise
+            finally:
+                backend.end()
+            self._succeeded(backend, started)
+            return response
+
+        response = await self.retry_policy_.acall(create, None, deadline)
+        self._count_usage(call, response.usage, response.choices[0].finish_reason)
+        ans = response.choices[0].message.content
+        self._remember(call, ans)
+        return ans
 
+    async def astream(self, user_prompt=None, system_prompt=None, base_url=None, api_key=None, model=None, image_url=None, session_id=None, deadline=None, max_tokens=None, temperature=None, stop=None, reasoning_effort=None) -> AsyncIterator[str]:
+        """Asyncio counterpart of ``stream``."""
+        call = self._prepare(user_prompt, system_prompt, base_url, api_key, model, image_url, session_id, max_tokens, temperature, stop, reasoning_effort)
+        tried = set()
+
+        async def create(timeout):
+            backend = self._route(call, tried)
+            client = self.client_pool_.get_async(backend.url_, call["api_key"])
+            started = backend.begin()
+            try:
+                response = await client.chat.completions.create( model=call["model"], messages=call["messages"], stream=True, stream_options={"include_usage": True}, **call["generation"], **_timeout_option(timeout),)
             except Exception as e:
-                print(f"Error during LLM call: {str(e)}")
-                if self.retry_interval_ > 0 and attempt < self.retry_attempts_ - 1:
-                    time.sleep(self.retry_interval_)
-                else:
-                    return None
+                self._failed(backend, started, e)
+                backend.end()
+                raise
+            return backend, started, response
+
+        check_cancelled()
+        backend, started, response = await self.retry_policy_.acall(create, None, deadline)
+        pieces = []
+        usage, finish_reason = None, None
+        try:
+            async for chunk in response:
+                check_cancelled()
+                usage = getattr(chunk, "usage", None) or usage
+                if not chunk.choices:
+                    continue
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    pieces.append(delta)
+                    yield delta
+        except RequestCancelled:
+            self._cancelled(backend, started)
+            raise
+        except Exception as e:
+            self._failed(backend, started, e)
+            raise
+        else:
+            self._succeeded(backend, started)
+            self._count_usage(call, usage, finish_reason)
+        finally:
+            backend.end()
+            # a consumer that closed the generator early gave no verdict either
+            backend.breaker_.release_probe()
+            await response.close()
+        self._remember(call, "".join(pieces))
+
+
+def _timeout_option(timeout) -> dict:
+    # an explicit timeout=None would disable the client's default timeout
+    return {"timeout": timeout} if timeout is not None else {}
 
 
 if __name__ == '__main__':
     ollama = Ollama(
         base_url="http://10.147.19.168:10027/v1",
         model="gemma3:27b",
-        system_prompt="You are a helpful assistant."
+        system_prompt="You are a helpful assistant.",
+        enable_history=True,
     )
     response = ollama.forward(user_prompt="What is the capital of France?")
     print("Response:", response)
@@ -0,0 +1,203 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional, Sequence, Union
+
+# seconds; spans a cached answer (~ms) up to a long reasoning completion
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    """A named family of samples, one per combination of label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name_ = name
+        self.documentation_ = documentation
+        self.labelnames_ = tuple(labelnames)
+        self.lock_ = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames_)
+
+    def render(self) -> list[str]:
+        documentation = self.documentation_.replace("\\", "\\\\").replace("\n", "\\n")
+        return [f"# HELP {self.name_} {documentation}", f"# TYPE {self.name_} {self.kind}"] + self._samples()
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.values_: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self.lock_:
+            self.values_[key] = self.values_.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self.lock_:
+            return self.values_.get(self._key(labels), 0.0)
+
+    def _samples(self) -> list[str]:
+        with self.lock_:
+            values = sorted(self.values_.items())
+        return [f"{self.name_}{_format_labels(self.labelnames_, key)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge(Metric):
+    """A value that goes up and down; ``set_function`` computes it at scrape time instead."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.values_: dict[tuple, float] = {}
+        self.function_: Optional[Callable[[], Union[float, dict]]] = None
+
+    def set(self, value: float, **labels: str) -> None:
+        with self.lock_:
+            self.values_[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self.lock_:
+            self.values_[key] = self.values_.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: Callable[[], Union[float, dict]]) -> None:
+        """``fn()`` returns a number, or a dict mapping label-value tuples to numbers."""
+        self.function_ = fn
+
+    def _samples(self) -> list[str]:
+        if self.function_ is not None:
+            result = self.function_()
+            values = sorted(result.items()) if isinstance(result, dict) else [((), result)]
+        else:
+            with self.lock_:
+                values = sorted(self.values_.items())
+        return [f"{self.name_}{_format_labels(self.labelnames_, key)} {_format_value(value)}" for key, value in values]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets_ = tuple(sorted(buckets)) + (math.inf,)
+        # per label set: [count per bucket (non-cumulative)..., sum]
+        self.values_: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = next(i for i, bound in enumerate(self.buckets_) if value <= bound)
+        with self.lock_:
+            counts = self.values_.get(key)
+            if counts is None:
+                counts = [0.0] * (len(self.buckets_) + 1)
+                self.values_[key] = counts
+            counts[index] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self) -> list[str]:
+        with self.lock_:
+            values = sorted((key, list(counts)) for key, counts in self.values_.items())
+        lines = []
+        for key, counts in values:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets_, counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name_}_bucket{_format_labels(self.labelnames_, key, le)} {_format_value(cumulative)}")
+            labels = _format_labels(self.labelnames_, key)
+            lines.append(f"{self.name_}_sum{labels} {_format_value(counts[-1])}")
+            lines.append(f"{self.name_}_count{labels} {_format_value(cumulative)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Get-or-create store of metrics, rendered in the Prometheus text exposition format.
+
+    Asking twice for the same name returns the same metric, so independent modules can
+    record into one family without passing objects around.
+    """
+
+    def __init__(self) -> None:
+        self.metrics_: dict[str, Metric] = {}
+        self.lock_ = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        with self.lock_:
+            metrics = sorted(self.metrics_.values(), key=lambda metric: metric.name_)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _get(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs):
+        with self.lock_:
+            metric = self.metrics_.get(name)
+            if metric is None:
+                metric = cls(name, documentation, labelnames, **kwargs)
+                self.metrics_[name] = metric
+            assert type(metric) is cls and metric.labelnames_ == tuple(labelnames), f"metric {name} already registered differently"
+            return metric
+
+
+_default_registry: Optional[MetricsRegistry] = None
+_default_registry_lock = threading.Lock()
+
+
+def default_registry() -> MetricsRegistry:
+    """Process-wide registry shared by the LLM client and the API server."""
+    global _default_registry
+    if _default_registry is None:
+        with _default_registry_lock:
+            if _default_registry is None:
+                _default_registry = MetricsRegistry()
+    return _default_registry
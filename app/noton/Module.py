@@ -1,11 +1,155 @@
+import contextvars
+import itertools
+import time
 from abc import ABCMeta, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Iterator, Optional
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("noton_span", default=None)
+_span_ids = itertools.count(1)
+
+
+@dataclass
+class Span:
+    """One timed stage: a ``Module.__call__`` or an explicit ``Module.span``.
+
+    Spans opened while another one is running become its children; ``trace_id`` is the
+    ``span_id`` of the outermost span. Hooks may add entries to ``attributes``.
+    """
+
+    name: str
+    module: "Module"
+    args: tuple = ()
+    kwargs: dict = field(default_factory=dict)
+    parent: Optional["Span"] = None
+    span_id: int = field(default_factory=lambda: next(_span_ids))
+    trace_id: int = 0
+    started_at: float = field(default_factory=time.time)  # wall clock, for exporters
+    start: float = field(default_factory=time.perf_counter)
+    duration: Optional[float] = None  # seconds, set before the post hooks run
+    error: Optional[BaseException] = None
+    attributes: dict = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        self.trace_id = self.parent.trace_id if self.parent is not None else self.span_id
+
+
+def _run_hooks(hooks: list, span: Span) -> None:
+    for hook in hooks:
+        try:
+            hook(span)
+        except Exception as e:
+            # instrumentation must never break the call it observes
+            print(f"Error in noton hook {hook!r}: {str(e)}")
+
 
 class Module(metaclass=ABCMeta):
 
+    # process-wide pre/post hooks around every stage; while none is registered,
+    # __call__ is a plain forward and no span is created
+    pre_hooks_: list[Callable[[Span], None]] = []
+    post_hooks_: list[Callable[[Span], None]] = []
+    hooked_ = False
+
+    # hints for noton.Compile: a pure stage is cheap, deterministic and side-effect free
+    # (it may be fused with its neighbours); a memoized one gets a result cache
+    pure_ = False
+    memoize_ = False
+
     @abstractmethod
     def forward(self, *args, **kwargs):
         pass
 
     def __call__(self, *args, **kwargs):
-        return self.forward(*args, **kwargs)
+        if not Module.hooked_:
+            return self.forward(*args, **kwargs)
+        with self.span("forward", args, kwargs):
+            return self.forward(*args, **kwargs)
+
+    @staticmethod
+    def add_hook(pre: Optional[Callable[[Span], None]] = None, post: Optional[Callable[[Span], None]] = None) -> Callable[[], None]:
+        """Register hooks for every module; returns a function that removes them again."""
+        # lists are replaced, not mutated, so running calls keep iterating a stable copy
+        if pre is not None:
+            Module.pre_hooks_ = Module.pre_hooks_ + [pre]
+        if post is not None:
+            Module.post_hooks_ = Module.post_hooks_ + [post]
+        Module.hooked_ = bool(Module.pre_hooks_ or Module.post_hooks_)
+
+        def remove() -> None:
+            Module.pre_hooks_ = [hook for hook in Module.pre_hooks_ if hook is not pre]
+            Module.post_hooks_ = [hook for hook in Module.post_hooks_ if hook is not post]
+            Module.hooked_ = bool(Module.pre_hooks_ or Module.post_hooks_)
+
+        return remove
+
+    @contextmanager
+    def span(self, name: str, args: tuple = (), kwargs: Optional[dict] = None) -> Iterator[Optional[Span]]:
+        """Time a stage that does not go through ``__call__`` (async or streaming paths)."""
+        if not Module.hooked_:
+            yield None
+            return
+        span = Span(f"{type(self).__name__}.{name}", self, args, kwargs or {}, _current_span.get())
+        token = _current_span.set(span)
+        _run_hooks(Module.pre_hooks_, span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = e
+            raise
+        finally:
+            span.duration = time.perf_counter() - span.start
+            _current_span.reset(token)
+            _run_hooks(Module.post_hooks_, span)
+
+    def trace_iter(self, name: str, iterator: Iterator[Any]) -> Iterator[Any]:
+        """Record the whole life of ``iterator`` as one span.
+
+        The span is not made current, because a generator shares its consumer's context.
+        """
+        if not Module.hooked_:
+            return iterator
+        return self._traced_iter(Span(f"{type(self).__name__}.{name}", self, parent=_current_span.get()), iterator)
+
+    def atrace_iter(self, name: str, iterator: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        """Asyncio counterpart of ``trace_iter``."""
+        if not Module.hooked_:
+            return iterator
+        return self._atraced_iter(Span(f"{type(self).__name__}.{name}", self, parent=_current_span.get()), iterator)
+
+    @staticmethod
+    def _traced_iter(span: Span, iterator: Iterator[Any]) -> Iterator[Any]:
+        _run_hooks(Module.pre_hooks_, span)
+        try:
+            yield from iterator
+        except GeneratorExit:
+            # the consumer stopped early; yield from has already closed the inner iterator
+            span.attributes["closed"] = True
+            raise
+        except BaseException as e:
+            span.error = e
+            raise
+        finally:
+            span.duration = time.perf_counter() - span.start
+            _run_hooks(Module.post_hooks_, span)
 
+    @staticmethod
+    async def _atraced_iter(span: Span, iterator: AsyncIterator[Any]) -> AsyncIterator[Any]:
+        _run_hooks(Module.pre_hooks_, span)
+        try:
+            async for item in iterator:
+                yield item
+        except GeneratorExit:
+            span.attributes["closed"] = True
+            raise
+        except BaseException as e:
+            span.error = e
+            raise
+        finally:
+            span.duration = time.perf_counter() - span.start
+            # async for does not close the inner generator, and it owns the upstream response
+            aclose = getattr(iterator, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            _run_hooks(Module.post_hooks_, span)
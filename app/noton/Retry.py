@@ -0,0 +1,160 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+import httpx
+import openai
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without contacting the backend while its circuit breaker is open."""
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when the overall deadline leaves no room for another attempt."""
+
+
+# 408/409/429 and 5xx are transient; other 4xx mean the request itself is wrong
+_RETRYABLE_STATUS = {408, 409, 429}
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError, httpx.TransportError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in _RETRYABLE_STATUS or error.status_code >= 500
+    return False
+
+
+class CircuitBreaker:
+    """Closed -> open after ``failure_threshold`` consecutive failures; after
+    ``recovery_timeout`` seconds a single probe call is let through (half-open)."""
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0) -> None:
+        self.failure_threshold_ = max(failure_threshold, 1)
+        self.recovery_timeout_ = recovery_timeout
+        self.state_ = "closed"
+        self.failures_ = 0
+        self.opened_at_ = 0.0
+        self.probing_ = False
+        self.lock_ = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock_:
+            if self.state_ == "closed":
+                return True
+            if self.state_ == "open":
+                if time.monotonic() - self.opened_at_ < self.recovery_timeout_:
+                    return False
+                self.state_ = "half_open"
+                self.probing_ = False
+            if self.probing_:
+                return False
+            self.probing_ = True
+            return True
+
+    def record_success(self) -> None:
+        with self.lock_:
+            self.state_ = "closed"
+            self.failures_ = 0
+            self.probing_ = False
+
+    def record_failure(self) -> None:
+        with self.lock_:
+            self.failures_ += 1
+            if self.state_ == "half_open" or self.failures_ >= self.failure_threshold_:
+                self.state_ = "open"
+                self.opened_at_ = time.monotonic()
+            self.probing_ = False
+
+    def release_probe(self) -> None:
+        """Let the next call probe again after one ended with no verdict, e.g. its caller went away."""
+        with self.lock_:
+            self.probing_ = False
+
+    def snapshot(self) -> dict:
+        with self.lock_:
+            retry_in = 0.0
+            if self.state_ == "open":
+                retry_in = max(self.recovery_timeout_ - (time.monotonic() - self.opened_at_), 0.0)
+            return {"state": self.state_, "failures": self.failures_, "retry_in_s": round(retry_in, 2)}
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, bounded by attempts and an overall deadline.
+
+    ``fn`` receives the seconds left before the deadline (or ``None``) so each attempt
+    can use it as its own timeout. Only errors accepted by ``is_retryable`` are retried.
+    """
+
+    def __init__(self, max_attempts: int = 4, base_delay: float = 0.5, max_delay: float = 8.0, deadline: Optional[float] = None) -> None:
+        self.max_attempts_ = max(max_attempts, 1)
+        self.base_delay_ = max(base_delay, 0.0)
+        self.max_delay_ = max(max_delay, self.base_delay_)
+        self.deadline_ = deadline  # seconds per call, when the caller does not pass one
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0.0, min(self.max_delay_, self.base_delay_ * (2 ** attempt)))
+
+    def call(self, fn: Callable[[Optional[float]], Any], breaker: Optional[CircuitBreaker] = None, deadline: Optional[float] = None) -> Any:
+        deadline = self._absolute(deadline)
+        for attempt in range(self.max_attempts_):
+            remaining = self._before_attempt(breaker, deadline)
+            try:
+                result = fn(remaining)
+            except Exception as e:
+                delay = self._after_failure(e, attempt, breaker, deadline)
+                time.sleep(delay)
+            else:
+                if breaker is not None:
+                    breaker.record_success()
+                return result
+
+    async def acall(self, fn: Callable[[Optional[float]], Awaitable[Any]], breaker: Optional[CircuitBreaker] = None, deadline: Optional[float] = None) -> Any:
+        deadline = self._absolute(deadline)
+        for attempt in range(self.max_attempts_):
+            remaining = self._before_attempt(breaker, deadline)
+            try:
+                result = await fn(remaining)
+            except Exception as e:
+                delay = self._after_failure(e, attempt, breaker, deadline)
+                await asyncio.sleep(delay)
+            else:
+                if breaker is not None:
+                    breaker.record_success()
+                return result
+
+    def _absolute(self, deadline: Optional[float]) -> Optional[float]:
+        # deadlines are absolute time.monotonic() values
+        if deadline is None and self.deadline_:
+            deadline = time.monotonic() + self.deadline_
+        return deadline
+
+    def _before_attempt(self, breaker: Optional[CircuitBreaker], deadline: Optional[float]) -> Optional[float]:
+        if breaker is not None and not breaker.allow():
+            raise CircuitOpenError("LLM backend is unavailable (circuit open)")
+        if deadline is None:
+            return None
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceededError("LLM call deadline exceeded")
+        return remaining
+
+    def _after_failure(self, error: Exception, attempt: int, breaker: Optional[CircuitBreaker], deadline: Optional[float]) -> float:
+        retryable = is_retryable(error)
+        if breaker is not None:
+            # a rejected request still proves the backend is answering
+            if retryable:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+        print(f"Error during LLM call (attempt {attempt + 1}/{self.max_attempts_}): {str(error)}")
+
+        if not retryable or attempt >= self.max_attempts_ - 1:
+            raise error
+        delay = self.backoff(attempt)
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            raise DeadlineExceededError("LLM call deadline exceeded") from error
+        return delay
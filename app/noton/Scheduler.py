@@ -0,0 +1,229 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator, Optional, Sequence
+
+# highest priority first
+PRIORITY_CLASSES = ("interactive", "normal", "batch")
+
+
+class OverloadedError(RuntimeError):
+    """Raised instead of admitting a call; ``retry_after`` is a hint in seconds."""
+
+    def __init__(self, message: str, retry_after: float = 1.0) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueueFullError(OverloadedError):
+    """The admission queue has no room left."""
+
+
+class QueueTimeoutError(OverloadedError):
+    """The call waited (or would have to wait) longer than the queue timeout."""
+
+
+class _Ticket:
+    __slots__ = ("priority", "client", "granted", "event", "future", "loop")
+
+    def __init__(self, priority: str, client: str, future: Optional[asyncio.Future] = None) -> None:
+        self.priority = priority
+        self.client = client
+        self.granted = False
+        self.future = future
+        self.loop = future.get_loop() if future is not None else None
+        self.event = threading.Event() if future is None else None
+
+    def grant(self) -> None:
+        self.granted = True
+        if self.future is not None:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+        else:
+            self.event.set()
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class AdmissionScheduler:
+    """Bounded, prioritized admission in front of upstream model calls.
+
+    At most ``max_concurrency`` calls run at once. Waiting calls are served strictly by
+    priority class and round-robin across clients within a class, so one busy client
+    cannot starve the others. A call is rejected up front when the queue is full
+    (``QueueFullError``) or when the expected wait already exceeds its timeout
+    (``QueueTimeoutError``); the estimate uses an EWMA of recent service times.
+    Works from threads (``acquire``/``slot``) and from asyncio (``aacquire``/``aslot``).
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 32,
+        max_queue: int = 256,
+        queue_timeout: float = 30.0,
+        classes: Sequence[str] = PRIORITY_CLASSES,
+        service_alpha: float = 0.2,
+    ) -> None:
+        self.max_concurrency_ = max(max_concurrency, 1)
+        self.max_queue_ = max(max_queue, 0)
+        self.queue_timeout_ = queue_timeout
+        self.classes_ = tuple(classes)
+        self.service_alpha_ = service_alpha
+
+        self.queues_: dict[str, OrderedDict[str, deque[_Ticket]]] = {name: OrderedDict() for name in self.classes_}
+        self.queued_ = 0
+        self.in_flight_ = 0
+        self.service_time_ = 0.0  # EWMA seconds; 0 until the first call finishes
+        self.admitted_ = 0
+        self.rejected_ = {"queue_full": 0, "queue_timeout": 0}
+        self.lock_ = threading.Lock()
+
+    def acquire(self, priority: str = "normal", client: str = "", timeout: Optional[float] = None) -> float:
+        """Block until admitted; returns the seconds spent queued."""
+        timeout = self.queue_timeout_ if timeout is None else timeout
+        started = time.monotonic()
+        ticket = self._enqueue(priority, client, timeout)
+        if ticket is not None and not ticket.event.wait(timeout):
+            self._abandon(ticket)
+        return time.monotonic() - started
+
+    async def aacquire(self, priority: str = "normal", client: str = "", timeout: Optional[float] = None) -> float:
+        """Asyncio counterpart of ``acquire``."""
+        timeout = self.queue_timeout_ if timeout is None else timeout
+        started = time.monotonic()
+        ticket = self._enqueue(priority, client, timeout, asyncio.get_running_loop().create_future())
+        if ticket is None:
+            return 0.0
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.future), timeout)
+        except asyncio.TimeoutError:
+            self._abandon(ticket)
+        except asyncio.CancelledError:
+            with self.lock_:
+                granted = ticket.granted or not self._remove_locked(ticket)
+            if granted:
+                self.release()
+            raise
+        return time.monotonic() - started
+
+    def release(self, service_seconds: Optional[float] = None) -> None:
+        with self.lock_:
+            self.in_flight_ -= 1
+            if service_seconds is not None:
+                if self.service_time_ == 0.0:
+                    self.service_time_ = service_seconds
+                else:
+                    self.service_time_ += self.service_alpha_ * (service_seconds - self.service_time_)
+            self._dispatch_locked()
+
+    @contextmanager
+    def slot(self, priority: str = "normal", client: str = "", timeout: Optional[float] = None) -> Iterator[float]:
+        waited = self.acquire(priority, client, timeout)
+        started = time.monotonic()
+        try:
+            yield waited
+        finally:
+            self.release(time.monotonic() - started)
+
+    @asynccontextmanager
+    async def aslot(self, priority: str = "normal", client: str = "", timeout: Optional[float] = None) -> AsyncIterator[float]:
+        waited = await self.aacquire(priority, client, timeout)
+        started = time.monotonic()
+        try:
+            yield waited
+        finally:
+            self.release(time.monotonic() - started)
+
+    def stats(self) -> dict:
+        with self.lock_:
+            return {
+                "in_flight": self.in_flight_,
+                "max_concurrency": self.max_concurrency_,
+                "queued": {name: sum(len(tickets) for tickets in queue.values()) for name, queue in self.queues_.items()},
+                "admitted": self.admitted_,
+                "rejected": dict(self.rejected_),
+                "service_ms": round(self.service_time_ * 1000.0, 2),
+            }
+
+    def _enqueue(self, priority: str, client: str, timeout: float, future: Optional[asyncio.Future] = None) -> Optional[_Ticket]:
+        """Admit immediately (returns None) or queue a ticket; raises when the call cannot make it."""
+        if priority not in self.queues_:
+            priority = self.classes_[len(self.classes_) // 2]
+        with self.lock_:
+            if self.in_flight_ < self.max_concurrency_ and self.queued_ == 0:
+                self.in_flight_ += 1
+                self.admitted_ += 1
+                return None
+            if self.queued_ >= self.max_queue_:
+                self.rejected_["queue_full"] += 1
+                raise QueueFullError("Too many requests are queued; retry later.", self._retry_after_locked(self.queued_))
+
+            ahead = self._ahead_locked(priority)
+            expected = (ahead + 1) / self.max_concurrency_ * self.service_time_
+            if expected > timeout:
+                self.rejected_["queue_timeout"] += 1
+                raise QueueTimeoutError("The queue is too long to start in time; retry later.", self._retry_after_locked(ahead))
+
+            ticket = _Ticket(priority, client, future)
+            self.queues_[priority].setdefault(client, deque()).append(ticket)
+            self.queued_ += 1
+            return ticket
+
+    def _abandon(self, ticket: _Ticket) -> None:
+        # a grant may race with the timeout; a granted ticket is simply admitted late
+        with self.lock_:
+            if ticket.granted:
+                return
+            self._remove_locked(ticket)
+            self.rejected_["queue_timeout"] += 1
+            retry_after = self._retry_after_locked(self.queued_)
+        raise QueueTimeoutError("Timed out waiting for an upstream slot.", retry_after)
+
+    def _remove_locked(self, ticket: _Ticket) -> bool:
+        queue = self.queues_[ticket.priority]
+        tickets = queue.get(ticket.client)
+        if tickets is None or ticket not in tickets:
+            return False
+        tickets.remove(ticket)
+        if not tickets:
+            del queue[ticket.client]
+        self.queued_ -= 1
+        return True
+
+    def _dispatch_locked(self) -> None:
+        while self.in_flight_ < self.max_concurrency_ and self.queued_ > 0:
+            ticket = self._next_locked()
+            self.in_flight_ += 1
+            self.admitted_ += 1
+            ticket.grant()
+
+    def _next_locked(self) -> _Ticket:
+        for name in self.classes_:
+            queue = self.queues_[name]
+            if not queue:
+                continue
+            # take the head client's oldest ticket, then rotate that client to the back
+            client, tickets = next(iter(queue.items()))
+            ticket = tickets.popleft()
+            if tickets:
+                queue.move_to_end(client)
+            else:
+                del queue[client]
+            self.queued_ -= 1
+            return ticket
+        raise RuntimeError("no queued ticket to dispatch")
+
+    def _ahead_locked(self, priority: str) -> int:
+        ahead = 0
+        for name in self.classes_:
+            ahead += sum(len(tickets) for tickets in self.queues_[name].values())
+            if name == priority:
+                break
+        return ahead
+
+    def _retry_after_locked(self, ahead: int) -> float:
+        return max(1.0, round((ahead + 1) / self.max_concurrency_ * self.service_time_, 1))
@@ -0,0 +1,118 @@
+import hashlib
+import re
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+from noton.Metrics import MetricsRegistry, default_registry
+
+_WORDS = re.compile(r"\w+")
+
+# Fibonacci hashing constant; multiplication wraps modulo 2**64 in uint64
+_HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+# a lookup is a hash pass plus one matrix-vector product, so it lives well below the default buckets
+_LOOKUP_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+
+def embed(text: str, dim: int = 1024, ngram: int = 3) -> np.ndarray:
+    """Unit-length hashed character n-gram vector of ``text``.
+
+    Case, punctuation and whitespace are dropped first, so drafts that differ only in
+    those map to the same vector; a changed name moves only the few n-grams it touches.
+    """
+    assert 1 <= ngram <= 8, "n-grams are packed into one uint64"
+    normalized = " ".join(_WORDS.findall(text.lower())).encode("utf-8")
+    data = np.frombuffer(normalized.ljust(ngram), dtype=np.uint8).astype(np.uint64)
+    count = len(data) - ngram + 1
+    grams = np.zeros(count, dtype=np.uint64)
+    for offset in range(ngram):
+        grams = (grams << np.uint64(8)) | data[offset : offset + count]
+
+    hashed = grams * _HASH_MULTIPLIER
+    buckets = (hashed >> np.uint64(32)) % np.uint64(dim)
+    # a sign bit per n-gram keeps colliding n-grams from only ever adding up
+    signs = ((hashed >> np.uint64(31)) & np.uint64(1)).astype(np.float32) * 2.0 - 1.0
+    vector = np.bincount(buckets.astype(np.int64), weights=signs, minlength=dim).astype(np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def _group_id(group: str) -> np.int64:
+    return np.int64(int.from_bytes(hashlib.sha256(group.encode("utf-8")).digest()[:8], "little", signed=True))
+
+
+class SimilarityCache:
+    """Near-duplicate cache: answers stored for texts whose embeddings are close enough.
+
+    Entries live in a fixed ring of ``max_entries`` rows (the oldest is overwritten first).
+    A lookup scores every row with one matrix-vector product and only considers rows of
+    the same ``group``, e.g. the controls, model and system prompt. It hits when the
+    best cosine similarity reaches ``threshold``.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 4096,
+        threshold: float = 0.92,
+        ttl_seconds: float = 3600.0,
+        dim: int = 1024,
+        metrics: Optional[MetricsRegistry] = None,
+    ) -> None:
+        self.max_entries_ = max(max_entries, 1)
+        self.threshold_ = threshold
+        self.ttl_seconds_ = ttl_seconds
+        self.dim_ = dim
+
+        self.vectors_ = np.zeros((self.max_entries_, dim), dtype=np.float32)
+        self.groups_ = np.zeros(self.max_entries_, dtype=np.int64)
+        # empty rows carry -inf and are never live
+        self.created_ = np.full(self.max_entries_, -np.inf)
+        self.values_: list[Optional[str]] = [None] * self.max_entries_
+        self.next_ = 0
+        self.lock_ = threading.Lock()
+
+        self.metrics_ = metrics if metrics is not None else default_registry()
+        self.lookups_ = self.metrics_.counter("noton_similarity_cache_lookups_total", "Similarity cache lookups by result.", ["result"])
+        self.lookup_seconds_ = self.metrics_.histogram("noton_similarity_cache_lookup_seconds", "Time to embed a text and search the similarity cache.", buckets=_LOOKUP_BUCKETS)
+
+    def get(self, text: str, group: str) -> Optional[str]:
+        started = time.perf_counter()
+        query = embed(text, self.dim_)
+        group_id = _group_id(group)
+        with self.lock_:
+            live = (self.groups_ == group_id) & (self.created_ > self._oldest_valid())
+            scores = np.where(live, self.vectors_ @ query, -1.0)
+            best = int(np.argmax(scores))
+            value = self.values_[best] if scores[best] >= self.threshold_ else None
+        self.lookup_seconds_.observe(time.perf_counter() - started)
+        self.lookups_.inc(result="hit" if value is not None else "miss")
+        return value
+
+    def set(self, text: str, group: str, value: str) -> None:
+        vector = embed(text, self.dim_)
+        group_id = _group_id(group)
+        with self.lock_:
+            row = self.next_
+            self.vectors_[row] = vector
+            self.groups_[row] = group_id
+            self.created_[row] = time.time()
+            self.values_[row] = value
+            self.next_ = (row + 1) % self.max_entries_
+
+    def clear(self) -> None:
+        with self.lock_:
+            self.created_[:] = -np.inf
+            self.values_ = [None] * self.max_entries_
+
+    def stats(self) -> dict:
+        with self.lock_:
+            entries = int(np.count_nonzero(self.created_ > self._oldest_valid()))
+        return {"entries": entries, "hits": int(self.lookups_.value(result="hit")), "misses": int(self.lookups_.value(result="miss"))}
+
+    def _oldest_valid(self) -> float:
+        if self.ttl_seconds_ is None or self.ttl_seconds_ <= 0:
+            return -np.inf
+        return time.time() - self.ttl_seconds_
@@ -1,3 +1,5 @@
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator
+
 from noton.Module import Module
 
 class Text(Module):
@@ -6,9 +8,15 @@ class Text(Module):
 
 
 class TextFilter(Text):
-    def __init__(self, tag:str = "</think>"):
+    pure_ = True
+
+    def __init__(self, tag:str = "</think>", open_tag:str | None = None, max_hold:int = 4096):
         super().__init__()
         self.tag_ = tag
+        # "</think>" closes a block opened by "<think>"
+        self.open_tag_ = open_tag if open_tag is not None else tag.replace("</", "<", 1)
+        # characters of untagged text a stream holds back in case the tag still follows
+        self.max_hold_ = max_hold
 
     def forward(self, txt:str, tag=None) -> str:
 
@@ -27,6 +35,70 @@ class TextFilter(Text):
             # Fallback to returning original text in case of any error
             return txt
 
+    def settled(self, txt:str, tag=None) -> bool:
+        """Whether ``forward`` would return ``txt`` unchanged, i.e. no reasoning is left in it."""
+        return (tag if tag is not None else self.tag_) not in txt
+
+    def stream(self, chunks:Iterable[str], tag=None, open_tag=None) -> Iterator[str]:
+        """Incremental ``forward``: drop everything up to ``tag`` while text is still arriving.
+
+        Text is held back until ``tag`` arrives. A block that starts with ``open_tag`` is held
+        whatever its length; text without it (a template may prefill ``open_tag``) is held
+        for at most ``max_hold`` characters, then passed through. Only in that last case can
+        the result differ from ``forward``, and then it fails ``settled``. If the stream ends
+        without the tag, the held text is emitted unchanged.
+        """
+        state = _TagStripper(tag if tag is not None else self.tag_, open_tag if open_tag is not None else self.open_tag_, self.max_hold_)
+        for chunk in chunks:
+            text = state.feed(chunk)
+            if text:
+                yield text
+        text = state.flush()
+        if text:
+            yield text
+
+    async def astream(self, chunks:AsyncIterable[str], tag=None, open_tag=None) -> AsyncIterator[str]:
+        """Asyncio counterpart of ``stream``."""
+        state = _TagStripper(tag if tag is not None else self.tag_, open_tag if open_tag is not None else self.open_tag_, self.max_hold_)
+        async for chunk in chunks:
+            text = state.feed(chunk)
+            if text:
+                yield text
+        text = state.flush()
+        if text:
+            yield text
+
+
+class _TagStripper:
+    def __init__(self, tag:str, open_tag:str, max_hold:int):
+        self.tag_ = tag
+        self.open_tag_ = open_tag
+        self.max_hold_ = max_hold
+        self.buffer_ = ""
+        self.passthrough_ = False
+
+    def feed(self, chunk:str) -> str:
+        if self.passthrough_:
+            return chunk
+
+        self.buffer_ += chunk
+        pos = self.buffer_.find(self.tag_)
+        if pos != -1:
+            self.passthrough_ = True
+            remainder = self.buffer_[pos + len(self.tag_):]
+            self.buffer_ = ""
+            return remainder
+
+        head = self.buffer_.lstrip()
+        opened = head.startswith(self.open_tag_) or self.open_tag_.startswith(head)
+        if not opened and len(self.buffer_) > self.max_hold_:
+            return self.flush()
+        return ""
+
+    def flush(self) -> str:
+        self.passthrough_ = True
+        text, self.buffer_ = self.buffer_, ""
+        return text
 
 if __name__ == "__main__":
     text = "Hello, this is a sample text.</think> This part should be returned."
@@ -38,3 +110,11 @@ if __name__ == "__main__":
     filter = TextFilter()
     result = filter.forward(text)
     print(result)  # Output "Hello, this is a sample text. The entire string should be returned."
+
+    chunks = ["<thi", "nk>reasoning</th", "ink> Streamed ", "answer."]
+    result = "".join(filter.stream(chunks))
+    print(result)  # Output: " Streamed answer."
+
+    chunks = ["plan", "</think>", "Answer"]
+    result = "".join(filter.stream(chunks))
+    print(result)  # Output: "Answer", as forward gives for a prefilled "<think>"
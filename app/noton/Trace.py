@@ -0,0 +1,144 @@
+import cProfile
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from noton.Module import Module, Span
+
+
+class JsonlTraceExporter:
+    """Post hook appending one JSON line per finished span to ``path``.
+
+    Lines are buffered and flushed whenever an outermost span ends (so a trace is
+    written as a whole) or ``flush_every`` lines are pending.
+    """
+
+    def __init__(self, path: str, flush_every: int = 256) -> None:
+        self.path_ = path
+        self.flush_every_ = flush_every
+        self.pending_: list[str] = []
+        self.lock_ = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.file_ = open(path, "a", encoding="utf-8")
+
+    def __call__(self, span: Span) -> None:
+        record = {
+            "trace_id": span.trace_id,
+            "span_id": span.span_id,
+            "parent_id": span.parent.span_id if span.parent is not None else None,
+            "name": span.name,
+            "start": round(span.started_at, 6),
+            "duration_ms": round((span.duration or 0.0) * 1000.0, 3),
+            "thread": threading.current_thread().name,
+        }
+        if span.error is not None:
+            record["error"] = f"{type(span.error).__name__}: {span.error}"
+        if span.attributes:
+            record["attributes"] = span.attributes
+        line = json.dumps(record, default=str)
+        with self.lock_:
+            self.pending_.append(line)
+            if span.parent is None or len(self.pending_) >= self.flush_every_:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self.lock_:
+            self._flush_locked()
+
+    def close(self) -> None:
+        with self.lock_:
+            self._flush_locked()
+            self.file_.close()
+
+    def _flush_locked(self) -> None:
+        if self.pending_:
+            self.file_.write("\n".join(self.pending_) + "\n")
+            self.file_.flush()
+            self.pending_.clear()
+
+
+class ProfileCapture:
+    """Pre/post hook pair that profiles every ``every``-th outermost synchronous span.
+
+    ``profiler`` is ``cprofile`` (a ``.prof`` file for ``pstats``/snakeviz) or
+    ``pyinstrument`` (an ``.html`` report; falls back to cProfile when it is not
+    installed). Only one capture runs at a time; requests overlapping it are not
+    profiled. Async and streaming spans are skipped because they hop threads.
+    """
+
+    def __init__(self, every: int = 100, directory: str = "profiles", profiler: str = "cprofile") -> None:
+        assert every > 0, "every must be positive"
+        self.every_ = every
+        self.directory_ = directory
+        self.profiler_ = profiler
+        if profiler == "pyinstrument":
+            try:
+                import pyinstrument  # noqa: F401
+            except ImportError:
+                print("pyinstrument is not installed, falling back to cProfile")
+                self.profiler_ = "cprofile"
+        self.counter_ = itertools.count(1)
+        self.active_: Optional[tuple[Span, object]] = None
+        self.lock_ = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def pre(self, span: Span) -> None:
+        if span.parent is not None or not span.name.endswith(".forward"):
+            return
+        if next(self.counter_) % self.every_ != 0:
+            return
+        with self.lock_:
+            if self.active_ is not None:
+                return
+            profiler = self._start()
+            self.active_ = (span, profiler)
+
+    def post(self, span: Span) -> None:
+        with self.lock_:
+            if self.active_ is None or self.active_[0] is not span:
+                return
+            _, profiler = self.active_
+            self.active_ = None
+        path = os.path.join(self.directory_, f"{time.strftime('%Y%m%d-%H%M%S')}-{span.name}-{span.trace_id}")
+        if self.profiler_ == "pyinstrument":
+            profiler.stop()
+            with open(path + ".html", "w", encoding="utf-8") as handle:
+                handle.write(profiler.output_html())
+        else:
+            profiler.disable()
+            profiler.dump_stats(path + ".prof")
+        span.attributes["profile"] = path
+
+    def _start(self):
+        if self.profiler_ == "pyinstrument":
+            from pyinstrument import Profiler
+
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+
+def install_exporters(trace_path: Optional[str] = None, profile_every: int = 0, profile_dir: str = "profiles", profiler: str = "cprofile") -> Callable[[], None]:
+    """Register the built-in exporters that are configured; returns a function removing them."""
+    removers = []
+    if profile_every > 0:
+        capture = ProfileCapture(profile_every, profile_dir, profiler)
+        # registered first, so the trace line of a profiled span names its profile file
+        removers.append(Module.add_hook(pre=capture.pre, post=capture.post))
+    if trace_path:
+        exporter = JsonlTraceExporter(trace_path)
+        removers.append(Module.add_hook(post=exporter))
+        removers.append(exporter.close)
+
+    def remove() -> None:
+        for remover in removers:
+            remover()
+
+    return remove
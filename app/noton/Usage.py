@@ -0,0 +1,62 @@
+import contextvars
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+_current_usage: contextvars.ContextVar[Optional["Usage"]] = contextvars.ContextVar("noton_usage", default=None)
+
+
+class Usage:
+    """Token counts of the LLM calls made while a ``track_usage`` block is active.
+
+    The tracker is shared by reference, so calls made from graph worker threads or
+    asyncio tasks started inside the block are counted too.
+    """
+
+    def __init__(self) -> None:
+        self.prompt_tokens_ = 0
+        self.completion_tokens_ = 0
+        self.reasoning_tokens_ = 0
+        self.calls_ = 0
+        self.truncated_ = False
+        self.lock_ = threading.Lock()
+
+    def add(self, usage=None, finish_reason: Optional[str] = None) -> None:
+        with self.lock_:
+            self.calls_ += 1
+            # a completion cut off by max_tokens; the answer may be incomplete or empty
+            self.truncated_ = self.truncated_ or finish_reason == "length"
+            if usage is None:
+                return
+            self.prompt_tokens_ += usage.prompt_tokens or 0
+            self.completion_tokens_ += usage.completion_tokens or 0
+            details = getattr(usage, "completion_tokens_details", None)
+            self.reasoning_tokens_ += getattr(details, "reasoning_tokens", None) or 0
+
+    def as_dict(self) -> dict:
+        with self.lock_:
+            return {
+                "prompt_tokens": self.prompt_tokens_,
+                "completion_tokens": self.completion_tokens_,
+                "reasoning_tokens": self.reasoning_tokens_,
+                "calls": self.calls_,
+                "truncated": self.truncated_,
+            }
+
+
+@contextmanager
+def track_usage() -> Iterator[Usage]:
+    """Collect the token usage of every LLM call made inside the block."""
+    usage = Usage()
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+
+
+def record_usage(usage=None, finish_reason: Optional[str] = None) -> None:
+    """Called by LLM modules once per completed call; a no-op outside ``track_usage``."""
+    current = _current_usage.get()
+    if current is not None:
+        current.add(usage, finish_reason)
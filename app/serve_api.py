@@ -0,0 +1,262 @@
+"""Standalone REST API: a pre-fork pool of worker processes sharing one listening socket.
+
+    python -m serve_api --workers 4           # from the app directory
+    kill -HUP <supervisor pid>                # rolling restart, one worker at a time
+    kill -TERM <supervisor pid>               # drain in-flight requests and exit
+
+The supervisor binds the socket and forks the workers. Each worker imports the analyst and
+builds its own model and ``MessageAnalystAPIServer``, so a restart picks up new code. The
+supervisor never handles requests. It replaces workers that exit, and workers whose heartbeat
+stops for ``--heartbeat-timeout`` seconds. ``GET /api/health`` names the worker that answered
+under ``worker``. With more than one worker, jobs are kept in ``jobs.db`` unless
+MESSAGE_ANALYST_JOB_STORE_PATH names another file, so any worker can report on any job.
+"""
+
+import argparse
+import logging
+import math
+import os
+import select
+import signal
+import socket
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional
+
+LOGGER = logging.getLogger("serve_api")
+
+_HEARTBEAT_INTERVAL = 1.0
+# a worker that dies this soon after starting is respawned only after a pause, so a broken build cannot spin
+_CRASH_WINDOW = 5.0
+
+
+@dataclass
+class _Worker:
+    slot: int
+    generation: int
+    pid: int
+    heartbeat_fd: int
+    started: float = field(default_factory=time.monotonic)
+    last_seen: Optional[float] = None  # set by the first heartbeat, once the worker is listening
+    retiring: bool = False
+
+    @property
+    def ready(self) -> bool:
+        return self.last_seen is not None
+
+
+def _run_worker(sock: socket.socket, slot: int, generation: int, heartbeat_fd: int, args) -> None:
+    """Body of a forked worker; never returns."""
+    status = 1
+    try:
+        stopping = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+        # Ctrl-C reaches the whole process group; the supervisor turns it into an orderly SIGTERM
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+
+        from Message_Direction_Analyst import MessageDirectionAnalyst, create_api_server
+
+        model = MessageDirectionAnalyst()
+        started = time.time()
+        worker = {"slot": slot, "generation": generation, "pid": os.getpid(), "workers": args.workers}
+
+        def health() -> dict:
+            return {**model.health(), "worker": {**worker, "uptime_s": round(time.time() - started, 1)}}
+
+        # the upstream limits are for the whole service, so each worker takes its share
+        max_inflight = int(os.getenv("MESSAGE_ANALYST_API_MAX_INFLIGHT", "32"))
+        max_queue = int(os.getenv("MESSAGE_ANALYST_API_MAX_QUEUE", "256"))
+        server = create_api_server(
+            model,
+            sock=sock,
+            mode=args.mode,
+            max_inflight=max(math.ceil(max_inflight / args.workers), 1),
+            max_queue=math.ceil(max_queue / args.workers),
+            health_fn=health,
+            drain_timeout=args.drain_timeout,
+        )
+        server.start()
+        while not stopping.is_set():
+            os.write(heartbeat_fd, b".")
+            stopping.wait(_HEARTBEAT_INTERVAL)
+        server.stop()
+        status = 0
+    except Exception:  # pylint: disable=broad-except
+        LOGGER.exception("API worker %s failed", slot)
+    finally:
+        os._exit(status)
+
+
+class Supervisor:
+    """Keeps ``workers`` processes serving ``sock`` and restarts them on request or failure."""
+
+    def __init__(self, sock: socket.socket, args) -> None:
+        self.sock_ = sock
+        self.args_ = args
+        self.workers_: dict[int, _Worker] = {}
+        self.generation_ = 0
+        self.respawn_at_: dict[int, float] = {}
+        self.restart_queue_: deque[int] = deque()
+        self.replacing_: Optional[_Worker] = None
+        self.stopping_ = False
+        self.restart_requested_ = False
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, lambda signum, frame: self._request_stop())
+        signal.signal(signal.SIGINT, lambda signum, frame: self._request_stop())
+        signal.signal(signal.SIGHUP, lambda signum, frame: self._request_restart())
+
+        for slot in range(self.args_.workers):
+            self._spawn(slot)
+        while not self.stopping_:
+            self._read_heartbeats(timeout=0.5)
+            self._reap()
+            self._check_liveness()
+            self._advance_restart()
+            for slot, when in list(self.respawn_at_.items()):
+                if time.monotonic() >= when and not self.stopping_:
+                    del self.respawn_at_[slot]
+                    self._spawn(slot)
+        self._shutdown()
+
+    def _request_stop(self) -> None:
+        self.stopping_ = True
+
+    def _request_restart(self) -> None:
+        self.restart_requested_ = True
+
+    def _spawn(self, slot: int) -> _Worker:
+        self.generation_ += 1
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            for worker in self.workers_.values():
+                os.close(worker.heartbeat_fd)
+            _run_worker(self.sock_, slot, self.generation_, write_fd, self.args_)
+        os.close(write_fd)
+        os.set_blocking(read_fd, False)
+        worker = _Worker(slot, self.generation_, pid, read_fd)
+        self.workers_[pid] = worker
+        LOGGER.info("Started API worker %s (pid %s, generation %s)", slot, pid, worker.generation)
+        return worker
+
+    def _read_heartbeats(self, timeout: float) -> None:
+        fds = {worker.heartbeat_fd: worker for worker in self.workers_.values()}
+        if not fds:
+            time.sleep(timeout)
+            return
+        readable, _, _ = select.select(list(fds), [], [], timeout)
+        now = time.monotonic()
+        for fd in readable:
+            try:
+                if os.read(fd, 4096):
+                    fds[fd].last_seen = now
+            except BlockingIOError:
+                pass
+
+    def _reap(self) -> None:
+        while self.workers_:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self.workers_.pop(pid, None)
+            if worker is None:
+                continue
+            os.close(worker.heartbeat_fd)
+            if worker.retiring or self.stopping_:
+                LOGGER.info("API worker %s (pid %s) stopped", worker.slot, pid)
+                continue
+            LOGGER.warning("API worker %s (pid %s) exited with status %s", worker.slot, pid, os.waitstatus_to_exitcode(status))
+            if worker is self.replacing_:
+                # the replacement never came up: keep the old worker and give up on this restart
+                LOGGER.error("Rolling restart aborted; worker %s keeps its previous process", worker.slot)
+                self.replacing_ = None
+                self.restart_queue_.clear()
+                continue
+            pause = _CRASH_WINDOW if time.monotonic() - worker.started < _CRASH_WINDOW else 0.0
+            self.respawn_at_[worker.slot] = time.monotonic() + pause
+
+    def _check_liveness(self) -> None:
+        now = time.monotonic()
+        for worker in list(self.workers_.values()):
+            if worker.retiring:
+                continue
+            if worker.ready and now - worker.last_seen > self.args_.heartbeat_timeout:
+                LOGGER.error("API worker %s (pid %s) missed its heartbeat; killing it", worker.slot, worker.pid)
+            elif not worker.ready and now - worker.started > self.args_.startup_timeout:
+                LOGGER.error("API worker %s (pid %s) did not start within %ss; killing it", worker.slot, worker.pid, self.args_.startup_timeout)
+            else:
+                continue
+            self._signal(worker, signal.SIGKILL)
+
+    def _advance_restart(self) -> None:
+        if self.restart_requested_:
+            self.restart_requested_ = False
+            if not self.restart_queue_ and self.replacing_ is None:
+                LOGGER.info("Rolling restart of %s API workers", len(self.workers_))
+                self.restart_queue_.extend(sorted({worker.slot for worker in self.workers_.values() if not worker.retiring}))
+
+        if self.replacing_ is not None:
+            if not self.replacing_.ready:
+                return
+            # the replacement is listening: the old process of that slot stops accepting and drains
+            for worker in self.workers_.values():
+                if worker.slot == self.replacing_.slot and worker is not self.replacing_ and not worker.retiring:
+                    worker.retiring = True
+                    self._signal(worker, signal.SIGTERM)
+            self.replacing_ = None
+
+        if self.restart_queue_:
+            self.replacing_ = self._spawn(self.restart_queue_.popleft())
+
+    def _shutdown(self) -> None:
+        LOGGER.info("Stopping %s API workers", len(self.workers_))
+        for worker in self.workers_.values():
+            worker.retiring = True
+            self._signal(worker, signal.SIGTERM)
+        deadline = time.monotonic() + self.args_.drain_timeout + 5.0
+        while self.workers_ and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for worker in self.workers_.values():
+            self._signal(worker, signal.SIGKILL)
+        self.sock_.close()
+
+    def _signal(self, worker: _Worker, signum: int) -> None:
+        try:
+            os.kill(worker.pid, signum)
+        except ProcessLookupError:
+            pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("MESSAGE_ANALYST_API_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("MESSAGE_ANALYST_API_PORT", "8601")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("MESSAGE_ANALYST_API_WORKERS", str(os.cpu_count() or 1))))
+    parser.add_argument("--mode", choices=["threaded", "asyncio"], default=os.getenv("MESSAGE_ANALYST_API_MODE", "threaded"))
+    parser.add_argument("--drain-timeout", type=float, default=float(os.getenv("MESSAGE_ANALYST_API_DRAIN_TIMEOUT", "10")))
+    parser.add_argument("--heartbeat-timeout", type=float, default=float(os.getenv("MESSAGE_ANALYST_API_HEARTBEAT_TIMEOUT", "30")))
+    parser.add_argument("--startup-timeout", type=float, default=60.0, help="seconds a new worker may take to start listening")
+    args = parser.parse_args()
+    args.workers = max(args.workers, 1)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s[%(process)d] %(levelname)s %(message)s")
+    if args.workers > 1 and not os.getenv("MESSAGE_ANALYST_JOB_STORE_PATH"):
+        # a job is polled through whichever worker accepts the connection, so they share one store
+        os.environ["MESSAGE_ANALYST_JOB_STORE_PATH"] = "jobs.db"
+    family = socket.AF_INET6 if ":" in args.host else socket.AF_INET
+    sock = socket.create_server((args.host, args.port), family=family, backlog=1024)
+    LOGGER.info("API supervisor (pid %s) listening on %s:%s with %s %s workers", os.getpid(), args.host, args.port, args.workers, args.mode)
+    Supervisor(sock, args).run()
+
+
+if __name__ == "__main__":
+    main()
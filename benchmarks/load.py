@@ -0,0 +1,251 @@
+"""Load generator for the REST API, closed or open loop.
+
+By default it starts an in-process ``MessageAnalystAPIServer`` with the real analyst pipeline
+in front of the mock backend (``benchmarks/mock_backend.py``). The response cache and run
+history are disabled, and every request carries a distinct draft, so each one reaches the
+backend. ``--url`` targets a server that is already running instead.
+
+- closed loop: ``--concurrency`` clients each send their next request as soon as the last
+  one is answered, for ``--duration`` seconds.
+- open loop: requests arrive as a Poisson process at ``--rate`` per second whether or not
+  earlier ones have finished. Latency is measured from the scheduled arrival, so time spent
+  waiting for a free client counts too.
+
+Reports p50/p95/p99 latency (time to first token for ``--route stream``), throughput and
+errors per scenario.
+
+    python benchmarks/load.py --mode asyncio --closed 1,8,32 --open 20,50 --output load.json
+    python benchmarks/results.py load-baseline.json load.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from mock_backend import MockSettings, start_mock_backend  # noqa: E402
+from results import save_results, summarize  # noqa: E402
+
+DRAFTS = [
+    "We need to move the launch by one week because QA found a data-loss bug.",
+    "Thanks for covering the on-call shift last weekend, it made a real difference.",
+    "Can we meet on Thursday to agree on the budget for the next quarter?",
+    "The new onboarding flow cut support tickets by a third in its first month.",
+    "I'm not happy with how the last review went and would like to talk about it.",
+]
+
+_ROUTES = {"analyze": "/api/analyze", "stream": "/api/analyze/stream"}
+
+
+class _Client:
+    """One keep-alive connection per thread; ``http.client`` reconnects if the server closes it."""
+
+    def __init__(self, base_url: str, timeout: float) -> None:
+        parts = urlsplit(base_url)
+        self.host_ = parts.hostname
+        self.port_ = parts.port or 80
+        self.timeout_ = timeout
+        self.local_ = threading.local()
+
+    def post(self, path: str, body: bytes, stream: bool) -> tuple[int, float]:
+        """Status and seconds until the first byte of the body (stream) or the whole body."""
+        connection = getattr(self.local_, "connection", None)
+        if connection is None:
+            connection = self.local_.connection = http.client.HTTPConnection(self.host_, self.port_, timeout=self.timeout_)
+        try:
+            connection.request("POST", path, body=body, headers={"Content-Type": "application/json", "X-Priority": "normal"})
+            response = connection.getresponse()
+            if stream and response.status == 200:
+                response.readline()
+                first = time.perf_counter()
+                response.read()
+                return response.status, first
+            response.read()
+            return response.status, time.perf_counter()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self.local_.connection = None
+            raise
+
+
+def _payload(number: int, args) -> bytes:
+    # a distinct draft per request keeps caches and coalescing out of the measurement
+    draft = f"{DRAFTS[number % len(DRAFTS)]} (request {number})"
+    if args.query:
+        return json.dumps({"query": draft}).encode("utf-8")
+    return json.dumps({"message": draft, "length_pref": "Concise"}).encode("utf-8")
+
+
+class _Recorder:
+    def __init__(self) -> None:
+        self.latencies_ms: list[float] = []
+        self.statuses: dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def add(self, status: str, latency_ms: float | None) -> None:
+        with self.lock:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            if latency_ms is not None:
+                self.latencies_ms.append(latency_ms)
+
+    def report(self, elapsed: float) -> dict:
+        completed = len(self.latencies_ms)
+        total = sum(self.statuses.values())
+        return {
+            "requests": total,
+            "ok": completed,
+            "errors": total - completed,
+            "error_rate": round((total - completed) / total, 4) if total else 0.0,
+            "throughput_per_second": round(completed / elapsed, 2) if elapsed > 0 else 0.0,
+            **summarize(self.latencies_ms),
+            "statuses": dict(sorted(self.statuses.items())),
+        }
+
+
+def _send(client: _Client, path: str, body: bytes, stream: bool, started: float, recorder: _Recorder) -> None:
+    try:
+        status, done = client.post(path, body, stream)
+    except (OSError, http.client.HTTPException) as e:
+        recorder.add(type(e).__name__, None)
+        return
+    recorder.add(str(status), (done - started) * 1000.0 if status == 200 else None)
+
+
+def closed_loop(client: _Client, args, concurrency: int, counter) -> dict:
+    recorder = _Recorder()
+    path, stream = _ROUTES[args.route], args.route == "stream"
+    stop_at = time.perf_counter() + args.duration
+
+    def worker() -> None:
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            _send(client, path, _payload(next(counter), args), stream, started, recorder)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.report(time.perf_counter() - started)
+
+
+def open_loop(client: _Client, args, rate: float, counter) -> dict:
+    recorder = _Recorder()
+    path, stream = _ROUTES[args.route], args.route == "stream"
+    rng = random.Random(args.seed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.max_clients) as pool:
+        arrival = started
+        while arrival < started + args.duration:
+            delay = arrival - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(_send, client, path, _payload(next(counter), args), stream, arrival, recorder)
+            arrival += rng.expovariate(rate)
+    return recorder.report(time.perf_counter() - started)
+
+
+def _free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def _start_server(args):
+    settings = MockSettings(args.latency_ms, args.tokens_per_second, args.tokens, args.think_tokens, args.error_rate, args.seed)
+    backend = start_mock_backend(settings)
+    os.environ.update({
+        "OLLAMA_BASE_URL": backend.base_url,
+        "OLLAMA_MODEL": "mock",
+        "MESSAGE_ANALYST_CACHE_SIZE": "0",
+        "MESSAGE_ANALYST_HISTORY_PATH": "",
+        "MESSAGE_ANALYST_SIMILARITY_CACHE_SIZE": "0",
+    })
+
+    from Message_Direction_Analyst import MessageAnalystAPIServer, MessageDirectionAnalyst, _parse_controls
+
+    model = MessageDirectionAnalyst()
+    server = MessageAnalystAPIServer(
+        model,
+        stream_fn=model.stream,
+        async_forward_fn=model.aforward,
+        async_stream_fn=model.astream,
+        cache_key_fn=model.cache_key,
+        controls_fn=_parse_controls,
+        host="127.0.0.1",
+        port=_free_port(),
+        mode=args.mode,
+        max_inflight=args.max_inflight,
+    )
+    server.start()
+    return server, backend
+
+
+def _levels(text: str, cast) -> list:
+    return [cast(level) for level in text.split(",") if level.strip()] if text else []
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="benchmark a running server instead of an in-process one")
+    parser.add_argument("--mode", choices=["threaded", "asyncio"], default="threaded", help="in-process server mode")
+    parser.add_argument("--route", choices=sorted(_ROUTES), default="analyze")
+    parser.add_argument("--query", action="store_true", help="send raw 'query' requests instead of 'message' with controls")
+    parser.add_argument("--closed", default="1,8,32", help="comma-separated client counts for closed-loop runs")
+    parser.add_argument("--open", default="", help="comma-separated arrival rates (requests/s) for open-loop runs")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument("--max-clients", type=int, default=256, help="open loop: connections available for arrivals")
+    parser.add_argument("--max-inflight", type=int, default=32, help="in-process server: concurrent upstream calls")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="mock: delay before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="mock: generation speed (0 = instant)")
+    parser.add_argument("--tokens", type=int, default=60, help="mock: answer length")
+    parser.add_argument("--think-tokens", type=int, default=0, help="mock: length of a leading <think> block")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="mock: share of requests answered with 503")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the result file here")
+    args = parser.parse_args()
+
+    server = backend = None
+    base_url = args.url
+    if base_url is None:
+        server, backend = _start_server(args)
+        base_url = server.internal_base_url
+
+    client = _Client(base_url, args.timeout)
+    counter = iter(range(10**12))
+    results = {}
+    try:
+        # one untimed request so the first scenario starts from warm connections
+        _send(client, _ROUTES[args.route], _payload(next(counter), args), args.route == "stream", time.perf_counter(), _Recorder())
+        for concurrency in _levels(args.closed, int):
+            results[f"closed[{concurrency}]"] = closed_loop(client, args, concurrency, counter)
+            print(json.dumps({"case": f"closed[{concurrency}]", **results[f"closed[{concurrency}]"]}), file=sys.stderr)
+        for rate in _levels(args.open, float):
+            results[f"open[{rate:g}]"] = open_loop(client, args, rate, counter)
+            print(json.dumps({"case": f"open[{rate:g}]", **results[f"open[{rate:g}]"]}), file=sys.stderr)
+    finally:
+        if server is not None:
+            server.stop()
+            backend.shutdown()
+
+    config = {key: value for key, value in vars(args).items() if key != "output"}
+    if backend is not None:
+        config["mock_requests"] = backend.stats.as_dict()
+    save_results(args.output, "load", config, results)
+
+
+if __name__ == "__main__":
+    main()
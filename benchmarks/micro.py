@@ -0,0 +1,112 @@
+"""Microbenchmarks of the per-request CPU work around the LLM call.
+
+Each case is timed with ``timeit``: the loop count is picked by ``autorange`` and the best
+of ``--repeat`` runs is reported in microseconds per call. No backend is needed.
+
+    python benchmarks/micro.py --output micro.json
+    python benchmarks/results.py micro-baseline.json micro.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from noton.Text import TextFilter  # noqa: E402
+from api_server import _parse_analyze_payload  # noqa: E402
+from Message_Direction_Analyst import (  # noqa: E402
+    _DEFAULT_CONTROLS,
+    _build_system_prompt,
+    _compose_analysis_prompt,
+    _parse_controls,
+    _render_system_prompt,
+)
+from results import save_results  # noqa: E402
+
+DRAFT = (
+    "Hi team, we need to move the launch by one week because QA found a data-loss bug in the export path. "
+    "I know this is frustrating after the push last sprint. Can you let your stakeholders know today and "
+    "flag anything that depends on the original date? Thanks for the quick turnaround on the fix so far."
+)
+ANSWER = "Team, the launch moves by one week: QA found a data-loss bug in the export path. " * 6
+THINKING = "<think>" + "The reader is an executive, so lead with the decision and the reason. " * 30 + "</think>"
+
+
+def _cases() -> dict:
+    controls = {**_DEFAULT_CONTROLS, "focus_points": ["Call-to-action clarity", "Emotional resonance"]}
+    text_filter = TextFilter()
+    raw_answer = THINKING + ANSWER
+    chunks = [raw_answer[i : i + 12] for i in range(0, len(raw_answer), 12)]
+
+    request = {"message": DRAFT, **controls}
+    request_body = json.dumps(request).encode("utf-8")
+    response = {
+        "query": _compose_analysis_prompt(DRAFT, **controls),
+        "response": ANSWER,
+        "meta": {"took_ms": 812.4, "queue_ms": 0.3, "cached": False, "coalesced": False,
+                 "usage": {"prompt_tokens": 1024, "completion_tokens": 180, "reasoning_tokens": 0, "calls": 1, "truncated": False}},
+    }
+    event = {"token": "Team, the "}
+
+    cases = {
+        "compose_analysis_prompt[classic]": lambda: _compose_analysis_prompt(DRAFT, **controls),
+        "compose_analysis_prompt[prefix]": lambda: _compose_analysis_prompt(DRAFT, **controls, layout="prefix"),
+        "build_system_prompt[cached]": lambda: _build_system_prompt("German"),
+        # the lru_cache is bypassed to time the rendering itself
+        "build_system_prompt[render]": lambda: _render_system_prompt.__wrapped__("German"),
+        "text_filter.forward": lambda: text_filter.forward(raw_answer),
+        "text_filter.stream": lambda: "".join(text_filter.stream(chunks)),
+        "parse_analyze_payload": lambda: _parse_analyze_payload(request, _parse_controls),
+        "json.loads[request]": lambda: json.loads(request_body.decode("utf-8")),
+        "json.dumps[response]": lambda: json.dumps(response).encode("utf-8"),
+        "json.dumps[stream_event]": lambda: json.dumps(event).encode("utf-8"),
+    }
+    try:
+        import orjson
+
+        cases["orjson.loads[request]"] = lambda: orjson.loads(request_body)
+        cases["orjson.dumps[response]"] = lambda: orjson.dumps(response)
+    except ImportError:
+        pass
+    try:
+        from noton.Similarity import SimilarityCache
+        from noton.Metrics import MetricsRegistry
+
+        similar = SimilarityCache(max_entries=4096, metrics=MetricsRegistry())
+        for number in range(4096):
+            similar.set(f"{DRAFT} (variant {number})", "group", ANSWER)
+        cases["similarity_cache.get[4096]"] = lambda: similar.get(DRAFT.replace("team", "folks"), "group")
+    except ImportError:
+        pass
+    return cases
+
+
+def run(cases: dict, repeat: int, selected: list[str]) -> dict:
+    results = {}
+    for name, fn in cases.items():
+        if selected and not any(part in name for part in selected):
+            continue
+        timer = timeit.Timer(fn)
+        number, _ = timer.autorange()
+        best = min(timer.repeat(repeat=repeat, number=number)) / number
+        results[name] = {"per_call_us": round(best * 1e6, 3), "calls_per_second": round(1.0 / best, 1), "loops": number}
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs per case; the best one is kept")
+    parser.add_argument("--only", action="append", default=[], help="run cases whose name contains this text")
+    parser.add_argument("--output", help="write the result file here")
+    args = parser.parse_args()
+
+    results = run(_cases(), args.repeat, args.only)
+    save_results(args.output, "micro", {"repeat": args.repeat}, results)
+
+
+if __name__ == "__main__":
+    main()
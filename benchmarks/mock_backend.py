@@ -0,0 +1,166 @@
+"""In-process fake of an OpenAI-compatible ``/v1/chat/completions`` endpoint.
+
+Answers every completion after ``latency_ms`` and then produces ``tokens`` words at
+``tokens_per_second``, streamed (SSE) or not. A share ``error_rate`` of requests fails with
+``503`` so retries and breakers can be exercised. ``think_tokens`` adds a ``<think>`` block
+that ``TextFilter`` strips, like a reasoning model would. ``GET /v1/models`` answers health checks.
+
+    # standalone, for pointing a running app at it
+    python benchmarks/mock_backend.py --port 18000 --latency-ms 200 --tokens-per-second 60
+    OLLAMA_BASE_URL=http://127.0.0.1:18000/v1 streamlit run app/Message_Direction_Analyst.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_WORDS = "Clear direct message that keeps the ask up front and names the next step".split()
+
+
+@dataclass
+class MockSettings:
+    latency_ms: float = 50.0
+    tokens_per_second: float = 0.0  # 0 emits every token at once
+    tokens: int = 60
+    think_tokens: int = 0
+    error_rate: float = 0.0
+    seed: int = 0
+
+
+class MockStats:
+    def __init__(self) -> None:
+        self.requests = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def as_dict(self) -> dict:
+        with self.lock:
+            return {"requests": self.requests, "errors": self.errors}
+
+
+def _pieces(settings: MockSettings, max_tokens) -> list[str]:
+    count = settings.tokens if max_tokens is None else min(settings.tokens, max_tokens)
+    words = [_WORDS[i % len(_WORDS)] + " " for i in range(count)]
+    if settings.think_tokens:
+        words = ["<think>"] + ["hmm "] * settings.think_tokens + ["</think>"] + words
+    return words
+
+
+def _chunk(model: str, delta: dict, finish_reason=None) -> bytes:
+    chunk = {
+        "id": "mock",
+        "object": "chat.completion.chunk",
+        "created": 0,
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+
+
+def start_mock_backend(settings: MockSettings = MockSettings(), host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Serve the mock on a daemon thread; ``server.base_url`` is the ``/v1`` URL and ``server.stats`` counts requests."""
+    rng = random.Random(settings.seed)
+    rng_lock = threading.Lock()
+    stats = MockStats()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # headers and body go out in separate writes; without this, delayed ACKs add ~40 ms per call
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):  # noqa: A002
+            pass
+
+        def _send_json(self, status: int, payload: dict) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self._send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            with rng_lock:
+                failed = rng.random() < settings.error_rate
+            with stats.lock:
+                stats.requests += 1
+                stats.errors += failed
+            time.sleep(settings.latency_ms / 1000.0)
+            if failed:
+                self._send_json(503, {"error": {"message": "mock overload", "type": "server_error"}})
+                return
+
+            pieces = _pieces(settings, body.get("max_tokens"))
+            delay = 1.0 / settings.tokens_per_second if settings.tokens_per_second > 0 else 0.0
+            usage = {"prompt_tokens": sum(len(str(m["content"])) for m in body["messages"]) // 4, "completion_tokens": len(pieces)}
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+            model = body.get("model", "mock")
+
+            if not body.get("stream"):
+                time.sleep(delay * len(pieces))
+                self._send_json(200, {
+                    "id": "mock",
+                    "object": "chat.completion",
+                    "created": 0,
+                    "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(pieces)}, "finish_reason": "stop"}],
+                    "usage": usage,
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            events = [_chunk(model, {"content": piece}) for piece in pieces] + [_chunk(model, {}, "stop")]
+            if (body.get("stream_options") or {}).get("include_usage"):
+                events.append(f"data: {json.dumps({'id': 'mock', 'object': 'chat.completion.chunk', 'created': 0, 'model': model, 'choices': [], 'usage': usage})}\n\n".encode("utf-8"))
+            events.append(b"data: [DONE]\n\n")
+            try:
+                for data in events:
+                    time.sleep(delay)
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                # the client gave up on the stream
+                self.close_connection = True
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.base_url = f"http://{host}:{server.server_address[1]}/v1"
+    server.stats = stats
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18000)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="delay before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="generation speed (0 = instant)")
+    parser.add_argument("--tokens", type=int, default=60, help="answer length in tokens")
+    parser.add_argument("--think-tokens", type=int, default=0, help="length of a leading <think> block")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 503")
+    args = parser.parse_args()
+
+    settings = MockSettings(args.latency_ms, args.tokens_per_second, args.tokens, args.think_tokens, args.error_rate)
+    server = start_mock_backend(settings, args.host, args.port)
+    print(f"mock backend on {server.base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
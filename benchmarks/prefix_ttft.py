@@ -0,0 +1,173 @@
+"""Time-to-first-token of the "classic" and "prefix" prompt layouts.
+
+Streams the same mix of languages, controls and drafts through ``Ollama.stream`` once per
+layout and reports TTFT percentiles plus how many characters each prompt shares with an
+earlier one (what a prefix KV cache can skip).
+
+    # against a real backend (llama.cpp server, Ollama, vLLM)
+    python benchmarks/prefix_ttft.py --base-url http://localhost:8080/v1 --model my-model
+
+    # against the built-in mock, which charges prefill time only for the uncached suffix
+    python benchmarks/prefix_ttft.py --mock
+"""
+
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+from noton.LLM import Ollama  # noqa: E402
+from Message_Direction_Analyst import (  # noqa: E402
+    PROMPT_LAYOUTS,
+    _DEFAULT_CONTROLS,
+    _build_system_prompt,
+    _compose_analysis_prompt,
+)
+
+LANGUAGES = ["English", "German", "French", "Chinese"]
+DIRECTIONS = ["Clarify", "Persuade", "Inspire", "Reassure"]
+DRAFTS = [
+    "We need to move the launch by one week because QA found a data-loss bug.",
+    "Thanks for covering the on-call shift last weekend, it made a real difference.",
+    "Can we meet on Thursday to agree on the budget for the next quarter?",
+    "The new onboarding flow cut support tickets by a third in its first month.",
+    "I'm not happy with how the last review went and would like to talk about it.",
+]
+
+
+def _shared_prefix(text: str, seen: list[str]) -> int:
+    best = 0
+    for other in seen:
+        limit = min(len(text), len(other))
+        i = 0
+        while i < limit and text[i] == other[i]:
+            i += 1
+        best = max(best, i)
+    return best
+
+
+class _MockState:
+    def __init__(self, prefill_ms_per_kchar: float, cache_size: int = 64) -> None:
+        self.prefill_ms_per_kchar = prefill_ms_per_kchar
+        self.cache_size = cache_size
+        self.prompts: list[str] = []
+        self.lock = threading.Lock()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.prompts.clear()
+
+    def prefill_seconds(self, prompt: str) -> float:
+        with self.lock:
+            cached = _shared_prefix(prompt, self.prompts)
+            self.prompts = (self.prompts + [prompt])[-self.cache_size:]
+        return (len(prompt) - cached) / 1000.0 * self.prefill_ms_per_kchar / 1000.0
+
+
+def _start_mock(state: _MockState) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):  # noqa: A002
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            prompt = "".join(str(message["content"]) for message in body["messages"])
+            time.sleep(state.prefill_seconds(prompt))
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for piece in ["Refined ", "message ", "text."]:
+                chunk = {
+                    "id": "mock",
+                    "object": "chat.completion.chunk",
+                    "created": 0,
+                    "model": body["model"],
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                }
+                data = f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            data = b"data: [DONE]\n\n"
+            self.wfile.write(b"%x\r\n%s\r\n0\r\n\r\n" % (len(data), data))
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _requests(count: int) -> list[tuple[str, dict]]:
+    combos = itertools.cycle(itertools.product(DRAFTS, LANGUAGES, DIRECTIONS))
+    requests = []
+    for _ in range(count):
+        draft, language, direction = next(combos)
+        requests.append((draft, {**_DEFAULT_CONTROLS, "language": language, "direction": direction}))
+    return requests
+
+
+def run_layout(ollama: Ollama, layout: str, requests: list[tuple[str, dict]]) -> dict:
+    ttfts, shared, lengths, seen = [], [], [], []
+    for draft, controls in requests:
+        system_prompt = _build_system_prompt(controls["language"], layout)
+        user_prompt = _compose_analysis_prompt(draft, **controls, layout=layout)
+        prompt = system_prompt + user_prompt
+        shared.append(_shared_prefix(prompt, seen))
+        lengths.append(len(prompt))
+        seen = (seen + [prompt])[-64:]
+
+        started = time.perf_counter()
+        stream = ollama.stream(user_prompt=user_prompt, system_prompt=system_prompt)
+        next(stream)
+        ttfts.append((time.perf_counter() - started) * 1000.0)
+        for _ in stream:
+            pass
+
+    ttfts.sort()
+    return {
+        "layout": layout,
+        "requests": len(ttfts),
+        "ttft_p50_ms": round(statistics.median(ttfts), 1),
+        "ttft_p95_ms": round(ttfts[max(int(len(ttfts) * 0.95) - 1, 0)], 1),
+        "ttft_mean_ms": round(statistics.fmean(ttfts), 1),
+        "shared_prefix_chars": round(statistics.fmean(shared), 0),
+        "prompt_chars": round(statistics.fmean(lengths), 0),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434/v1"))
+    parser.add_argument("--model", default=os.getenv("OLLAMA_MODEL", "deepseek-r1:8b-0528-qwen3-fp16"))
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--mock", action="store_true", help="use the built-in prefix-caching mock backend")
+    parser.add_argument("--prefill-ms-per-kchar", type=float, default=40.0, help="mock prefill cost")
+    parser.add_argument("--mock-cache-size", type=int, default=8, help="prompts the mock keeps in its prefix cache")
+    args = parser.parse_args()
+
+    state = _MockState(args.prefill_ms_per_kchar, args.mock_cache_size)
+    base_url = args.base_url
+    if args.mock:
+        server = _start_mock(state)
+        base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    ollama = Ollama(base_url=base_url, model=args.model, api_key=os.getenv("OLLAMA_API_KEY", "ollama"))
+    requests = _requests(args.requests)
+    for layout in PROMPT_LAYOUTS:
+        state.reset()
+        # one untimed call so both layouts start from a warm connection
+        for _ in ollama.stream(user_prompt="warm-up", system_prompt="warm-up"):
+            pass
+        print(json.dumps(run_layout(ollama, layout, requests)))
+
+
+if __name__ == "__main__":
+    main()
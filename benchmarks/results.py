@@ -0,0 +1,100 @@
+"""Result files shared by the benchmarks, and a regression check between two of them.
+
+Every benchmark writes ``{"benchmark", "created", "python", "platform", "config", "results"}``
+where ``results`` maps a case name to its metrics. Two files of the same benchmark compare
+case by case; metrics ending in ``_ms``, ``_us`` or ``_ns`` are lower-is-better, the ones
+ending in ``_per_second`` are higher-is-better, everything else is reported only.
+
+    python benchmarks/results.py baseline.json current.json --tolerance 0.10
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from typing import Optional, Sequence
+
+_LOWER_IS_BETTER = ("_ms", "_us", "_ns")
+_HIGHER_IS_BETTER = ("_per_second",)
+
+
+def percentiles(samples: Sequence[float], points: Sequence[int] = (50, 95, 99)) -> dict:
+    """Nearest-rank percentiles of ``samples`` as ``{"p50": ..., ...}`` (empty samples give ``{}``)."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    return {f"p{point}": ordered[min(max(int(round(point / 100.0 * len(ordered))) - 1, 0), len(ordered) - 1)] for point in points}
+
+
+def summarize(samples_ms: Sequence[float]) -> dict:
+    """Latency summary in milliseconds, rounded for stable JSON."""
+    summary = {f"{name}_ms": round(value, 3) for name, value in percentiles(samples_ms).items()}
+    if samples_ms:
+        summary["mean_ms"] = round(statistics.fmean(samples_ms), 3)
+        summary["max_ms"] = round(max(samples_ms), 3)
+    return summary
+
+
+def save_results(path: Optional[str], benchmark: str, config: dict, results: dict) -> dict:
+    """Print ``results`` as JSON lines and, with a ``path``, write the full result file."""
+    document = {
+        "benchmark": benchmark,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        "results": results,
+    }
+    for case, metrics in results.items():
+        print(json.dumps({"case": case, **metrics}))
+    if path:
+        with open(path, "w", encoding="utf-8") as handle:
+            json.dump(document, handle, indent=2)
+    return document
+
+
+def compare(baseline: dict, current: dict, tolerance: float = 0.10) -> list[str]:
+    """Regressions of ``current`` against ``baseline`` beyond ``tolerance`` (a fraction)."""
+    regressions = []
+    for case, metrics in current["results"].items():
+        before = baseline["results"].get(case)
+        if before is None:
+            continue
+        for metric, value in metrics.items():
+            old = before.get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or old <= 0:
+                continue
+            change = (value - old) / old
+            if metric.endswith(_LOWER_IS_BETTER) and change > tolerance:
+                regressions.append(f"{case} {metric}: {old} -> {value} (+{change:.0%})")
+            elif metric.endswith(_HIGHER_IS_BETTER) and change < -tolerance:
+                regressions.append(f"{case} {metric}: {old} -> {value} ({change:.0%})")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as handle:
+        baseline = json.load(handle)
+    with open(args.current, encoding="utf-8") as handle:
+        current = json.load(handle)
+    if baseline["benchmark"] != current["benchmark"]:
+        sys.exit(f"cannot compare {baseline['benchmark']!r} with {current['benchmark']!r}")
+
+    regressions = compare(baseline, current, args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if regressions:
+        sys.exit(1)
+    print("no regressions")
+
+
+if __name__ == "__main__":
+    main()
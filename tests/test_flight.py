@@ -0,0 +1,99 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
+
+from noton.Flight import AsyncSingleFlight, SingleFlight  # noqa: E402
+
+
+def test_follower_survives_cancelled_leader():
+    async def scenario():
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def generate():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        leader = asyncio.ensure_future(flight.do("draft", generate))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("draft", generate))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        assert await follower == ("answer", True)
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert calls == [1]
+        assert flight.stats() == {"executed": 1, "coalesced": 1, "in_flight": 0}
+
+    asyncio.run(scenario())
+
+
+def test_call_is_cancelled_when_every_caller_leaves():
+    async def scenario():
+        flight = AsyncSingleFlight()
+        finished = []
+
+        async def generate():
+            try:
+                await asyncio.sleep(1.0)
+            except asyncio.CancelledError:
+                finished.append("cancelled")
+                raise
+            return "answer"
+
+        callers = [asyncio.ensure_future(flight.do("draft", generate)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+
+        assert finished == ["cancelled"]
+        assert flight.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_follower_stops_waiting_at_its_timeout():
+    flight = SingleFlight()
+    started = threading.Event()
+
+    def generate():
+        started.set()
+        time.sleep(0.3)
+        return "answer"
+
+    leader = threading.Thread(target=flight.do, args=("draft", generate))
+    leader.start()
+    started.wait()
+    begun = time.monotonic()
+    with pytest.raises(TimeoutError):
+        flight.do("draft", generate, wait_timeout=0.05)
+    assert time.monotonic() - begun < 0.2
+    leader.join()
+
+
+def test_async_follower_stops_waiting_at_its_timeout():
+    async def scenario():
+        flight = AsyncSingleFlight()
+
+        async def generate():
+            await asyncio.sleep(0.3)
+            return "answer"
+
+        leader = asyncio.ensure_future(flight.do("draft", generate))
+        await asyncio.sleep(0)
+        with pytest.raises(TimeoutError):
+            await flight.do("draft", generate, wait_timeout=0.05)
+        # the shared call still finishes for the caller that started it
+        assert await leader == ("answer", False)
+
+    asyncio.run(scenario())